@@ -1,94 +1,73 @@
 
+import signal
+import sys
 import serial
 import datetime
 from mintsXU4 import mintsSensorReader as mSR
 from mintsXU4 import mintsDefinitions as mD
+from mintsXU4 import mintsLogger as mLog
+from mintsXU4 import mintsSerial as mSerial
+from mintsXU4 import mintsNMEA as mNMEA
 import time
 import serial
 from collections import OrderedDict
 
 dataFolder    =  mD.dataFolder
 airmarPort    =  mD.airmarPort
-print(airmarPort)
+logger        =  mLog.getLogger("airMarReader")
 
-def main():
-
-    ser = serial.Serial(
+def openPort():
+    return serial.Serial(
     port= airmarPort,\
     baudrate=4800,\
     parity  =serial.PARITY_NONE,\
     stopbits=serial.STOPBITS_ONE,\
     bytesize=serial.EIGHTBITS,\
-    timeout=0)
+    timeout=1)
+
+
+class AirMarHandler:
+    """Splits the AirMar stream into sentences and hands the types listed in
+    mD.airmarSentences to their parsers, see mintsNMEA. Used by main() and
+    serialHub.py."""
+
+    def __init__(self,ser=None,sentences=None):
+        self.reader     = mSerial.LineReader(ser)
+        self.dispatcher = mNMEA.fromConfig(sentences or mD.airmarSentences,mSR)
+
+    def onData(self,data,readTime=None):
+        return self.handleLines(self.reader.feed(data))
 
-    lastHCHDT = time.time()
-    lastWIMWV = time.time()
-    lastGPGGA = time.time()
-    lastGPVTG = time.time()
-    lastGPZDA = time.time()
-    lastWIMDA = time.time()
-    lastYXXDR = time.time()
+    def handleLines(self,dataStrings):
+        dispatched = 0
+        for dataString in dataStrings:
+            logger.debug(dataString)
+            dispatched += self.dispatcher.dispatch(dataString)
+        return dispatched
 
-    delta  = .5
-    print("connected to: " + ser.portstr)
 
-    #this will store the line
-    line = []
+def main():
+
+    ser = openPort()
+    logger.info("connected to: %s",ser.portstr)
+
+    # Blocks in the driver until data is there, see mintsSerial
+    handler = AirMarHandler(ser)
     while True:
         try:
-            for c in ser.read():
-                line.append(chr(c))
-                if chr(c) == '\n':
-                    dataString     = (''.join(line)).replace("\r\n","")
-                    dateTime  = datetime.datetime.now()
-                    print(dataString)
-
-                    if (dataString.startswith("$HCHDT") and mSR.getDeltaTimeAM(lastHCHDT,delta)):
-                        mSR.HCHDTWriteAM(dataString,dateTime)
-                        lastHCHDT = time.time()
-                    # print(str(dataString))
-
-                    if (dataString.startswith("$WIMWV") and mSR.getDeltaTimeAM(lastWIMWV,delta)):
-                        mSR.WIMWVWriteAM(dataString,dateTime)
-                        lastWIMWV = time.time()
-                    # print(str(dataString))
-
-                    if (dataString.startswith("$GPGGA") and mSR.getDeltaTimeAM(lastGPGGA,delta)):
-                        mSR.GPGGAWriteAM(dataString,dateTime)
-                        lastGPGGA = time.time()
-                    # print(str(dataString))
-
-                    if (dataString.startswith("$GPVTG") and mSR.getDeltaTimeAM(lastGPVTG,delta)):
-                        mSR.GPVTGWriteAM(dataString,dateTime)
-                        lastGPVTG = time.time()
-                    # print(str(dataString))
-
-                    if (dataString.startswith("$GPZDA") and mSR.getDeltaTimeAM(lastGPZDA,delta)):
-                        mSR.GPZDAWriteAM(dataString,dateTime)
-                        lastGPZDA = time.time()
-                    # print(str(dataString))
-
-                    if (dataString.startswith("$WIMDA") and mSR.getDeltaTimeAM(lastWIMDA,delta)):
-                        mSR.WIMDAWriteAM(dataString,dateTime)
-                        lastWIMDA = time.time()
-                    # print(str(dataString))
-            
-                    
-                    if (dataString.startswith("$YXXDR,A") and mSR.getDeltaTimeAM(lastYXXDR,delta)):
-                        mSR.YXXDRWriteAM2(dataString,dateTime)
-                        lastYXXDR = time.time()
-                    # print(str(dataString))
-
-                    line = []
-                    break
-        except:
-            print("Incomplete String Read")
-            line = []
-                    
+            dataStrings = handler.reader.readLines()
+        except serial.SerialException as e:
+            logger.error("Serial read failed: %s",e)
+            time.sleep(1)
+            continue
+
+        handler.handleLines(dataStrings)
+
     ser.close()
 
 
 
 if __name__ == "__main__":
+   # Turns the kill sent by killAll.sh into a normal exit so queued rows are written
+   signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
    main()
-
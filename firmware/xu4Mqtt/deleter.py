@@ -3,6 +3,7 @@ import sys
 import shutil
 import datetime
 from mintsXU4 import mintsSensorReader as mSR
+from mintsXU4 import mintsWriter as mW
 from mintsXU4 import mintsDefinitions as mD
 
 dataFolder    = mD.dataFolder
@@ -38,6 +39,11 @@ def main():
         except OSError as e:
             print ("Error: %s - %s." % (e.filename, e.strerror))
 
+    # Days before yesterday are closed by every reader by now
+    compressBefore = datetime.date.today() - datetime.timedelta(1)
+    mW.compressClosedDays(dataFolder+"/"+macAddress,compressBefore,mD.csvCompression)
+    mW.compressClosedDays(dataFolderRef+"/"+macAddress,compressBefore,mD.csvCompression)
+
 
 def getDeletePath(deleteDate):
     # deleteDate =  datetime.datetime.now() -  datetime.timedelta(daysBefore)
@@ -1,4 +1,5 @@
 
+import signal
 import socket
 from datetime import datetime, timezone
 import time 
@@ -7,6 +8,7 @@ from collections import OrderedDict
 import pprint
 import sys 
 from mintsXU4 import mintsSensorReader as mSR
+from mintsXU4 import mintsLogger as mLog
 
 from gaseraOne.gaseraOne import GaseraOneSensor
 
@@ -14,7 +16,11 @@ hostIP          = "192.168.20.119"
 
 defaultTaskID   = "11"
 
+logger          = mLog.getLogger("gaseraOneReader")
+
 if __name__ == "__main__":
+    # Turns the kill sent by killAll.sh into a normal exit so queued rows are written
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     print("==========================================")
     print("================== MINTS =================")
     print("------------------------------------------")
@@ -24,7 +30,7 @@ if __name__ == "__main__":
     
     # STARTING SEQUENCE 
     if not sensor.connect():
-        print("Failed to connect to sensor. Exiting...")
+        logger.error("Failed to connect to sensor. Exiting...")
         sys.exit(1)  # Exit with an error code
 
     sensor.startUpSequece()
@@ -33,7 +39,7 @@ if __name__ == "__main__":
 
     while True:
         try:
-            print(sensor.request_last_measurement_results())
+            logger.debug(sensor.request_last_measurement_results())
             time.sleep(60)
 
             if (time.time() - sensor.periodicCheckTime) > 3600:
@@ -43,20 +49,20 @@ if __name__ == "__main__":
                 sensor.dailyCheck()
 
         except KeyboardInterrupt:
-            print("\nUser interrupted. Exiting...")
+            logger.info("User interrupted. Exiting...")
             break  # Exit the loop graceful
 
 
         except Exception as e:
             time.sleep(60)
-            print ("Error and type: %s - %s." % (e,type(e)))
+            logger.error("Error and type: %s - %s.",e,type(e))
             time.sleep(.5)
-            print("Data Packet Not Sent for Gasera One")
+            logger.error("Data Packet Not Sent for Gasera One")
             time.sleep(.5)
 
 
     time.sleep(10)
-    print(sensor.stop_measurement())
+    logger.info(sensor.stop_measurement())
     
     # Disconnect when done
     sensor.disconnect()
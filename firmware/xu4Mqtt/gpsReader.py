@@ -1,3 +1,5 @@
+import signal
+import sys
 import time
 import datetime
 
@@ -6,6 +8,9 @@ from adafruit_extended_bus import ExtendedI2C as I2C
 
 from mintsXU4 import mintsSensorReader as mSR
 from mintsXU4 import mintsDefinitions as mD
+from mintsXU4 import mintsLogger as mLog
+
+logger = mLog.getLogger("gpsReader")
 
 
 
@@ -21,18 +26,18 @@ def main():
     # Detecting if the GPS is Connected
         i2c = I2C(4)
         gps = adafruit_gps.GPS_GtopI2C(i2c, debug=False) # Use I2C interface
-        print("GPS found")
+        logger.info("GPS found")
     except Exception as e:
         time.sleep(.5)
-        print("No GPS found")
-        print ("Error and type: %s - %s." % (e,type(e)))
+        logger.error("No GPS found")
+        logger.error("Error and type: %s - %s.",e,type(e))
         quit()
 
     # Turn on everything (not all of it is parsed!)
-    print("Sending GPS Command")
+    logger.info("Sending GPS Command")
     gps.send_command(b"PMTK314,1,1,1,1,1,1,0,0,0,0,0,0,0,0,0,0,0,0,0")
 
-    print("Changing Update Frequency")
+    logger.info("Changing Update Frequency")
     #gps.send_command(b"PMTK220,1000")
 
 
@@ -40,8 +45,8 @@ def main():
         try:  
             if not gps.update() or not gps.has_fix:
                 time.sleep(0.01)
-                print("No Coordinates found")
-                print(gps.nmea_sentence) 
+                logger.warning("No Coordinates found")
+                logger.debug(gps.nmea_sentence)
                 continue
             dateTime  = datetime.datetime.now()
             dataString = gps.nmea_sentence
@@ -53,10 +58,12 @@ def main():
                 lastGPRMC = time.time()
         except Exception as e:
             time.sleep(.5)
-            print("GPS Error")
-            print ("Error and type: %s - %s." % (e,type(e)))
+            logger.error("GPS Error")
+            logger.error("Error and type: %s - %s.",e,type(e))
 
 if __name__ == "__main__":
+    # Turns the kill sent by killAll.sh into a normal exit so queued rows are written
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     print("=============")
     print("    MINTS    ")
     print("=============")
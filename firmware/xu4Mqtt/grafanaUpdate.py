@@ -15,6 +15,7 @@ from collections import OrderedDict
 from os import listdir
 from os.path import isfile, join
 from mintsXU4 import mintsLatest as mL
+from mintsXU4 import mintsWriter as mW
 import csv
 import os 
 import nmap, socket
@@ -129,14 +130,16 @@ def syncHostData(hostFound,hostID,hostIP):
                     ])
         mSR.sensorFinisherWearable(dateTime,hostID,"STATUS001",sensorDictionary)  
         time.sleep(10)
-        csvDataFiles = glob.glob(dataFolder+"/"+hostID+ "/*/*/*/*.csv")
+        csvDataFiles = glob.glob(dataFolder+"/"+hostID+ "/*/*/*/*.csv") + \
+                        glob.glob(dataFolder+"/"+hostID+ "/*/*/*/*.csv.gz") + \
+                        glob.glob(dataFolder+"/"+hostID+ "/*/*/*/*.csv.zst")
         csvDataFiles.sort()
 
         for csvFile in csvDataFiles:
             print("================================================")
             print(csvFile)
             try:
-                with open(csvFile, "r") as f:
+                with mW.openCSV(csvFile) as f:
                     sensorID       = csvFile.split("_")[-4]
                     reader            = csv.DictReader(f)
                     rowList           = list(reader)
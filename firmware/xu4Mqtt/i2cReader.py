@@ -20,6 +20,7 @@
 
 
 
+import signal
 import sys
 import time
 import os
@@ -27,6 +28,7 @@ import smbus2
 from i2cMints.i2c_scd30 import SCD30
 from i2cMints.i2c_bme280 import BME280
 from mintsXU4 import mintsSensorReader as mSR
+from mintsXU4 import mintsLogger as mLog
 from gaseraOne import gaseraOne as gO
 
 
@@ -37,6 +39,7 @@ bus     = smbus2.SMBus(4)
 scd30   = SCD30(bus,debug)
 bme280  = BME280(bus,debug)
 loopInterval = 5 
+logger       = mLog.getLogger("i2cReader")
 
 
 def main(loopInterval):
@@ -45,23 +48,21 @@ def main(loopInterval):
     startTime    = time.time()
     while True:
         try:
-            print("======= BME280 ========")
             if bme280_valid:
                 mSR.BME280WriteI2c(bme280.read())
-            print("=======================")
             time.sleep(2)       
-            print("======== SCD30 ========")
             if scd30_valid:
                 mSR.SCD30WriteI2c(scd30.read())
-            print("=======================")
             time.sleep(2)
             startTime = mSR.delayMints(time.time() - startTime,loopInterval)
             
         except Exception as e:
-            print(e)
+            logger.error("I2C read failed, error: %s",e)
             time.sleep(10)
         
 if __name__ == "__main__":
+    # Turns the kill sent by killAll.sh into a normal exit so queued rows are written
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     print("=============")
     print("    MINTS    ")
     print("=============")
@@ -1,111 +1,123 @@
+import signal
+import sys
 import serial
 import time
 import datetime
-from pprint import pprint
 from collections import OrderedDict
 from mintsXU4 import mintsSensorReader as mSR
 from mintsXU4 import mintsDefinitions as mD
+from mintsXU4 import mintsLogger as mLog
+from mintsXU4 import mintsSerial as mSerial
 
 # Serial port configuration
 methanePort =   mD.inir2me5Port
 baudRate     = 38400
 loopInterval = 1 
 startTimeMacro = time.time()
+logger       = mLog.getLogger("inir2me5Reader")
+
+def openPort():
+    return serial.Serial(
+        port=methanePort,
+        baudrate=baudRate,
+        parity=serial.PARITY_NONE,
+        stopbits=serial.STOPBITS_TWO,
+        bytesize=serial.EIGHTBITS,
+        timeout=0,
+    )
+
+
+def startEngineeringMode(ser):
+    """
+    Reads back the settings and puts the sensor in engineering mode, where it
+    streams one frame a second. Returns True once it is streaming.
+    """
+    time.sleep(1)
+    logger.info("Connected to: %s",ser.portstr)
+    time.sleep(1)
+
+    logger.info("Entering Configuration Mode")
+    configMode, response   = send_command("C",ser)
+    # print(response)
+    if(configMode):
+        logger.info("In Configuration Mode")
+
+    logger.info("Requesting to read back current settings")
+    dateTime = datetime.datetime.now()
+    readSettings, response = send_command("I",ser)
+    
+    if(readSettings):
+        logger.info("Printing  Settings")
+        printSettings(response,dateTime)
+
+    logger.info("Entering Engineering Mode")
+    EngineeringMode, response   = send_command("B",ser)
+    if(EngineeringMode):
+        logger.info("In Engineering Mode")
+    return EngineeringMode
+
+
+class Inir2me5Handler:
+    """
+    Collects the engineering mode frames, 0000005b, seven values and
+    0000005d, from the bytes as they come in, see mintsSerial.InirFrameReader.
+    Used by main() and serialHub.py.
+    """
+
+    def __init__(self):
+        self.reader = mSerial.InirFrameReader()
+
+    def onData(self,data,readTime=None):
+        frames = self.reader.feed(data)
+        for values in frames:
+            writeFrame(values,datetime.datetime.now())
+        return len(frames)
+
+
+def writeFrame(values,dateTime):
+    logger.debug(values)
+    sensorDictionary = OrderedDict([
+        ("dateTime", str(dateTime)),
+        ("methane",            values[0]),  
+        ("faultCode",          values[1]),  
+        ("temperature",        (values[2]/10)- 273.15),  
+        ("ref1SecAverage",     values[3]), 
+        ("act1SecAverage",     values[4]), 
+        ("crc",                values[5]), 
+        ("crc1sComp",          values[6]), 
+        ("timeElapsed",        int(time.time() - startTimeMacro)), 
+                ])
+    # The first minute is the warm up of the sensor
+    if time.time() - startTimeMacro> 60 :
+        mSR.sensorFinisher(dateTime,"INIR2ME5",sensorDictionary)
+
 
 def main():
     """
-    Main function to read data from the methane sensor via the serial port
-    and display both ASCII and HEX values, keeping only the last two ASCII characters.
+    Main function to read data from the methane sensor via the serial port.
     """
     try:
         # Serial connection setup
-        ser = serial.Serial(
-            port=methanePort,
-            baudrate=baudRate,
-            parity=serial.PARITY_NONE,
-            stopbits=serial.STOPBITS_TWO,
-            bytesize=serial.EIGHTBITS,
-            timeout=0,
-        )
-        time.sleep(1)
-        print("\nConnected to: " + ser.portstr + "\n")
-        time.sleep(1)
-
-        print("Entering Configuration Mode")
-        configMode, response   = send_command("C",ser)
-        # print(response)
-        if(configMode):
-            print("In Configuration Mode")
-
-        print("Requesting to read back current settings")
-        dateTime = datetime.datetime.now()
-        readSettings, response = send_command("I",ser)
-        
-        if(readSettings):
-            print("Printing  Settings")
-            printSettings(response,dateTime)
-
-        print("Entering Engineering Mode")
-        EngineeringMode, response   = send_command("B",ser)
-        if(EngineeringMode):
-            print("In Engineering Mode")
-            lineASCII = []
-
-            startTime      = time.time()
+        ser = openPort()
+        if(startEngineeringMode(ser)):
+            # Blocks in the driver until the next bytes are there
+            ser.timeout = loopInterval
+            handler     = Inir2me5Handler()
             while True:
                 try:
-                    # Read bytes from the serial buffer
-                    for byte in ser.read():
-                        ascii_char = chr(byte)  # if 32 <= byte <= 126 else "."  # Handle printable and non-printable characters
-                        lineASCII.append(ascii_char)
-
-                        data = ''.join(lineASCII)
-                        lines = data.split("\n\r")
-                        lines = [line for line in lines if line.strip()]
-
-                        # print(lines)
-                        if lines and lines[-1] == "0000005d":
-                            if lines[0] == "0000005b":
-                                dateTime = datetime.datetime.now()
-                                print(lines)
-                                print("============================")
-                                print("= Methan Sensor Data Found =")
-
-                                sensorDictionary = OrderedDict([
-                                    ("dateTime", str(dateTime)),
-                                    ("methane",            int(lines[1], 16)),  
-                                    ("faultCode",          int(lines[2], 16)),  
-                                    ("temperature",        (int(lines[3], 16)/10)- 273.15),  
-                                    ("ref1SecAverage",     int(lines[4], 16)), 
-                                    ("act1SecAverage",     int(lines[5], 16)), 
-                                    ("crc",                int(lines[6], 16)), 
-                                    ("crc1sComp",          int(lines[7], 16)), 
-                                    ("timeElapsed",        int(time.time() - startTimeMacro)), 
-                                            ])
-                                pprint(sensorDictionary)
-                                
-                                if time.time() - startTimeMacro> 60 :
-                                    print("Sensor Warmed Up")
-                                    mSR.sensorFinisher(dateTime,"INIR2ME5",sensorDictionary)
-                                
-
-                                                           
-                                lineASCII = []
-                                lines     = []
-
-                            startTime = mSR.delayMints(time.time() - startTime,loopInterval)   
+                    handler.onData(ser.read(ser.in_waiting or 1))
 
                 except KeyboardInterrupt:
-                    print("\nUser interrupted. Exiting...")
+                    logger.info("User interrupted. Exiting...")
                     break  # Exit the loop graceful
 
                 except Exception as e:
-                    print(f"Incomplete read. Error: {e}")
+                    logger.error("Incomplete read. Error: %s",e)
                     time.sleep(60)
                     # break  # Exit the loop if an error occurs
 
     except serial.SerialException as e:
-        print(f"Failed to connect to {methanePort}. Error: {e}")
+        logger.error("Failed to connect to %s. Error: %s",methanePort,e)
 
 
 def printSettings(response,dateTime):
@@ -152,27 +164,26 @@ def printSettings(response,dateTime):
             ("val_crc", int(lineSettings[34], 16)),  # CRC Value
             ("inv_crc", int(lineSettings[35], 16)),  # 1's Complement of CRC
         ])
-        pprint(settingsDictionary)
         mSR.sensorFinisher(dateTime,"INIR2ME5SET",settingsDictionary)
 
 
 def send_command(command,ser):
     if not command.isalpha() or len(command) != 1:
-        print("Invalid command. Use a single uppercase letter.")
+        logger.error("Invalid command. Use a single uppercase letter.")
         return
     # Format the command structure and encode it
     full_command = f"[{command.upper()}]"
     ser.write(full_command.encode())
     response = ser.read(500).decode(errors="ignore")
     time.sleep(.2)
-    print(f"Sent command: {full_command}")
+    logger.debug("Sent command: %s",full_command)
     time.sleep(.2)
     response = ser.read(500).decode(errors="ignore")
     response = response.strip()
-    print(f"Response: {response.strip()}")
+    logger.debug("Response: %s",response)
     time.sleep(1)
     if response.endswith("5b414b5d"):
-        print("Command Accepted")
+        logger.info("Command Accepted")
         return True,response
     else:
         return False,response
@@ -182,6 +193,8 @@ def send_command(command,ser):
     # print(f"Response: {response.strip()}")
 
 if __name__ == "__main__":
+    # Turns the kill sent by killAll.sh into a normal exit so queued rows are written
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     print("=============")
     print("    MINTS    ")
     print("=============")
@@ -1,3 +1,5 @@
+import signal
+import sys
 from datetime import timezone
 import time
 import os
@@ -9,8 +11,10 @@ from requests import get
 import yaml
 from mintsXU4 import mintsSensorReader as mSR
 from mintsXU4 import mintsDefinitions  as mD
+from mintsXU4 import mintsLogger as mLog
 
 dataFolder = mD.dataFolder
+logger     = mLog.getLogger("ipReader")
 
 # # This can be a list 
 # wearablesFile   = mD.wearablesFile
@@ -24,7 +28,7 @@ def main():
     
     sensorName = "IP"
     dateTimeNow = datetime.datetime.now()
-    print("Gaining Public and Private IPs")
+    logger.info("Gaining Public and Private IPs")
 
     publicIp = get('https://api.ipify.org').text
 
@@ -39,6 +43,8 @@ def main():
     mSR.sensorFinisherIP(dateTimeNow,sensorName,sensorDictionary)
 
 if __name__ == "__main__":
+    # Turns the kill sent by killAll.sh into a normal exit so queued rows are written
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     print("=============")
     print("    MINTS    ")
     print("=============")
@@ -5,6 +5,9 @@ sleep 1
 kill $(pgrep -f 'airMarReader.py')
 sleep 1
 
+kill $(pgrep -f 'serialHub.py')
+sleep 1
+
 kill $(pgrep -f 'gaseraOneReader.py')
 sleep 1
 
@@ -16,3 +19,6 @@ sleep 1
 
 kill $(pgrep -f 'tgs2611c00Reader.py')
 sleep 1
+
+kill $(pgrep -f 'mqttGateway.py')
+sleep 1
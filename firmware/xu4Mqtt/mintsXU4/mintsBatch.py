@@ -0,0 +1,223 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module packs several records of a sensor into one MQTT message.
+#   The body is MessagePack with one column per field and a schema id in
+#   place of the field names, which are published once on a retained
+#   <topic>/schema message. It needs msgpack, which is optional on the nodes.
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+import datetime
+import time
+import zlib
+from collections import OrderedDict
+
+from mintsXU4 import mintsSchema as mSchema
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+batchVersion = 1
+epoch        = datetime.datetime(1970, 1, 1)
+microsecond  = datetime.timedelta(microseconds=1)
+
+
+def getSchemaID(keys):
+    return zlib.crc32("\x1f".join(keys).encode())
+
+
+def getTypes(topic, sensorDictionary, keys):
+    # The field types of the schema of the sensor, the last part of the topic
+    schema = getattr(sensorDictionary, "schema", None) or \
+        mSchema.getSchema(topic.rsplit("/", 1)[-1])
+    if schema is None or schema.keys != keys:
+        return (None,)*len(keys)
+    return schema.types
+
+
+def compactValue(valueIn, typeIn=None):
+    # Numbers a parser kept as strings travel as numbers of their schema
+    # type. Untyped values travel as they are: a guess would turn the
+    # timestamp "010203.00" into 10203.0 and checksums into ints or strings
+    if typeIn in (int, float) and isinstance(valueIn, str):
+        return mSchema.converters[typeIn](valueIn)
+    return valueIn
+
+
+def compactDateTime(valueIn):
+    # Microseconds since 1970 of the naive local time the readers record
+    if not isinstance(valueIn, datetime.datetime):
+        valueIn = datetime.datetime.fromisoformat(str(valueIn))
+    return (valueIn.replace(tzinfo=None) - epoch)//microsecond
+
+
+class BatchEncoder:
+    """Collects the records of each topic and encodes them in batches.
+
+    add() returns the messages that are ready, as (topic, payload, retain):
+    the retained schema message the first time a set of fields is seen, and
+    the batch once it holds maxRecords records or is window seconds old.
+    flushDue() returns the batches older than window seconds, for topics
+    that went quiet. A change of fields closes the batch. Values are
+    converted to the field types of mintsSchema, if the sensor has them.
+
+    Batch body  : [version, schemaID, count, [column, ...]]
+    Schema body : [version, schemaID, [key, ...]]
+    dateTime columns are sent as microseconds since 1970.
+    """
+
+    def __init__(self, window=10, maxRecords=60):
+        if msgpack is None:
+            raise ImportError("msgpack is needed for batched MQTT payloads")
+        self.window      = window
+        self.maxRecords  = maxRecords
+        self.batches     = {}
+        self.schemasSent = {}
+
+    def add(self, topic, sensorDictionary):
+        messages = []
+        keys     = tuple(sensorDictionary)
+        batch    = self.batches.get(topic)
+        if batch is not None and (batch["keys"] != keys or
+                                  time.time() - batch["started"] >= self.window):
+            messages.append(self.encode(topic, self.batches.pop(topic)))
+            batch = None
+
+        if batch is None:
+            schemaID = getSchemaID(keys)
+            if self.schemasSent.get(topic) != schemaID:
+                messages.append((topic + "/schema", msgpack.packb(
+                    [batchVersion, schemaID, list(keys)]), True))
+                self.schemasSent[topic] = schemaID
+            batch = self.batches[topic] = {
+                "keys"     : keys,
+                "schemaID" : schemaID,
+                "types"    : getTypes(topic, sensorDictionary, keys),
+                "columns"  : [[] for _ in keys],
+                "started"  : time.time(),
+                }
+
+        for column, keyIn, typeIn in zip(batch["columns"], keys, batch["types"]):
+            valueIn = sensorDictionary[keyIn]
+            column.append(compactDateTime(valueIn) if keyIn == "dateTime"
+                          else compactValue(valueIn, typeIn))
+
+        if len(batch["columns"][0]) >= self.maxRecords:
+            messages.append(self.encode(topic, self.batches.pop(topic)))
+        return messages
+
+    def encode(self, topic, batch):
+        payload = msgpack.packb([batchVersion, batch["schemaID"],
+                                 len(batch["columns"][0]), batch["columns"]])
+        return (topic + "/batch", payload, False)
+
+    def flushDue(self):
+        now = time.time()
+        return [self.encode(topic, self.batches.pop(topic))
+                for topic in [topic for topic, batch in self.batches.items()
+                              if (now - batch["started"]) >= self.window]]
+
+    def flushAll(self):
+        return [self.encode(topic, self.batches.pop(topic))
+                for topic in list(self.batches)]
+
+
+class BatchDecoder:
+    """Turns batch messages back into records, for subscribers.
+
+    Schemas are learned from the retained <topic>/schema messages with
+    addSchema(). decode() raises KeyError for a schema it has not seen.
+    """
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError("msgpack is needed for batched MQTT payloads")
+        self.schemas = {}
+
+    def addSchema(self, payload):
+        version, schemaID, keys = msgpack.unpackb(payload)
+        self.schemas[schemaID] = keys
+        return schemaID
+
+    def decode(self, payload):
+        version, schemaID, count, columns = msgpack.unpackb(payload)
+        keys = self.schemas[schemaID]
+        for index, keyIn in enumerate(keys):
+            if keyIn == "dateTime":
+                columns[index] = [str(epoch + valueIn*microsecond)
+                                  for valueIn in columns[index]]
+        return [OrderedDict(zip(keys, row)) for row in zip(*columns)]
+
+
+def decodeBatch(schemaPayload, batchPayload):
+    decoder = BatchDecoder()
+    decoder.addSchema(schemaPayload)
+    return decoder.decode(batchPayload)
+
+
+if __name__ == "__main__":
+    # Bytes and CPU per sample of batched payloads against one JSON per record
+    # run python3 -m mintsXU4.mintsBatch
+    import json
+
+    records   = 6000
+    startTime = datetime.datetime(2025, 1, 4, 13, 1, 59, 123456)
+    sensors   = OrderedDict([
+        ("SJH5", lambda index: OrderedDict([
+            ("dateTime"           , str(startTime + datetime.timedelta(seconds=index))),
+            ("methane"            , 2.13 + (index % 7)/100.0),
+            ("warmUpStatus"       , 0),
+            ("malFunctionStatus"  , 0),
+            ("rangeStatus"        , 0),
+            ("calibrationStatus"  , 16),
+            ("highHumidityStatus" , 0),
+            ("RCDOverLimitStatus" , 0),
+            ("MCDOverLimitStatus" , 0),
+            ("timeElapsed"        , 3600 + index),
+            ])),
+        ("TGS2611C00", lambda index: OrderedDict([
+            ("dateTime"            , str(startTime + datetime.timedelta(seconds=index))),
+            ("methaneEQBusVoltage" , 0.412 + (index % 11)/1000.0),
+            ("timeElapsed"         , 3600 + index),
+            ])),
+        ])
+
+    for sensorName, makeRecord in sensors.items():
+        topic = "001e06323a06/" + sensorName
+        rows  = [makeRecord(index) for index in range(records)]
+
+        cpuStart  = time.process_time()
+        jsonBytes = sum(len(json.dumps(row)) for row in rows)
+        jsonCPU   = time.process_time() - cpuStart
+
+        encoder   = BatchEncoder(window=60, maxRecords=60)
+        cpuStart  = time.process_time()
+        messages  = []
+        for row in rows:
+            messages.extend(encoder.add(topic, row))
+        messages.extend(encoder.flushAll())
+        batchCPU  = time.process_time() - cpuStart
+        batchBytes = sum(len(payload) for _, payload, _ in messages)
+
+        decoder   = BatchDecoder()
+        decoded   = []
+        for topicOut, payload, retain in messages:
+            if topicOut.endswith("/schema"):
+                decoder.addSchema(payload)
+            else:
+                decoded.extend(decoder.decode(payload))
+
+        print(sensorName)
+        print("  Records                  : {0}".format(records))
+        print("  JSON  bytes per sample   : {0:.1f}".format(jsonBytes/records))
+        print("  Batch bytes per sample   : {0:.1f}".format(batchBytes/records))
+        print("  JSON  CPU per sample (us): {0:.2f}".format(1e6*jsonCPU/records))
+        print("  Batch CPU per sample (us): {0:.2f}".format(1e6*batchCPU/records))
+        print("  Messages                 : {0} -> {1}".format(records, len(messages)))
+        print("  Decoded round trip       : {0}".format(
+            decoded[-1]["dateTime"] == rows[-1]["dateTime"] and len(decoded) == records))
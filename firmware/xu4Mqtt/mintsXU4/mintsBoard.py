@@ -0,0 +1,223 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module keeps the newest record of every sensor in a memory mapped
+#   file shared by all reader processes of a node. Consumers read it without
+#   opening or parsing the <sensor>.json latest files.
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+import fcntl
+import marshal
+import mmap
+import os
+import struct
+import time
+import zlib
+from collections import OrderedDict
+
+from mintsXU4 import mintsLogger as mLog
+
+logger = mLog.getLogger(__name__)
+
+boardMagic      = b"MINTSBRD"
+boardVersion    = 1
+marshalVersion  = 4
+
+# magic, board version, marshal version, slot count, slot size
+headerFormat    = struct.Struct("<8sIIII")
+headerSize      = 64
+# sequence, payload length, payload crc32, name length, name
+slotFormat      = struct.Struct("<IIIH48s")
+slotHeaderSize  = 64
+
+
+class LatestBoard:
+    """Fixed layout board of latest values in a memory mapped file.
+
+    Every sensor owns one slot. Slots are claimed once under a file lock and
+    after that each slot has a single writer (the reader process of that
+    sensor), which updates it with a seqlock: the sequence number is odd
+    while the payload is being written. Readers copy the payload and retry
+    if the sequence changed, was odd or the crc32 of the payload does not
+    match. The payload is the record as a marshal dump of its items.
+    """
+
+    def __init__(self, boardPath, slotCount=64, slotSize=2048):
+        self.boardPath = boardPath
+        self.indexes   = {}
+        directoryIn = os.path.dirname(boardPath)
+        if directoryIn and not os.path.isdir(directoryIn):
+            os.makedirs(directoryIn, exist_ok=True)
+
+        self.fd = os.open(boardPath, os.O_RDWR | os.O_CREAT, 0o664)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self.fd).st_size == 0:
+                os.ftruncate(self.fd, headerSize + slotCount*slotSize)
+                os.pwrite(self.fd, headerFormat.pack(
+                    boardMagic, boardVersion, marshalVersion, slotCount, slotSize), 0)
+            magic, version, marshalIn, self.slotCount, self.slotSize = \
+                headerFormat.unpack(os.pread(self.fd, headerFormat.size, 0))
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+        if magic != boardMagic or version != boardVersion or marshalIn != marshalVersion:
+            os.close(self.fd)
+            raise ValueError("Unsupported latest board at " + boardPath)
+        self.board = mmap.mmap(self.fd, headerSize + self.slotCount*self.slotSize)
+
+    def slotOffset(self, index):
+        return headerSize + index*self.slotSize
+
+    def readName(self, index):
+        seq, length, crc, nameLength, name = \
+            slotFormat.unpack_from(self.board, self.slotOffset(index))
+        return name[:nameLength].decode() if nameLength else None
+
+    def findSlot(self, sensorName):
+        index = self.indexes.get(sensorName)
+        if index is not None:
+            return index
+        for index in range(self.slotCount):
+            nameIn = self.readName(index)
+            if nameIn is None:
+                break
+            self.indexes[nameIn] = index
+        return self.indexes.get(sensorName)
+
+    def claimSlot(self, sensorName):
+        nameBytes = sensorName.encode()[:48]
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            index = self.findSlot(sensorName)
+            if index is not None:
+                return index
+            for index in range(self.slotCount):
+                if self.readName(index) is None:
+                    slotFormat.pack_into(self.board, self.slotOffset(index),
+                                         0, 0, 0, len(nameBytes), nameBytes)
+                    self.indexes[sensorName] = index
+                    return index
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        raise ValueError("Latest board is full")
+
+    def update(self, sensorName, sensorDictionary):
+        index = self.findSlot(sensorName)
+        if index is None:
+            index = self.claimSlot(sensorName)
+        try:
+            payload = marshal.dumps(tuple(sensorDictionary.items()), marshalVersion)
+        except ValueError:
+            # Values marshal cannot store (e.g. datetime) are kept as strings
+            payload = marshal.dumps(tuple((keyIn, valueIn if isinstance(
+                valueIn, (str, int, float, bool, type(None))) else str(valueIn))
+                for keyIn, valueIn in sensorDictionary.items()), marshalVersion)
+        if len(payload) > self.slotSize - slotHeaderSize:
+            logger.error("%s record too large for the latest board", sensorName)
+            return False
+
+        offset = self.slotOffset(index)
+        board  = self.board
+        seq    = struct.unpack_from("<I", board, offset)[0]
+        if seq & 1:
+            seq += 1
+        struct.pack_into("<I", board, offset, (seq + 1) & 0xFFFFFFFF)
+        start = offset + slotHeaderSize
+        board[start:start + len(payload)] = payload
+        struct.pack_into("<II", board, offset + 4, len(payload), zlib.crc32(payload))
+        struct.pack_into("<I", board, offset, (seq + 2) & 0xFFFFFFFF)
+        return True
+
+    def readSlot(self, index, retries=100):
+        offset = self.slotOffset(index)
+        start  = offset + slotHeaderSize
+        board  = self.board
+        for attempt in range(retries):
+            seq, length, crc = struct.unpack_from("<III", board, offset)
+            if seq == 0:
+                return None
+            if not seq & 1:
+                payload = board[start:start + length]
+                if struct.unpack_from("<I", board, offset)[0] == seq and \
+                        zlib.crc32(payload) == crc:
+                    return OrderedDict(marshal.loads(payload))
+            time.sleep(0)
+        return None
+
+    def read(self, sensorName):
+        index = self.findSlot(sensorName)
+        if index is None:
+            return None
+        return self.readSlot(index)
+
+    def readAll(self):
+        self.findSlot(None)
+        latest = OrderedDict()
+        for sensorName, index in sorted(self.indexes.items(), key=lambda item: item[1]):
+            sensorDictionary = self.readSlot(index)
+            if sensorDictionary is not None:
+                latest[sensorName] = sensorDictionary
+        return latest
+
+    def close(self):
+        if not self.board.closed:
+            self.board.close()
+            os.close(self.fd)
+
+
+if __name__ == "__main__":
+    # Latest value board against the <sensor>.json files
+    # run python3 -m mintsXU4.mintsBoard
+    import json
+    import tempfile
+
+    records  = 20000
+    folder   = tempfile.mkdtemp()
+    board    = LatestBoard(os.path.join(folder, "latest.board"))
+    jsonPath = os.path.join(folder, "INIR2ME5.json")
+    sensorDictionary = OrderedDict([
+        ("dateTime"      , "2025-01-04 13:01:59.123456"),
+        ("methane"       , 2012),
+        ("faultCode"     , 0),
+        ("temperature"   , 26.35),
+        ("ref1SecAverage", 1048576),
+        ("act1SecAverage", 1036288),
+        ("crc"           , 53721),
+        ("crc1sComp"     , 4294913574),
+        ("timeElapsed"   , 3600),
+        ])
+
+    startTime = time.perf_counter()
+    for _ in range(records):
+        tempPath = jsonPath + ".tmp"
+        with open(tempPath, 'w') as fp:
+            json.dump(sensorDictionary, fp)
+        os.replace(tempPath, jsonPath)
+    jsonWrite = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    for _ in range(records):
+        with open(jsonPath, 'r') as fp:
+            json.load(fp)
+    jsonRead = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    for _ in range(records):
+        board.update("INIR2ME5", sensorDictionary)
+    boardWrite = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    for _ in range(records):
+        board.read("INIR2ME5")
+    boardRead = time.perf_counter() - startTime
+
+    print("Records                    : {0}".format(records))
+    print("JSON  write (us)           : {0:.2f}".format(1e6*jsonWrite/records))
+    print("JSON  read  (us)           : {0:.2f}".format(1e6*jsonRead/records))
+    print("Board write (us)           : {0:.2f}".format(1e6*boardWrite/records))
+    print("Board read  (us)           : {0:.2f}".format(1e6*boardRead/records))
+    board.close()
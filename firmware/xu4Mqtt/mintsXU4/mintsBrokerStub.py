@@ -0,0 +1,221 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module is a small loopback stand-in for the MQTT broker, with or
+#   without TLS, so the publish path can be measured without the production
+#   broker and its credentials. It speaks just enough MQTT 3.1.1 for paho:
+#   CONNECT, PUBLISH (QoS 0 and 1), SUBSCRIBE, PINGREQ and DISCONNECT.
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+import os
+import socket
+import ssl
+import subprocess
+import threading
+import time
+
+from mintsXU4 import mintsLogger as mLog
+
+logger = mLog.getLogger(__name__)
+
+
+def generateCertificates(folder):
+    """Creates a test CA and a certificate for localhost/127.0.0.1 signed by
+    it with the openssl command. Returns (caFile, certFile, keyFile)."""
+    os.makedirs(folder, exist_ok=True)
+    caKey    = os.path.join(folder, "ca.key")
+    caFile   = os.path.join(folder, "ca.crt")
+    keyFile  = os.path.join(folder, "server.key")
+    csrFile  = os.path.join(folder, "server.csr")
+    certFile = os.path.join(folder, "server.crt")
+    extFile  = os.path.join(folder, "server.ext")
+    with open(extFile, "w") as fp:
+        fp.write("subjectAltName=DNS:localhost,IP:127.0.0.1\n"
+                 "basicConstraints=CA:FALSE\n"
+                 "keyUsage=critical,digitalSignature,keyEncipherment\n"
+                 "extendedKeyUsage=serverAuth\n"
+                 "authorityKeyIdentifier=keyid\n")
+    commands = [
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "30",
+         "-keyout", caKey, "-out", caFile, "-subj", "/CN=MINTS Test CA",
+         "-addext", "basicConstraints=critical,CA:TRUE",
+         "-addext", "keyUsage=critical,keyCertSign,cRLSign"],
+        ["openssl", "req", "-newkey", "rsa:2048", "-nodes",
+         "-keyout", keyFile, "-out", csrFile, "-subj", "/CN=localhost"],
+        ["openssl", "x509", "-req", "-in", csrFile, "-CA", caFile, "-CAkey", caKey,
+         "-CAcreateserial", "-days", "30", "-out", certFile, "-extfile", extFile],
+        ]
+    for command in commands:
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+    return caFile, certFile, keyFile
+
+
+def readExactly(connection, length):
+    data = b""
+    while len(data) < length:
+        chunk = connection.recv(length - len(data))
+        if not chunk:
+            raise ConnectionError("client closed the connection")
+        data += chunk
+    return data
+
+
+def readPacket(connection):
+    header     = readExactly(connection, 1)[0]
+    length     = 0
+    multiplier = 1
+    while True:
+        byteIn      = readExactly(connection, 1)[0]
+        length     += (byteIn & 0x7F)*multiplier
+        multiplier *= 128
+        if not byteIn & 0x80:
+            break
+    return header, readExactly(connection, length)
+
+
+class BrokerStub:
+    """Loopback MQTT broker stand-in.
+
+    Every PUBLISH is kept as (receivedTime, topic, payload) in received.
+    dropClients() closes every client connection and, with refuseFor,
+    turns new connections away for that many seconds, to exercise the
+    reconnect path of the clients. stop() closes the listening socket as a
+    broker down for maintenance would, start() opens it again on the same
+    port. Nothing is routed to subscribers.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, certFile=None, keyFile=None):
+        self.host         = host
+        self.sslContext   = None
+        if certFile is not None:
+            self.sslContext = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            self.sslContext.load_cert_chain(certFile, keyFile)
+        self.port         = port
+        self.listener     = None
+        self.bind()
+        self.clients      = set()
+        self.lock         = threading.Lock()
+        self.received     = []
+        self.connects     = 0
+        self.drops        = 0
+        self.refuseUntil  = 0
+        self.running      = False
+
+    def bind(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((self.host, self.port))
+        self.port     = self.listener.getsockname()[1]
+
+    def start(self):
+        if self.listener is None:
+            self.bind()
+        self.running = True
+        self.listener.listen(16)
+        threading.Thread(target=self.accept, name="brokerStub", daemon=True).start()
+        return self
+
+    def accept(self):
+        listener = self.listener
+        while self.running:
+            try:
+                connection, address = listener.accept()
+            except OSError:
+                return
+            if time.time() < self.refuseUntil:
+                connection.close()
+                continue
+            threading.Thread(target=self.serve, args=(connection,), daemon=True).start()
+
+    def serve(self, connection):
+        try:
+            if self.sslContext is not None:
+                connection = self.sslContext.wrap_socket(connection, server_side=True)
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self.lock:
+                self.clients.add(connection)
+            while self.running:
+                header, body = readPacket(connection)
+                self.handle(connection, header, body)
+        except (OSError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            with self.lock:
+                self.clients.discard(connection)
+            connection.close()
+
+    def handle(self, connection, header, body):
+        packetType = header >> 4
+        if packetType == 1:        # CONNECT
+            self.connects += 1
+            connection.sendall(b"\x20\x02\x00\x00")
+        elif packetType == 3:      # PUBLISH
+            receivedTime = time.time()
+            qos          = (header >> 1) & 0x03
+            topicLength  = int.from_bytes(body[:2], "big")
+            topic        = body[2:2 + topicLength].decode()
+            start        = 2 + topicLength
+            if qos:
+                connection.sendall(b"\x40\x02" + body[start:start + 2])
+                start += 2
+            with self.lock:
+                self.received.append((receivedTime, topic, body[start:]))
+        elif packetType == 8:      # SUBSCRIBE, granted QoS 0 (one topic per request)
+            connection.sendall(b"\x90\x03" + body[:2] + b"\x00")
+        elif packetType == 12:     # PINGREQ
+            connection.sendall(b"\xd0\x00")
+        elif packetType == 14:     # DISCONNECT
+            raise ConnectionError("client disconnected")
+
+    def dropClients(self, refuseFor=0):
+        self.refuseUntil = time.time() + refuseFor
+        with self.lock:
+            clients = list(self.clients)
+        for connection in clients:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.drops += 1
+
+    def takeReceived(self):
+        with self.lock:
+            received, self.received = self.received, []
+        return received
+
+    def stop(self):
+        self.running = False
+        if self.listener is not None:
+            # Wakes the accept thread, close alone leaves the port taken on Linux
+            try:
+                self.listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.listener.close()
+            self.listener = None
+        self.dropClients()
+
+
+if __name__ == "__main__":
+    # Runs a stand-in broker until interrupted
+    # run python3 -m mintsXU4.mintsBrokerStub [port] [tls]
+    import sys
+    import tempfile
+
+    port     = int(sys.argv[1]) if len(sys.argv) > 1 else 1883
+    certFile = keyFile = None
+    if "tls" in sys.argv:
+        caFile, certFile, keyFile = generateCertificates(tempfile.mkdtemp())
+        print("CA certificate             : {0}".format(caFile))
+    broker = BrokerStub(port=port, certFile=certFile, keyFile=keyFile).start()
+    print("Broker stub listening      : {0}:{1}".format(broker.host, broker.port))
+    try:
+        while True:
+            time.sleep(10)
+            print("Connects {0}, messages {1}".format(broker.connects, len(broker.received)))
+    except KeyboardInterrupt:
+        broker.stop()
@@ -0,0 +1,252 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module compresses single MQTT payloads with zstd and a dictionary
+#   trained offline on past records of the sensor, so the field names that
+#   every JSON message repeats cost next to nothing, without holding records
+#   back as batching does. Compressed messages go to <topic>/zstd with a
+#   7 byte header: "MZ", the codec version and the id of the dictionary.
+#   It needs zstandard, which is optional on the nodes.
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+import csv
+import glob
+import json
+import os
+import struct
+
+from mintsXU4 import mintsSchema as mSchema
+from mintsXU4 import mintsWriter as mW
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+codecMagic   = b"MZ"
+codecVersion = 1
+codecSuffix  = "/zstd"
+headerFormat = struct.Struct("<2sBI")    # magic, codec version, dictionary id
+
+
+def requireZstandard():
+    if zstandard is None:
+        raise ImportError("Dictionary compressed payloads need zstandard")
+
+
+def getDictionaryPath(folder, sensorName, dictID):
+    return os.path.join(folder, "%s-%010d.zdict" % (sensorName, dictID))
+
+
+def loadDictionaries(folder):
+    """Every dictionary in folder as {dictID: (sensorName, dictionary)}.
+    Files are named <sensorName>-<dictID>.zdict, old ones are kept so the
+    ingest side can still read messages compressed with them."""
+    requireZstandard()
+    dictionaries = {}
+    for dictPath in sorted(glob.glob(os.path.join(folder, "*.zdict")),
+                           key=os.path.getmtime):
+        sensorName = os.path.basename(dictPath).rsplit("-", 1)[0]
+        with open(dictPath, "rb") as fp:
+            dictionary = zstandard.ZstdCompressionDict(fp.read())
+        dictionaries[dictionary.dict_id()] = (sensorName, dictionary)
+    return dictionaries
+
+
+def trainDictionary(samples, size=4096):
+    requireZstandard()
+    return zstandard.train_dictionary(size, samples)
+
+
+def saveDictionary(folder, sensorName, dictionary):
+    os.makedirs(folder, exist_ok=True)
+    dictPath = getDictionaryPath(folder, sensorName, dictionary.dict_id())
+    with open(dictPath, "wb") as fp:
+        fp.write(dictionary.as_bytes())
+    return dictPath
+
+
+def toPayload(schema, row):
+    # CSV holds strings, the nodes publish typed values. Rows of the fields
+    # of the schema are converted by it, others are left as they are
+    if schema is not None and list(row) == schema.keyList:
+        row = schema.record(*row.values())
+    return json.dumps(row, default=mSchema.jsonDefault).encode()
+
+
+def readSamples(paths, sensorName=None):
+    """Payloads as the nodes publish them, from daily CSV files (.csv,
+    .csv.gz or .csv.zst) or JSON files (one record, or one record per
+    line). CSV rows go through the schema of sensorName, if it has one."""
+    schema  = mSchema.getSchema(sensorName)
+    samples = []
+    for path in paths:
+        if path.endswith((".csv", ".csv.gz", ".csv.zst")):
+            with mW.openCSV(path) as fp:
+                samples.extend(toPayload(schema, row) for row in csv.DictReader(fp))
+        else:
+            with open(path) as fp:
+                samples.extend(line.strip().encode() for line in fp if line.strip())
+    return samples
+
+
+class PayloadEncoder:
+    """Compresses the payloads of the sensors that have a dictionary.
+
+    The newest dictionary of a sensor is used. encode() returns None for the
+    others, which are published as plain JSON on their usual topic.
+    """
+
+    def __init__(self, folder, level=3):
+        requireZstandard()
+        self.compressors = {}
+        for dictID, (sensorName, dictionary) in loadDictionaries(folder).items():
+            # The dictionary id is in our header, zstd need not repeat it
+            self.compressors[sensorName] = (headerFormat.pack(codecMagic, codecVersion, dictID),
+                                            zstandard.ZstdCompressor(
+                                                level=level, dict_data=dictionary,
+                                                write_checksum=False, write_dict_id=False))
+        self.encoded = 0
+        self.rawBytes = 0
+        self.encodedBytes = 0
+
+    def encode(self, sensorName, payload):
+        compressor = self.compressors.get(sensorName)
+        if compressor is None:
+            return None
+        if isinstance(payload, str):
+            payload = payload.encode()
+        header, compressor = compressor
+        encoded = header + compressor.compress(payload)
+        self.encoded      += 1
+        self.rawBytes     += len(payload)
+        self.encodedBytes += len(encoded)
+        return encoded
+
+    def stats(self):
+        return {
+            "encoded"     : self.encoded,
+            "ratio"       : round(self.rawBytes/max(self.encodedBytes, 1), 2),
+            "dictionaries": sorted(self.compressors),
+            }
+
+
+class PayloadDecoder:
+    """Ingest side: turns <topic>/zstd messages back into JSON payloads."""
+
+    def __init__(self, folder):
+        self.folder        = folder
+        self.decompressors = {}
+        self.reload()
+
+    def reload(self):
+        # Picks up dictionaries published since the decoder was started
+        for dictID, (sensorName, dictionary) in loadDictionaries(self.folder).items():
+            if dictID not in self.decompressors:
+                self.decompressors[dictID] = zstandard.ZstdDecompressor(dict_data=dictionary)
+
+    def decode(self, payload):
+        if len(payload) < headerFormat.size:
+            raise ValueError("Payload of %d bytes is too short" % len(payload))
+        magic, version, dictID = headerFormat.unpack_from(payload)
+        if magic != codecMagic or version != codecVersion:
+            raise ValueError("Not a compressed payload of codec version %d" % codecVersion)
+        decompressor = self.decompressors.get(dictID)
+        if decompressor is None:
+            self.reload()
+            decompressor = self.decompressors.get(dictID)
+        if decompressor is None:
+            raise ValueError("Unknown dictionary %d" % dictID)
+        # Frames carry their size, see PayloadEncoder
+        return decompressor.decompress(payload[headerFormat.size:])
+
+    def decodeMessage(self, topic, payload):
+        """Returns (topic, JSON payload) of any message of a node."""
+        if topic.endswith(codecSuffix):
+            return topic[:-len(codecSuffix)], self.decode(payload)
+        return topic, payload
+
+
+if __name__ == "__main__":
+    # Trains, decodes or compares payload sizes
+    # run python3 -m mintsXU4.mintsCodec train <sensorName> <csv or json files> [--size N] [--folder F]
+    #     python3 -m mintsXU4.mintsCodec decode <topic> <payload file> [--folder F]
+    #     python3 -m mintsXU4.mintsCodec benchmark
+    import argparse
+    import datetime
+    import random
+    import shutil
+    import tempfile
+    import time
+    from collections import OrderedDict
+
+    from mintsXU4 import mintsDefinitions as mD
+
+    parser = argparse.ArgumentParser(description="zstd dictionaries for MQTT payloads")
+    parser.add_argument("command", choices=["train", "decode", "benchmark"])
+    parser.add_argument("arguments", nargs="*")
+    parser.add_argument("--size",   type=int, default=4096, help="dictionary bytes")
+    parser.add_argument("--folder", default=mD.mqttCodecFolder)
+    arguments = parser.parse_args()
+
+    if arguments.command == "train":
+        sensorName = arguments.arguments[0]
+        samples    = readSamples(arguments.arguments[1:], sensorName)
+        dictPath   = saveDictionary(arguments.folder, sensorName,
+                                    trainDictionary(samples, arguments.size))
+        print("Dictionary of {0} samples  : {1}".format(len(samples), dictPath))
+
+    elif arguments.command == "decode":
+        topic, payloadFile = arguments.arguments[:2]
+        with open(payloadFile, "rb") as fp:
+            topic, payload = PayloadDecoder(arguments.folder).decodeMessage(topic, fp.read())
+        print(topic, payload.decode())
+
+    else:
+        # A day of SJH5 at 1 Hz, trained on the day before
+        random.seed(4)
+
+        def makeRecord(dateTime):
+            return json.dumps(OrderedDict([
+                ("dateTime"           , str(dateTime)),
+                ("methane"            , round(random.gauss(2.13, 0.05), 2)),
+                ("warmUpStatus"       , 0),
+                ("malFunctionStatus"  , 0),
+                ("rangeStatus"        , 0),
+                ("calibrationStatus"  , 16),
+                ("highHumidityStatus" , 0),
+                ("RCDOverLimitStatus" , 0),
+                ("MCDOverLimitStatus" , 0),
+                ("timeElapsed"        , random.randint(0, 86400)),
+                ])).encode()
+
+        startTime = datetime.datetime(2025, 1, 4, 0, 0, 0, 123456)
+        history   = [makeRecord(startTime + datetime.timedelta(seconds=second))
+                     for second in range(0, 86400, 10)]
+        live      = [makeRecord(startTime + datetime.timedelta(days=1, seconds=second))
+                     for second in range(3600)]
+        folder    = tempfile.mkdtemp()
+        try:
+            saveDictionary(folder, "SJH5", trainDictionary(history, arguments.size))
+            encoder  = PayloadEncoder(folder)
+            decoder  = PayloadDecoder(folder)
+            cpuStart = time.process_time()
+            encoded  = [encoder.encode("SJH5", payload) for payload in live]
+            cpuTime  = time.process_time() - cpuStart
+            plain    = zstandard.ZstdCompressor(level=3)
+        finally:
+            shutil.rmtree(folder)
+
+        print("SJH5")
+        print("  JSON bytes per message   : {0:.1f}".format(
+            sum(len(payload) for payload in live)/len(live)))
+        print("  zstd, no dictionary      : {0:.1f}".format(
+            sum(len(plain.compress(payload)) for payload in live)/len(live)))
+        print("  zstd with dictionary     : {0:.1f}".format(
+            sum(len(payload) for payload in encoded)/len(live)))
+        print("  CPU per message (us)     : {0:.2f}".format(1e6*cpuTime/len(live)))
+        print("  Decoded round trip       : {0}".format(
+            [decoder.decode(payload) for payload in encoded] == live))
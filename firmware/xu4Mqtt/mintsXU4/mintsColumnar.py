@@ -0,0 +1,246 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module writes typed daily Parquet files next to the daily CSV
+#   files. It needs pyarrow, which is optional on the nodes.
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+import math
+import os
+import time
+import datetime
+
+from mintsXU4 import mintsLogger as mLog
+from mintsXU4 import mintsSchema as mSchema
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+logger = mLog.getLogger(__name__)
+
+if pa is not None:
+    arrowTypes = {float: pa.float64(), int: pa.int64(), str: pa.string()}
+
+
+def inferType(keyIn, valueIn):
+    if keyIn == "dateTime":
+        return pa.timestamp("us")
+    if isinstance(valueIn, bool):
+        return pa.bool_()
+    if isinstance(valueIn, int):
+        return pa.int64()
+    if isinstance(valueIn, float):
+        return pa.float64()
+    # Strings stay strings, a checksum of "29" would otherwise make the
+    # column float and a later "2A" null
+    return pa.string()
+
+
+def inferSchema(sensorName, sensorDictionary):
+    schema = getattr(sensorDictionary, "schema", None)
+    if schema is None:
+        # Parsers that still build dictionaries of strings take the types
+        # of the schema registered for their sensor, if its fields match
+        schema = mSchema.getSchema(sensorName)
+        if schema is not None and schema.keyList != list(sensorDictionary.keys()):
+            schema = None
+    if schema is not None:
+        # Typed records (see mintsSchema) declare their types
+        return pa.schema([(keyIn, pa.timestamp("us") if keyIn == "dateTime"
+                           else arrowTypes[typeIn])
+                          for keyIn, typeIn in zip(schema.keys, schema.types)])
+    return pa.schema([(keyIn, inferType(keyIn, valueIn))
+                      for keyIn, valueIn in sensorDictionary.items()])
+
+
+def toTimestamp(valueIn):
+    if isinstance(valueIn, datetime.datetime):
+        return valueIn.replace(tzinfo=None)
+    return datetime.datetime.fromisoformat(str(valueIn)).replace(tzinfo=None)
+
+
+def toFloat(valueIn):
+    return float(valueIn)
+
+
+def toInt(valueIn):
+    # Never truncates, a column that gets 2.7 is widened first (see widen)
+    if isinstance(valueIn, float):
+        if not valueIn.is_integer():
+            raise ValueError("%r is not an integer" % valueIn)
+        return int(valueIn)
+    try:
+        return int(valueIn)
+    except ValueError:
+        return toInt(float(valueIn))
+
+
+def isIntegral(valueIn):
+    try:
+        number = float(valueIn)
+    except (TypeError, ValueError):
+        # Written as null whatever the type of the column
+        return True
+    return math.isnan(number) or number.is_integer()
+
+
+def toBool(valueIn):
+    return bool(valueIn)
+
+
+def toString(valueIn):
+    return str(valueIn)
+
+
+def getConverter(typeIn):
+    if pa.types.is_timestamp(typeIn):
+        return toTimestamp
+    if pa.types.is_boolean(typeIn):
+        return toBool
+    if pa.types.is_integer(typeIn):
+        return toInt
+    if pa.types.is_floating(typeIn):
+        return toFloat
+    return toString
+
+
+class ColumnarWriter:
+    """Buffers rows per sensor and writes them as Parquet row groups.
+
+    The schema of a sensor is the one registered in mintsSchema, else it
+    is inferred from the first dictionary seen for it (Python numbers by
+    their type, strings as strings). An int column that gets a value with
+    a fraction is widened to float64 and continues in a new part. Buffered
+    rows are written every flushInterval seconds and when the day is over.
+    A daily file stays open for the whole day because Parquet only becomes
+    readable once its footer is written on close. If the file of the day
+    already exists (the reader was restarted) the rows go to a new numbered
+    part, e.g. MINTS_0061_INIR2ME5_2024_01_04_1.parquet.
+    """
+
+    def __init__(self, flushInterval=300, compression="zstd"):
+        if pa is None:
+            raise ImportError("pyarrow is needed for columnar files")
+        self.flushInterval = flushInterval
+        self.compression   = compression
+        self.schemas       = {}
+        self.converters    = {}
+        self.buffers       = {}
+        self.writers       = {}
+        self.currentDate   = None
+        self.lastFlush     = time.time()
+
+    def append(self, csvPath, dateTime, sensorName, sensorDictionary):
+        dateIn = dateTime.date()
+        if self.currentDate is None or dateIn > self.currentDate:
+            self.currentDate = dateIn
+            self.closeBefore(dateIn)
+
+        if sensorName not in self.schemas:
+            schema = inferSchema(sensorName, sensorDictionary)
+            self.schemas[sensorName]    = schema
+            self.converters[sensorName] = [getConverter(field.type)
+                                           for field in schema]
+
+        writePath = os.path.splitext(csvPath)[0] + ".parquet"
+        buffer    = self.buffers.get(writePath)
+        if buffer is None:
+            buffer = self.buffers[writePath] = \
+                {"sensorName": sensorName, "date": dateIn, "rows": []}
+        buffer["rows"].append(sensorDictionary)
+
+        if dateIn < self.currentDate:
+            # Late record for a day that is already closed
+            self.close(writePath)
+        else:
+            self.flushIfDue()
+
+    def widen(self, sensorName, rows):
+        schema  = self.schemas[sensorName]
+        widened = []
+        for index, field in enumerate(schema):
+            if pa.types.is_integer(field.type) and \
+                    not all(isIntegral(row.get(field.name)) for row in rows):
+                schema = schema.set(index, pa.field(field.name, pa.float64()))
+                widened.append(field.name)
+        if not widened:
+            return
+        logger.warning("Columns %s of %s widened to float64", widened, sensorName)
+        self.schemas[sensorName]    = schema
+        self.converters[sensorName] = [getConverter(field.type) for field in schema]
+        # A Parquet file has one schema, the rows that follow go to a new part
+        for writePath in [path for path, buffer in self.buffers.items()
+                          if buffer["sensorName"] == sensorName and path in self.writers]:
+            self.writers.pop(writePath).close()
+
+    def toTable(self, sensorName, rows):
+        schema  = self.schemas[sensorName]
+        columns = []
+        for field, converter in zip(schema, self.converters[sensorName]):
+            column = []
+            for row in rows:
+                try:
+                    column.append(converter(row[field.name]))
+                except (KeyError, TypeError, ValueError):
+                    column.append(None)
+            columns.append(column)
+        return pa.Table.from_arrays(columns, schema=schema)
+
+    def getWriter(self, writePath, sensorName):
+        writer = self.writers.get(writePath)
+        if writer is None:
+            partPath = writePath
+            part     = 0
+            while os.path.exists(partPath):
+                part    += 1
+                partPath = writePath[:-len(".parquet")] + "_" + str(part) + ".parquet"
+            os.makedirs(os.path.dirname(partPath), exist_ok=True)
+            writer = pq.ParquetWriter(partPath, self.schemas[sensorName],
+                                      compression=self.compression)
+            self.writers[writePath] = writer
+        return writer
+
+    def flush(self, writePath):
+        buffer = self.buffers.get(writePath)
+        if buffer is not None and buffer["rows"]:
+            self.widen(buffer["sensorName"], buffer["rows"])
+            table = self.toTable(buffer["sensorName"], buffer["rows"])
+            self.getWriter(writePath, buffer["sensorName"]).write_table(table)
+            buffer["rows"] = []
+
+    def flushAll(self):
+        for writePath in list(self.buffers):
+            try:
+                self.flush(writePath)
+            except Exception as e:
+                logger.error("Columnar data not written, error: %s", e)
+        self.lastFlush = time.time()
+
+    def flushIfDue(self):
+        if (time.time() - self.lastFlush) >= self.flushInterval:
+            self.flushAll()
+
+    def close(self, writePath):
+        try:
+            self.flush(writePath)
+        finally:
+            self.buffers.pop(writePath, None)
+            writer = self.writers.pop(writePath, None)
+            if writer is not None:
+                writer.close()
+
+    def closeBefore(self, dateIn):
+        for writePath in [path for path, buffer in self.buffers.items()
+                          if buffer["date"] < dateIn]:
+            self.close(writePath)
+
+    def closeAll(self):
+        for writePath in list(self.buffers):
+            self.close(writePath)
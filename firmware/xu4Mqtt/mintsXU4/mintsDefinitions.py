@@ -1,6 +1,7 @@
 
 from getmac import get_mac_address
 import serial.tools.list_ports
+import os
 
 
 def findPort(find):
@@ -147,10 +148,57 @@ gpsOffJsonFile            = baseFolder + "statusFiles/gpsOff.json"
 
 
 latestOn              = True
+latestInterval        = 1       # Seconds between rewrites of a <sensor>.json latest file
+
+# For the Shared Latest Board, read with mintsBoard.LatestBoard(latestBoardFile)
+latestBoardOn         = True
+latestBoardFile       = "/dev/shm/mints_latest.board"
+if not os.path.isdir("/dev/shm"):
+    latestBoardFile   = baseFolder + "mintsData/latest.board"
+latestBoardSlots      = 64      # Sensors the board can hold
+latestBoardSlotSize   = 2048    # Bytes per sensor record
+
+# For Logging
+logLevel              = "INFO"  # DEBUG shows every record
+logRateLimit          = 10      # Seconds between repeats of the same message
+logSummaryInterval    = 60      # Seconds between record count summaries
 airmarPort            = find_serial_port_by_location('1-1.1')
 inir2me5Port          = find_serial_port_by_location('1-1.2')
 sjh5Port              = find_serial_port_by_location('1-1.3')
 
+# AirMar sentences kept by airMarReader.py, see mintsNMEA. Others are dropped,
+# every type at most once per interval seconds. A new type can be declared by
+# its fields instead of a parser, e.g.
+#   "GPGSA" : {"fields": [["mode", "str"], ["fixType", "int"], ...]},
+airmarSentences       = {
+    "HCHDT" : {"parser": "HCHDTWriteAM" , "interval": .5},
+    "WIMWV" : {"parser": "WIMWVWriteAM" , "interval": .5},
+    "GPGGA" : {"parser": "GPGGAWriteAM" , "interval": .5},
+    "GPVTG" : {"parser": "GPVTGWriteAM" , "interval": .5},
+    "GPZDA" : {"parser": "GPZDAWriteAM" , "interval": .5},
+    "WIMDA" : {"parser": "WIMDAWriteAM" , "interval": .5},
+    "YXXDR" : {"parser": "YXXDRWriteAM2", "interval": .5, "prefix": "$YXXDR,A"},
+    }
+
+
+# For CSV Writing
+csvCacheSize          = 16     # Daily CSV files kept open per process
+csvFlushInterval      = 1      # Seconds between flushes, 0 flushes every row
+csvFsync              = False  # fsync every flush to the SD card
+csvCompression        = "gzip" # gzip, zstd or None for daily files whose day is over
+
+# For the Background Writer 
+writerThreadOn        = True
+writerQueueSize       = 1000          # Records held while the SD card or broker is slow
+writerBatchSize       = 100           # Records handled per write cycle
+writerOverflow        = "dropOldest"  # dropOldest, dropNewest or block
+writerBlockTimeout    = 0.5           # Seconds a full queue blocks the sensor loop with "block"
+
+# For Columnar Files (needs pyarrow), written next to the daily CSV files
+columnarOn            = False
+columnarFlushInterval = 300     # Seconds between Parquet row groups
+columnarCompression   = "zstd"
+
 
 # For MQTT 
 mqttOn                = True
@@ -161,6 +209,68 @@ locationsFile         = 'mintsXU4/locations.yml'
 
 mqttBroker            = "mqtt.circ.utdallas.edu"
 mqttPort              =  8883  # Secure port
+mqttBrokers           = [(mqttBroker, mqttPort)]  # In order of preference, the first is the primary
+mqttFailoverAfter     = 2      # Failed connects before moving on to the next broker
+mqttProbeInterval     = 30     # Seconds between checks that a preferred broker is back
+mqttProbeTimeout      = 3
+mqttTLSCert           = "/etc/ssl/certs/ca-certificates.crt"
+mqttQueueSize         = 1000   # Messages held while the broker is unreachable
+mqttReconnectMin      = 1      # Seconds before the first reconnect, doubled on every failure
+mqttReconnectMax      = 120    # Longest wait between reconnects
+mqttKeepAlive         = 60
+mqttSpoolOn           = True   # Keeps messages on disk while the broker is unreachable
+mqttSpoolFolder       = baseFolder + "mintsData/spool"
+mqttSpoolMaxRows      = 500000 # Oldest messages are dropped beyond this
+mqttSpoolReplayRate   = 100    # Spooled messages sent per second once the broker is back
+mqttBatchOn           = False  # Batches records on <topic>/batch as MessagePack (needs msgpack)
+mqttBatchWindow       = 10     # Seconds a batch is held at most
+mqttBatchSize         = 60     # Records per batch at most
+mqttCodecOn           = False  # zstd with trained dictionaries on <topic>/zstd, see mintsCodec (needs zstandard)
+mqttCodecFolder       = baseFolder + "mintsData/dictionaries"
+mqttCodecLevel        = 3
+mqttGatewayOn         = True   # Readers publish through mqttGateway.py, directly when it is down
+mqttGatewaySocket     = "/tmp/mints/mqttGateway.sock"
+mqttGatewayTimeout    = 0.5    # Seconds a reader waits for room at the gateway
+
+# Summaries over tumbling windows for MQTT, see mintsWindow. CSV keeps every record
+mqttWindowOn          = False  # Publishes one summary per window instead of every record
+mqttWindow            = 10     # Seconds, windows are aligned to the clock
+mqttWindowExclude     = ["INIR2ME5SET", "GSR001ASTS", "GSR001AERR", "GSR001ATSK",
+                         "GSR001ANAM", "GSR001ANET", "GSR001ADEV"]
+# Fields that keep their last value instead of statistics: IDs, checksums, time
+# fields, coordinates and status bits. "*" applies to every sensor. Otherwise
+# the field types of mintsSchema decide, or the first value of the field
+mqttWindowLastValue   = {
+    "*"          : ["checkSum", "status", "timestamp", "timeElapsed"],
+    "GPGGA"      : ["UTCTimeStamp", "latitude", "longitude", "gpsQuality",
+                    "numberOfSatellites", "ageOfDifferential", "stationID"],
+    "GPZDA"      : ["UTCTimeStamp", "UTCDay", "UTCMonth", "UTCYear"],
+    "GPSGPGGA"   : ["latitude", "longitude", "gpsQuality", "numberOfSatellites",
+                    "age", "stationID"],
+    "GPSGPGGA2"  : ["latitude", "longitude", "latitudeCoordinate", "longitudeCoordinate",
+                    "gpsQuality", "numberOfSatellites", "age", "stationID"],
+    "GPSGPRMC"   : ["latitude", "longitude", "dateStamp"],
+    "GPSGPRMC2"  : ["latitude", "longitude", "latitudeCoordinate", "longitudeCoordinate",
+                    "dateStamp"],
+    "SJH5"       : ["warmUpStatus", "malFunctionStatus", "rangeStatus", "calibrationStatus",
+                    "highHumidityStatus", "RCDOverLimitStatus", "MCDOverLimitStatus"],
+    "INIR2ME5"   : ["faultCode", "crc", "crc1sComp"],
+    }
+
+# Deadband and heartbeat per sensor for MQTT, see mintsPolicy. CSV keeps every record
+mqttPolicyOn          = True
+mqttPolicy            = {
+    "GSR001ACON" : {"heartbeat": 300, "relative": 0.02,
+                    "ignore": ["iterationNumber", "elapsedTime",
+                               "elapsedTimeSinceDailyCheck", "elapsedTimePeriodicCheck"]},
+    "BME280"     : {"heartbeat": 60, "relative": 0.0005,
+                    "fields": {"temperature": {"absolute": 0.1},
+                               "humidity"   : {"absolute": 0.5}},
+                    "ignore": ["altitude"]},
+    "SJH5"       : {"heartbeat": 60,
+                    "fields": {"methane": {"absolute": 0.02}},
+                    "ignore": ["timeElapsed"]},
+    }
 
 gpsPort               = findPort("GPS/GNSS Receiver")
 
@@ -174,9 +284,19 @@ if __name__ == "__main__":
     print("Data Folder Reference      : {0}".format(dataFolderReference))
     print("Data Folder Raw            : {0}".format(dataFolder))
     print("Latest On                  : {0}".format(latestOn))
+    print("Latest Board File          : {0}".format(latestBoardFile))
+    print("Log Level                  : {0}".format(logLevel))
     print("MQTT On                    : {0}".format(mqttOn))
     print("MQTT Credentials File      : {0}".format(mqttCredentialsFile))
     print("MQTT Broker and Port       : {0}, {1}".format(mqttOn,mqttPort))
+    print("CSV Cache Size             : {0}".format(csvCacheSize))
+    print("CSV Flush Interval         : {0}".format(csvFlushInterval))
+    print("CSV Fsync                  : {0}".format(csvFsync))
+    print("CSV Compression            : {0}".format(csvCompression))
+    print("Writer Thread On           : {0}".format(writerThreadOn))
+    print("Writer Queue Size          : {0}".format(writerQueueSize))
+    print("Writer Overflow            : {0}".format(writerOverflow))
+    print("Columnar On                : {0}".format(columnarOn))
     
     print()
     print("#-------------------------------------------#")
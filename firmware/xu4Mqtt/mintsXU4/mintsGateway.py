@@ -0,0 +1,166 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module lets the readers of a node share one MQTT session. The
+#   readers send their messages to the gateway (mqttGateway.py) over a Unix
+#   datagram socket and the gateway keeps the only connection to the broker,
+#   with the spool and batching of that session.
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+import json
+import os
+import socket
+import struct
+import time
+
+from mintsXU4 import mintsLogger as mLog
+
+logger = mLog.getLogger(__name__)
+
+# flags, topic length, then the topic and the payload
+headerFormat = struct.Struct("<BH")
+flagRetain   = 0x01
+maxDatagram  = 65536
+
+
+def packMessage(topic, payload, retain=False):
+    topicBytes = topic.encode()
+    if isinstance(payload, str):
+        payload = payload.encode()
+    return headerFormat.pack(flagRetain if retain else 0, len(topicBytes)) + \
+        topicBytes + payload
+
+
+def unpackMessage(datagram):
+    flags, topicLength = headerFormat.unpack_from(datagram)
+    start = headerFormat.size
+    return (datagram[start:start + topicLength].decode(),
+            datagram[start + topicLength:], bool(flags & flagRetain))
+
+
+class GatewayClient:
+    """Publishes through the local gateway, in place of an MQTTSession.
+
+    Sending waits at most timeout seconds for room in the queue of the
+    gateway, which is short (net.unix.max_dgram_qlen). If the gateway is
+    not running or does not take the message in time, it goes through a
+    direct session of this process (getDirectSession), created on first
+    need.
+    """
+
+    def __init__(self, socketPath, getDirectSession, timeout=0.5):
+        self.socketPath       = socketPath
+        self.getDirectSession = getDirectSession
+        self.socket           = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.settimeout(timeout)
+        self.sent             = 0
+        self.fallbacks        = 0
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        try:
+            datagram = packMessage(topic, payload, retain)
+            if len(datagram) > maxDatagram:
+                raise OSError("message of " + str(len(datagram)) + " bytes")
+            self.socket.sendto(datagram, self.socketPath)
+            self.sent += 1
+            return True
+        except OSError as e:
+            self.fallbacks += 1
+            logger.warning("MQTT gateway not reachable, publishing directly: %s", e)
+            return self.getDirectSession().publish(topic, payload, qos=qos, retain=retain)
+
+    def stats(self):
+        return {
+            "gatewaySent"      : self.sent,
+            "gatewayFallbacks" : self.fallbacks,
+            }
+
+
+class Gateway:
+    """Receives the messages of the local readers and publishes them.
+
+    With a batchEncoder (see mintsBatch) JSON records are batched here for
+    all readers; other messages are published as they are.
+    """
+
+    def __init__(self, socketPath, session, batchEncoder=None, statsInterval=60):
+        self.socketPath    = socketPath
+        self.session       = session
+        self.batchEncoder  = batchEncoder
+        self.statsInterval = statsInterval
+        self.received      = 0
+        self.malformed     = 0
+        self.running       = False
+
+        # Whoever can write to the socket publishes with the credentials of
+        # the node, so only the user the readers and gateway run as may
+        directoryIn = os.path.dirname(socketPath)
+        if directoryIn:
+            os.makedirs(directoryIn, mode=0o700, exist_ok=True)
+            if os.stat(directoryIn).st_uid != os.getuid():
+                raise PermissionError(directoryIn + " belongs to another user")
+            os.chmod(directoryIn, 0o700)
+        if os.path.exists(socketPath):
+            # Left behind by a gateway that did not stop cleanly
+            os.remove(socketPath)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.bind(socketPath)
+        os.chmod(socketPath, 0o600)
+        self.socket.settimeout(1)
+
+    def handle(self, datagram):
+        try:
+            topic, payload, retain = unpackMessage(datagram)
+        except (struct.error, UnicodeDecodeError):
+            self.malformed += 1
+            logger.error("Malformed gateway message of %d bytes", len(datagram))
+            return
+        self.received += 1
+        if self.batchEncoder is not None and not retain:
+            try:
+                sensorDictionary = json.loads(payload)
+            except ValueError:
+                sensorDictionary = None
+            if isinstance(sensorDictionary, dict):
+                self.publishAll(self.batchEncoder.add(topic, sensorDictionary))
+                return
+        self.session.publish(topic, payload, retain=retain)
+
+    def publishAll(self, messages):
+        for topic, payload, retain in messages:
+            self.session.publish(topic, payload, retain=retain)
+
+    def run(self):
+        self.running = True
+        lastStats    = time.time()
+        try:
+            while self.running:
+                try:
+                    self.handle(self.socket.recv(maxDatagram))
+                except socket.timeout:
+                    pass
+                if self.batchEncoder is not None:
+                    self.publishAll(self.batchEncoder.flushDue())
+                if (time.time() - lastStats) >= self.statsInterval:
+                    lastStats = time.time()
+                    logger.info("Gateway %s", self.stats())
+        finally:
+            self.close()
+
+    def stats(self):
+        stats = {"received": self.received, "malformed": self.malformed}
+        stats.update(self.session.stats())
+        return stats
+
+    def close(self):
+        self.running = False
+        if self.batchEncoder is not None:
+            self.publishAll(self.batchEncoder.flushAll())
+        self.socket.close()
+        try:
+            os.remove(self.socketPath)
+        except OSError:
+            pass
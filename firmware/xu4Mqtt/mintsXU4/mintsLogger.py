@@ -0,0 +1,103 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module sets up logging for the MINTS readers. Per record messages
+#   are logged at DEBUG, repeated messages are rate limited and each process
+#   reports how many records it handled per sensor at a fixed interval.
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from mintsXU4 import mintsDefinitions as mD
+
+
+digitsTable = str.maketrans("", "", "0123456789")
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets the same message through at most once every interval seconds.
+
+    Messages that only differ in their digits count as the same message.
+    The number of suppressed repeats is added to the next message that gets
+    through. DEBUG messages are never limited so debugging shows every record.
+    """
+
+    def __init__(self, interval=10):
+        logging.Filter.__init__(self)
+        self.interval    = interval
+        self.lastEmitted = {}
+        self.suppressed  = {}
+        self.lock        = threading.Lock()
+
+    def filter(self, record):
+        if self.interval <= 0 or record.levelno <= logging.DEBUG:
+            return True
+        key = (record.name, record.levelno,
+               record.getMessage().translate(digitsTable))
+        now = time.time()
+        with self.lock:
+            last = self.lastEmitted.get(key)
+            if last is not None and (now - last) < self.interval:
+                self.suppressed[key] = self.suppressed.get(key, 0) + 1
+                return False
+            self.lastEmitted[key] = now
+            suppressed = self.suppressed.pop(key, 0)
+        if suppressed:
+            record.msg  = record.getMessage() + " (repeated " + str(suppressed) + " times)"
+            record.args = None
+        return True
+
+
+class RecordCounter:
+    """Counts records per sensor and logs the totals every interval seconds.
+
+    onReport, if given, is called after each report so other counters (e.g.
+    the writer queue) can be logged at the same pace.
+    """
+
+    def __init__(self, logger, interval=60, onReport=None):
+        self.logger     = logger
+        self.interval   = interval
+        self.onReport   = onReport
+        self.counts     = OrderedDict()
+        self.lastReport = time.time()
+        self.lock       = threading.Lock()
+
+    def count(self, sensorName, number=1):
+        with self.lock:
+            self.counts[sensorName] = self.counts.get(sensorName, 0) + number
+        if (time.time() - self.lastReport) >= self.interval:
+            self.report()
+
+    def report(self):
+        with self.lock:
+            counts, self.counts = self.counts, OrderedDict()
+            elapsed, self.lastReport = time.time() - self.lastReport, time.time()
+        for sensorName, number in counts.items():
+            self.logger.info("%d %s records in last %ds", number, sensorName, elapsed)
+        if self.onReport is not None:
+            self.onReport()
+
+
+rootLogger = logging.getLogger("mints")
+
+if not rootLogger.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(
+        "%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    handler.addFilter(RateLimitFilter(mD.logRateLimit))
+    rootLogger.addHandler(handler)
+    rootLogger.setLevel(mD.logLevel)
+    rootLogger.propagate = False
+
+
+def getLogger(name):
+    # Loggers live under "mints" so they share its handler, level and rate limit
+    return rootLogger.getChild(name.split(".")[-1])
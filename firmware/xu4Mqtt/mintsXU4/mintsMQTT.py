@@ -0,0 +1,474 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module keeps one long lived MQTT session per process. Connecting
+#   and reconnecting happen on the paho network thread, so publishing never
+#   blocks the sensor loops, even while the broker is down.
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+import os
+import socket
+import ssl
+import sys
+import threading
+import time
+from collections import deque
+
+import paho.mqtt.client as mqttClient
+import yaml
+
+from mintsXU4 import mintsDefinitions as mD
+from mintsXU4 import mintsLogger as mLog
+from mintsXU4 import mintsGateway as mGateway
+from mintsXU4 import mintsSpool as mSpool
+
+logger = mLog.getLogger(__name__)
+
+
+class TimedSSLSocket(ssl.SSLSocket):
+    # Times every handshake, paho runs it right after wrap_socket
+    def do_handshake(self, block=False):
+        startTime = time.perf_counter()
+        ssl.SSLSocket.do_handshake(self, block)
+        self.context.lastHandshake  = time.perf_counter() - startTime
+        self.context.handshakeTime += self.context.lastHandshake
+        self.context.handshakes    += 1
+        if self.session_reused:
+            self.context.resumed += 1
+
+
+class ResumingContext(ssl.SSLContext):
+    """A client SSL context that offers the TLS session of the last
+    connection to a broker on the next one, so a reconnect after a network
+    blip resumes the session instead of running a full handshake. The
+    session is saved by MQTTSession once the broker accepted the connection.
+    """
+
+    sslsocket_class = TimedSSLSocket
+
+    def wrap_socket(self, sock, *args, **kwargs):
+        # Sessions are kept per broker address, brokers may share a host name
+        if kwargs.get("session") is None:
+            try:
+                kwargs["session"] = self.sessions.get(sock.getpeername())
+            except OSError:
+                pass
+        return ssl.SSLContext.wrap_socket(self, sock, *args, **kwargs)
+
+    def saveSession(self, sock):
+        if isinstance(sock, ssl.SSLSocket) and sock.session is not None:
+            try:
+                self.sessions[sock.getpeername()] = sock.session
+            except OSError:
+                pass
+
+    def stats(self):
+        return {
+            "tlsHandshakes"     : self.handshakes,
+            "tlsResumed"        : self.resumed,
+            "tlsMeanHandshakeMs": round(1000*self.handshakeTime/max(self.handshakes, 1), 2),
+            "tlsLastHandshakeMs": round(1000*self.lastHandshake, 2),
+            }
+
+
+sslContexts = {}
+
+
+def getSSLContext(tlsCert):
+    """The SSL context for the CA file tlsCert, built once per process."""
+    context = sslContexts.get(tlsCert)
+    if context is None:
+        context = ResumingContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.minimum_version = ssl.TLSVersion.TLSv1_2
+        context.load_verify_locations(cafile=tlsCert)
+        context.sessions      = {}
+        context.handshakes    = 0
+        context.resumed       = 0
+        context.handshakeTime = 0.0
+        context.lastHandshake = 0.0
+        sslContexts[tlsCert]  = context
+    return context
+
+
+class MQTTSession:
+    """A paho client that is set up once and reconnects on its own.
+
+    TLS and credentials are configured once; the SSL context is shared by
+    the process and resumes the TLS session on reconnects (see
+    ResumingContext). The network thread started by start() connects and,
+    after a drop, reconnects with exponential backoff between reconnectMin
+    and reconnectMax seconds. Messages published while disconnected wait in
+    a queue of at most queueSize messages (the oldest is dropped when full)
+    and are sent as soon as the session is back.
+
+    With a spool (see mintsSpool) deferred messages go to disk instead and a
+    replay thread sends them in order, at most replayRate messages per
+    second and replayWindow unacknowledged at a time, with replayQos. While
+    the spool is not empty new messages are spooled behind the older ones.
+    A spooled row is deleted once the broker acknowledged it.
+
+    fallbacks are (host, port) of further brokers, in order of preference.
+    After failoverAfter failed connects to a broker the session moves on to
+    the next one. While it is not on the first broker, a probe thread tries
+    a TCP connect to the preferred ones every probeInterval seconds and
+    fails back to the first that answers: publishing is deferred, the
+    messages in flight are given probeTimeout seconds to be acknowledged,
+    then the connection is closed and reopened on that broker. Deferred
+    and unacknowledged messages are sent there, nothing is sent twice by
+    the session.
+    """
+
+    def __init__(self, broker, port, username=None, password=None, tlsCert=None,
+                 queueSize=1000, reconnectMin=1, reconnectMax=120, keepAlive=60,
+                 spool=None, replayRate=100, replayWindow=100, replayQos=1,
+                 fallbacks=(), failoverAfter=2, probeInterval=30, probeTimeout=3):
+        self.brokers   = [(broker, port)] + list(fallbacks)
+        self.broker    = broker
+        self.port      = port
+        self.keepAlive = keepAlive
+        self.pending   = deque()
+        self.queueSize = queueSize
+        self.lock      = threading.Lock()
+        self.connected = False
+        self.started   = False
+
+        self.connects      = 0
+        self.disconnects   = 0
+        self.published     = 0
+        self.queued        = 0
+        self.dropped       = 0
+        self.failed        = 0
+        self.lastConnect   = None
+        self.lastRC        = None
+
+        self.spool         = spool
+        self.replayRate    = replayRate
+        self.replayWindow  = replayWindow
+        self.replayQos     = replayQos
+        self.replayCursor  = 0
+        self.replayed      = 0
+        self.inflight      = {}
+        self.acked         = deque()
+        self.replayEvent   = threading.Event()
+        self.replayThread  = None
+
+        self.brokerIndex   = 0
+        self.failoverAfter = failoverAfter
+        self.probeInterval = probeInterval
+        self.probeTimeout  = probeTimeout
+        self.failures      = 0
+        self.failovers     = 0
+        self.failbacks     = 0
+        self.failbackTo    = None
+        self.stopEvent     = threading.Event()
+        self.probeThread   = None
+
+        self.client = mqttClient.Client()
+        if username is not None:
+            self.client.username_pw_set(username, password=password)
+        self.sslContext = None
+        if tlsCert is not None:
+            self.sslContext = getSSLContext(tlsCert)
+            self.client.tls_set_context(self.sslContext)
+        self.client.reconnect_delay_set(min_delay=reconnectMin, max_delay=reconnectMax)
+        self.client.on_connect    = self.onConnect
+        self.client.on_disconnect = self.onDisconnect
+        self.client.on_connect_fail = self.onConnectFail
+        self.client.on_publish    = self.onPublish
+
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+        self.client.connect_async(self.broker, port=self.port, keepalive=self.keepAlive)
+        self.client.loop_start()
+        if self.spool is not None:
+            self.replayThread = threading.Thread(target=self.replay,
+                                                 name="mqttReplay", daemon=True)
+            self.replayThread.start()
+        if len(self.brokers) > 1:
+            self.probeThread = threading.Thread(target=self.probe,
+                                                name="mqttProbe", daemon=True)
+            self.probeThread.start()
+
+    def stop(self):
+        if self.started:
+            self.started = False
+            self.replayEvent.set()
+            self.stopEvent.set()
+            if self.replayThread is not None:
+                self.replayThread.join()
+            if self.probeThread is not None:
+                self.probeThread.join()
+            self.client.disconnect()
+            self.client.loop_stop()
+            if self.spool is not None:
+                self.acknowledge()
+
+    def onConnect(self, client, userdata, flags, rc):
+        self.lastRC = rc
+        if rc == 0:
+            self.connected   = True
+            self.connects   += 1
+            self.failures    = 0
+            self.lastConnect = time.time()
+            if self.sslContext is not None:
+                self.sslContext.saveSession(client.socket())
+            logger.info("Connected to broker %s:%s", self.broker, self.port)
+            self.sendPending()
+            self.replayEvent.set()
+        else:
+            logger.error("Connection failed, rc: %s", rc)
+
+    def onDisconnect(self, client, userdata, rc):
+        wasConnected   = self.connected
+        self.lastRC    = rc
+        self.connected = False
+        if rc != 0:
+            self.disconnects += 1
+            logger.warning("Disconnected from broker, rc: %s", rc)
+        if self.failbackTo is not None:
+            self.useBroker(self.failbackTo)
+            self.failbackTo = None
+        elif not wasConnected and self.started:
+            # Closed before the broker accepted the connection
+            self.onConnectFail(client, userdata)
+
+    def onConnectFail(self, client, userdata):
+        self.failures += 1
+        if len(self.brokers) > 1 and self.failures >= self.failoverAfter:
+            self.failovers += 1
+            self.useBroker((self.brokerIndex + 1) % len(self.brokers))
+            logger.warning("Failing over to broker %s:%s", self.broker, self.port)
+
+    def useBroker(self, index):
+        # Runs on the network thread, paho (re)connects to the new broker next
+        self.brokerIndex       = index
+        self.broker, self.port = self.brokers[index]
+        self.failures          = 0
+        self.client.connect_async(self.broker, port=self.port, keepalive=self.keepAlive)
+
+    def probeBroker(self, index):
+        try:
+            socket.create_connection(self.brokers[index], timeout=self.probeTimeout).close()
+            return True
+        except OSError:
+            return False
+
+    def probe(self):
+        while not self.stopEvent.wait(self.probeInterval):
+            if self.brokerIndex == 0 or not self.connected:
+                continue
+            for index in range(self.brokerIndex):
+                if self.probeBroker(index):
+                    self.failback(index)
+                    break
+
+    def failback(self, index):
+        logger.info("Broker %s:%s is back, failing back", *self.brokers[index])
+        # New messages are deferred, the ones in flight get probeTimeout to be acknowledged
+        self.connected = False
+        deadline = time.time() + self.probeTimeout
+        while (self.client.want_write() or len(self.inflight) > len(self.acked)) and \
+                time.time() < deadline:
+            time.sleep(0.05)
+        self.failbacks += 1
+        self.failbackTo = index
+        sock = self.client.socket()
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def onPublish(self, client, userdata, mid):
+        # Runs on the network thread with paho locks held, the replay thread
+        # matches the mid with its spool row
+        self.acked.append(mid)
+
+    def acknowledge(self):
+        delivered = []
+        while self.acked:
+            row = self.inflight.pop(self.acked.popleft(), None)
+            if row is not None:
+                delivered.append(row)
+        try:
+            self.spool.acknowledge(delivered)
+        except Exception as e:
+            logger.error("MQTT spool not updated, error: %s", e)
+
+    def replay(self):
+        while self.started:
+            self.replayEvent.wait(1)
+            self.replayEvent.clear()
+            self.acknowledge()
+            while self.started and self.connected:
+                self.acknowledge()
+                free = self.replayWindow - len(self.inflight)
+                if free <= 0:
+                    time.sleep(0.05)
+                    continue
+                try:
+                    rows = self.spool.fetch(self.replayCursor, min(free, 50))
+                except Exception as e:
+                    logger.error("MQTT spool not read, error: %s", e)
+                    break
+                if not rows:
+                    break
+                for rowId, topic, payload, qos, retain in rows:
+                    if not self.connected:
+                        break
+                    qos = max(qos, self.replayQos)
+                    try:
+                        info = self.client.publish(topic, payload, qos=qos, retain=bool(retain))
+                    except Exception as e:
+                        logger.error("Could not replay data, error: %s", e)
+                        break
+                    if info.rc == mqttClient.MQTT_ERR_NO_CONN and not qos:
+                        break
+                    # paho keeps QoS 1 messages, also when the connection has just
+                    # dropped, and resends unacknowledged ones itself after a reconnect
+                    self.inflight[info.mid] = (rowId, topic)
+                    self.replayCursor = rowId
+                    self.replayed    += 1
+                    if self.replayRate:
+                        time.sleep(1.0/self.replayRate)
+                else:
+                    continue
+                break
+
+    def enqueue(self, topic, payload, qos, retain):
+        with self.lock:
+            if len(self.pending) >= self.queueSize:
+                self.pending.popleft()
+                self.dropped += 1
+            self.pending.append((topic, payload, qos, retain))
+            self.queued += 1
+
+    def send(self, topic, payload, qos, retain):
+        try:
+            info = self.client.publish(topic, payload, qos=qos, retain=retain)
+        except Exception as e:
+            self.failed += 1
+            logger.error("Could not publish data, error: %s", e)
+            return True
+        if info.rc == mqttClient.MQTT_ERR_SUCCESS:
+            self.published += 1
+            return True
+        # paho keeps QoS 1 messages for the next connection, queueing them too would send them twice
+        return info.rc != mqttClient.MQTT_ERR_NO_CONN or qos > 0
+
+    def sendPending(self):
+        while self.connected:
+            with self.lock:
+                if not self.pending:
+                    return
+                message = self.pending.popleft()
+            if not self.send(*message):
+                with self.lock:
+                    self.pending.appendleft(message)
+                return
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        """Sends the message now or queues it. Never blocks."""
+        if not self.started:
+            self.start()
+        if self.spool is not None:
+            if self.connected and not len(self.spool):
+                if self.send(topic, payload, qos, retain):
+                    return True
+            try:
+                self.spool.append(topic, payload, qos, retain)
+                self.queued += 1
+            except Exception as e:
+                self.dropped += 1
+                logger.error("MQTT spool not written, error: %s", e)
+            self.replayEvent.set()
+            return False
+        # Queued messages go first so the broker sees them in order
+        if self.connected and not self.pending:
+            if self.send(topic, payload, qos, retain):
+                return True
+        self.enqueue(topic, payload, qos, retain)
+        if self.connected:
+            self.sendPending()
+        return False
+
+    def stats(self):
+        stats = {
+            "connected"   : self.connected,
+            "connects"    : self.connects,
+            "reconnects"  : max(self.connects - 1, 0),
+            "disconnects" : self.disconnects,
+            "published"   : self.published,
+            "queued"      : self.queued,
+            "pending"     : len(self.pending),
+            "dropped"     : self.dropped,
+            "failed"      : self.failed,
+            "lastRC"      : self.lastRC,
+            }
+        if len(self.brokers) > 1:
+            stats["broker"]    = "%s:%s" % (self.broker, self.port)
+            stats["failovers"] = self.failovers
+            stats["failbacks"] = self.failbacks
+        if self.spool is not None:
+            stats["spooled"]  = len(self.spool)
+            stats["replayed"] = self.replayed
+            stats["inflight"] = len(self.inflight)
+            stats["spoolDropped"] = self.spool.dropped
+        if self.sslContext is not None:
+            stats.update(self.sslContext.stats())
+        return stats
+
+
+session = None
+client  = None
+
+
+def getDirectSession():
+    # One session per process, created and connected on first use
+    global session
+    if session is None:
+        credentials = yaml.load(open(mD.mqttCredentialsFile), Loader=yaml.FullLoader)
+        spool       = None
+        if mD.mqttSpoolOn:
+            # Every process spools to its own file, e.g. mqttSpool_airMarReader.sqlite
+            processName = os.path.splitext(os.path.basename(sys.argv[0]))[0] or "python"
+            try:
+                spool = mSpool.MQTTSpool(os.path.join(
+                    mD.mqttSpoolFolder, "mqttSpool_" + processName + ".sqlite"),
+                    mD.mqttSpoolMaxRows)
+            except Exception as e:
+                logger.error("MQTT spool turned off: %s", e)
+        (broker, port), fallbacks = mD.mqttBrokers[0], mD.mqttBrokers[1:]
+        session = MQTTSession(broker, port,
+                              credentials['mqtt']['username'],
+                              credentials['mqtt']['password'],
+                              mD.mqttTLSCert,
+                              queueSize     = mD.mqttQueueSize,
+                              reconnectMin  = mD.mqttReconnectMin,
+                              reconnectMax  = mD.mqttReconnectMax,
+                              keepAlive     = mD.mqttKeepAlive,
+                              spool         = spool,
+                              replayRate    = mD.mqttSpoolReplayRate,
+                              fallbacks     = fallbacks,
+                              failoverAfter = mD.mqttFailoverAfter,
+                              probeInterval = mD.mqttProbeInterval,
+                              probeTimeout  = mD.mqttProbeTimeout)
+        session.start()
+    return session
+
+
+def getSession():
+    """The publisher of this process: the local gateway when it is turned
+    on (see mintsGateway), otherwise the direct session."""
+    global client
+    if not mD.mqttGatewayOn:
+        return getDirectSession()
+    if client is None:
+        client = mGateway.GatewayClient(mD.mqttGatewaySocket, getDirectSession,
+                                        mD.mqttGatewayTimeout)
+    return client
@@ -0,0 +1,198 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module routes NMEA 0183 sentences (AirMar, GPS) to their parsers
+#   through a table keyed by the sentence id: one dictionary lookup per
+#   line, a per type rate limit, and the *hh checksum checked before any
+#   parsing, so corrupt lines are dropped for the price of an XOR.
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+import datetime
+import functools
+import operator
+import time
+
+from mintsXU4 import mintsLogger as mLog
+from mintsXU4 import mintsSchema as mSchema
+
+logger = mLog.getLogger(__name__)
+
+
+def checksumOK(sentence):
+    """True for "$<body>*hh" where hh is the XOR of the body."""
+    star = len(sentence) - 3
+    if star < 1 or sentence[star] != "*" or sentence[0] not in "$!":
+        return False
+    try:
+        expected = int(sentence[star + 1:], 16)
+    except ValueError:
+        return False
+    return functools.reduce(operator.xor, sentence[1:star].encode("latin-1"), 0) == expected
+
+
+class SentenceType:
+    """A registered sentence id with its parser and rate limit."""
+
+    __slots__ = ("sentenceID", "parser", "interval", "prefix", "schema",
+                 "last", "parsed", "limited")
+
+    def __init__(self, sentenceID, parser, interval, prefix, schema):
+        self.sentenceID = sentenceID
+        self.parser     = parser
+        self.interval   = interval
+        self.prefix     = prefix
+        self.schema     = schema
+        self.last       = 0
+        self.parsed     = 0
+        self.limited    = 0
+
+
+class NMEADispatcher:
+    """Table of the sentence types a reader keeps.
+
+    dispatch() looks the id of a line up, drops it if its type was parsed
+    less than interval seconds ago, checks the checksum and only then calls
+    parser(sentence, dateTime). A prefix (e.g. "$YXXDR,A") narrows a type
+    to the lines that start with it. Lines of other types, with a bad
+    checksum or that make the parser raise are counted and dropped.
+    """
+
+    def __init__(self):
+        self.types       = {}
+        self.lines       = 0
+        self.unknown     = 0
+        self.badChecksum = 0
+        self.failed      = 0
+
+    def register(self, sentenceID, parser, interval=0.5, prefix=None, schema=None):
+        self.types[sentenceID] = SentenceType(sentenceID, parser, interval, prefix, schema)
+
+    def dispatch(self, sentence, now=None):
+        """Returns 1 when the line was handed to its parser, else 0."""
+        self.lines += 1
+        entry = self.types.get(sentence[1:sentence.find(",")])
+        if entry is None or (entry.prefix is not None and not sentence.startswith(entry.prefix)):
+            self.unknown += 1
+            return 0
+        now = time.time() if now is None else now
+        if now - entry.last <= entry.interval:
+            entry.limited += 1
+            return 0
+        if not checksumOK(sentence):
+            self.badChecksum += 1
+            logger.debug("Bad checksum: %s", sentence)
+            return 0
+        entry.last = now
+        try:
+            entry.parser(sentence, datetime.datetime.now())
+        except Exception as e:
+            self.failed += 1
+            logger.warning("%s not parsed. Error: %s", entry.sentenceID, e)
+            return 0
+        entry.parsed += 1
+        return 1
+
+    def stats(self):
+        return {
+            "lines"       : self.lines,
+            "unknown"     : self.unknown,
+            "badChecksum" : self.badChecksum,
+            "failed"      : self.failed,
+            "parsed"      : {entry.sentenceID: entry.parsed for entry in self.types.values()},
+            "rateLimited" : {entry.sentenceID: entry.limited for entry in self.types.values()},
+            }
+
+
+typeNames = {"float": float, "int": int, "str": str}
+
+# One line of each type an AirMar sends, for the benchmarks here and in
+# mintsSerial
+sampleSentences = [
+    "$HCHDT,270.5,T*29",
+    "$WIMWV,214.8,R,0.1,N,A*2D",
+    "$GPGGA,130159.00,3259.5854,N,09644.9143,W,2,10,0.9,190.2,M,-24.8,M,,*52",
+    "$GPVTG,125.4,T,121.8,M,0.1,N,0.2,K,D*2D",
+    "$GPZDA,130159.00,04,01,2025,00,00*69",
+    "$WIMDA,29.6142,I,1.0028,B,21.4,C,,,37.5,,6.3,C,271.2,T,267.6,M,0.2,N,0.1,M*5B",
+    "$YXXDR,A,-1.6,D,PTCH,A,0.8,D,ROLL*7F",
+    "$GPGSV,3,1,11,10,63,137,17,07,61,098,15,05,59,290,20,08,54,157,30*70",
+]
+
+
+def fromConfig(sentences, parsers):
+    """A dispatcher for a table like mintsDefinitions.airmarSentences.
+
+    Every entry names a parser of the module parsers (e.g. mintsSensorReader)
+    or lists the fields of a new type as [name, "float"|"int"|"str"] after
+    the sentence id. A schema is registered for those and their lines go to
+    parsers.NMEAWriteAM, the checksum is kept as checkSum.
+    """
+    dispatcher = NMEADispatcher()
+    for sentenceID, settings in sentences.items():
+        schema = mSchema.getSchema(sentenceID)
+        if "parser" in settings:
+            parser = getattr(parsers, settings["parser"])
+        else:
+            schema = mSchema.registerSchema(sentenceID, [("dateTime", str)] +
+                [(keyIn, typeNames[typeIn]) for keyIn, typeIn in settings["fields"]] +
+                [("checkSum", str)])
+            parser = functools.partial(parsers.NMEAWriteAM, schema)
+        dispatcher.register(sentenceID, parser, settings.get("interval", 0.5),
+                            settings.get("prefix"), schema)
+    return dispatcher
+
+
+if __name__ == "__main__":
+    # Per line cost of the startswith chain against the table, on AirMar
+    # lines with one in ten corrupted, parsers split the line as the
+    # parsers of mintsSensorReader do
+    # run python3 -m mintsXU4.mintsNMEA
+    import random
+
+    sentences = sampleSentences
+    random.seed(4)
+    lines   = []
+    corrupt = set()
+    for index in range(100000):
+        sentence = sentences[index % len(sentences)]
+        if random.random() < 0.1:
+            position = random.randrange(7, len(sentence) - 3)
+            sentence = sentence[:position] + "#" + sentence[position + 1:]
+            corrupt.add(index)
+        lines.append(sentence)
+
+    step = 0.1/len(sentences)          # every type at 10 Hz
+    for label, interval in (("Every line", 0), ("0.5 s rate limit", 0.5)):
+        parsed = []
+        def parser(sentence, dateTime):
+            parsed.append(sentence.replace("*", ",").split(","))
+
+        prefixes  = ["$HCHDT", "$WIMWV", "$GPGGA", "$GPVTG", "$GPZDA", "$WIMDA", "$YXXDR,A"]
+        last      = {prefix: -1 for prefix in prefixes}
+        startTime = time.perf_counter()
+        for index, sentence in enumerate(lines):
+            now = index*step
+            for prefix in prefixes:
+                if sentence.startswith(prefix) and now - last[prefix] > interval:
+                    parser(sentence, None)
+                    last[prefix] = now
+        chainTime = time.perf_counter() - startTime
+        chainParsed, parsed[:] = len(parsed), []
+
+        dispatcher = NMEADispatcher()
+        for prefix in prefixes:
+            dispatcher.register(prefix[1:6], parser, interval, prefix if "," in prefix else None)
+        startTime = time.perf_counter()
+        for index, sentence in enumerate(lines):
+            dispatcher.dispatch(sentence, index*step)
+        tableTime = time.perf_counter() - startTime
+
+        print(label)
+        print("  startswith chain (us/line): {0:.2f}, {1} parsed".format(
+            1e6*chainTime/len(lines), chainParsed))
+        print("  Table (us/line)           : {0:.2f}, {1} parsed, {2} bad checksums".format(
+            1e6*tableTime/len(lines), len(parsed), dispatcher.badChecksum))
+    print("Corrupt lines                : {0}".format(len(corrupt)))
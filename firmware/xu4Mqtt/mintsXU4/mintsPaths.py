@@ -0,0 +1,141 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module resolves the daily write paths of MINTS data files and
+#   remembers them for the rest of the day, together with the folders that
+#   are already known to exist.
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+import os
+import time
+import datetime
+
+from mintsXU4 import mintsLogger as mLog
+
+logger = mLog.getLogger(__name__)
+
+
+class WritePathResolver:
+    """Caches daily write paths per (root, node, sensor, date).
+
+    Paths of the current day are built once and then looked up. The cache is
+    cleared whenever a newer day shows up. Folders created or seen through
+    checkDirectory are remembered for the day. The deleter runs in its own
+    process and cannot reach this cache, so a writer whose open fails with
+    FileNotFoundError calls invalidate for the folder and checks it again
+    (see mintsSensorReader.csvWriter and mintsWriter.CSVWriterCache).
+    """
+
+    def __init__(self):
+        self.paths        = {}
+        self.dayFolders   = {}
+        self.directories  = set()
+        self.checkedPaths = set()
+        self.currentDate  = None
+
+    def getDate(self, dateTime):
+        dateIn = (dateTime.year, dateTime.month, dateTime.day)
+        if self.currentDate is None or dateIn > self.currentDate:
+            self.currentDate = dateIn
+            self.paths.clear()
+            self.dayFolders.clear()
+            self.directories.clear()
+            self.checkedPaths.clear()
+        return dateIn
+
+    def getDayFolder(self, root, nodeID, dateTime):
+        #Example  : /home/teamlary/mintsData/raw/001e06323a06/2019/01/04
+        dateIn = self.getDate(dateTime)
+        key    = (root, nodeID, dateIn)
+        folder = self.dayFolders.get(key)
+        if folder is None:
+            folder = "%s/%s/%04d/%02d/%02d" % ((root, nodeID) + dateIn)
+            self.dayFolders[key] = folder
+        return folder
+
+    def getDailyPath(self, root, nodeID, labelIn, dateTime, suffix=".csv"):
+        #Example  : MINTS_0061_OOPCN3_2019_01_04.csv
+        dateIn = self.getDate(dateTime)
+        key    = (root, nodeID, labelIn, dateIn, suffix)
+        path   = self.paths.get(key)
+        if path is None:
+            path = "%s/MINTS_%s_%s_%04d_%02d_%02d%s" % \
+                ((self.getDayFolder(root, nodeID, dateTime), nodeID, labelIn)
+                 + dateIn + (suffix,))
+            self.paths[key] = path
+        return path
+
+    def getSnapsPath(self, root, nodeID, labelIn, dateTime):
+        #Example  : MINTS_0061_SKYCAM_2019_01_04_13_01_59.png
+        prefix = self.getDailyPath(root, nodeID, labelIn, dateTime, "")
+        folder, fileName = prefix.rsplit("/", 1)
+        return "%s/snaps/%s_%02d_%02d_%02d.png" % \
+            (folder, fileName, dateTime.hour, dateTime.minute, dateTime.second)
+
+    def checkDirectory(self, directoryIn):
+        if directoryIn in self.directories:
+            return
+        if not os.path.exists(directoryIn):
+            logger.info("Creating Folder @:%s", directoryIn)
+            os.makedirs(directoryIn, exist_ok=True)
+        self.directories.add(directoryIn)
+
+    def checkWritePath(self, writePath):
+        # Makes sure the folder of writePath exists, one set lookup once known
+        if writePath not in self.checkedPaths:
+            self.checkDirectory(os.path.dirname(writePath))
+            self.checkedPaths.add(writePath)
+
+    def invalidate(self, directoryIn):
+        # Forgets the folder and everything below it
+        directoryIn = os.path.normpath(directoryIn)
+        prefix      = directoryIn + os.sep
+        self.directories = set(folder for folder in self.directories
+                               if folder != directoryIn
+                               and not folder.startswith(prefix))
+        self.checkedPaths = set(path for path in self.checkedPaths
+                                if not path.startswith(prefix))
+
+
+def getWritePathLegacy(root, nodeID, labelIn, dateTime):
+    # The path builder used before WritePathResolver, kept for the benchmark
+    return root+"/"+nodeID+"/"+str(dateTime.year).zfill(4)  + "/" + str(dateTime.month).zfill(2)+ "/"+str(dateTime.day).zfill(2)+"/"+ "MINTS_"+ nodeID+ "_" +labelIn + "_" + str(dateTime.year).zfill(4) + "_" +str(dateTime.month).zfill(2) + "_" +str(dateTime.day).zfill(2) +".csv"
+
+
+def directoryCheckLegacy(outputPath):
+    exists = os.path.isfile(outputPath)
+    directoryIn = os.path.dirname(outputPath)
+    if not os.path.exists(directoryIn):
+        os.makedirs(directoryIn)
+    return exists
+
+
+if __name__ == "__main__":
+    # Per record overhead of resolving the write path and checking its folder
+    # run python3 -m mintsXU4.mintsPaths
+    import tempfile
+
+    records  = 100000
+    root     = tempfile.mkdtemp()
+    nodeID   = "001e06323a06"
+    dateTime = datetime.datetime.now()
+    resolver = WritePathResolver()
+
+    startTime = time.perf_counter()
+    for _ in range(records):
+        writePath = getWritePathLegacy(root, nodeID, "INIR2ME5", dateTime)
+        directoryCheckLegacy(writePath)
+    legacyTime = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    for _ in range(records):
+        writePath = resolver.getDailyPath(root, nodeID, "INIR2ME5", dateTime)
+        resolver.checkWritePath(writePath)
+    cachedTime = time.perf_counter() - startTime
+
+    print("Records                    : {0}".format(records))
+    print("Before (us per record)     : {0:.2f}".format(1e6*legacyTime/records))
+    print("After  (us per record)     : {0:.2f}".format(1e6*cachedTime/records))
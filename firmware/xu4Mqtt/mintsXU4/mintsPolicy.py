@@ -0,0 +1,122 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module decides which records are worth publishing over MQTT. A
+#   record goes out when one of its fields moved past its deadband since the
+#   last published record of the sensor, or when the heartbeat of the sensor
+#   is due. The CSV files keep every record.
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+import time
+from collections import OrderedDict
+
+
+def toNumber(valueIn):
+    if isinstance(valueIn, bool):
+        return None
+    if isinstance(valueIn, (int, float)):
+        return valueIn
+    try:
+        return float(valueIn)
+    except (TypeError, ValueError):
+        return None
+
+
+class PublishPolicy:
+    """Deadband and heartbeat rules per sensor and field.
+
+    rules maps a sensor name to its rule, e.g.
+
+        {"BME280": {"heartbeat": 60,
+                    "relative" : 0.001,
+                    "fields"   : {"temperature": {"absolute": 0.1}},
+                    "ignore"   : ["altitude"]}}
+
+    A numeric field triggers a publish once it differs from its last
+    published value by more than max(absolute, relative*|last|), using the
+    field rule or else the absolute/relative of the sensor. Other fields,
+    and numeric fields without a deadband, trigger on any change. Fields in
+    ignore (and dateTime) never trigger, e.g. counters such as timeElapsed.
+    Sensors without a rule are always published.
+    """
+
+    def __init__(self, rules):
+        self.rules     = rules
+        self.last      = {}
+        self.seen      = OrderedDict()
+        self.published = OrderedDict()
+
+    def getThreshold(self, rule, keyIn, lastValue):
+        fieldRule = rule.get("fields", {}).get(keyIn, rule)
+        absolute  = fieldRule.get("absolute", 0)
+        relative  = fieldRule.get("relative", 0)
+        return max(absolute, relative*abs(lastValue))
+
+    def changed(self, rule, sensorDictionary, lastValues):
+        ignore = rule.get("ignore", ())
+        for keyIn, valueIn in sensorDictionary.items():
+            if keyIn == "dateTime" or keyIn in ignore:
+                continue
+            if keyIn not in lastValues:
+                return True
+            lastValue = lastValues[keyIn]
+            number    = toNumber(valueIn)
+            last      = toNumber(lastValue)
+            if number is None or last is None:
+                if valueIn != lastValue:
+                    return True
+            elif abs(number - last) > self.getThreshold(rule, keyIn, last):
+                return True
+        return False
+
+    def allow(self, key, sensorName, sensorDictionary, now=None):
+        """True when the record should be published. key tells the sources
+        of a sensor apart, e.g. (nodeID, sensorName) for wearables."""
+        self.seen[sensorName] = self.seen.get(sensorName, 0) + 1
+        rule = self.rules.get(sensorName)
+        if rule is not None:
+            now  = time.time() if now is None else now
+            last = self.last.get(key)
+            if last is not None and \
+                    (now - last[0]) < rule.get("heartbeat", 60) and \
+                    not self.changed(rule, sensorDictionary, last[1]):
+                return False
+            self.last[key] = (now, dict(sensorDictionary))
+        self.published[sensorName] = self.published.get(sensorName, 0) + 1
+        return True
+
+    def suppressionRatios(self):
+        """Share of the records of each sensor that were not published."""
+        return OrderedDict(
+            (sensorName, round(1 - self.published.get(sensorName, 0)/seen, 3))
+            for sensorName, seen in self.seen.items())
+
+
+if __name__ == "__main__":
+    # Suppression of a slowly drifting BME280 over one simulated hour at 1 Hz
+    # run python3 -m mintsXU4.mintsPolicy
+    import math
+    import random
+
+    random.seed(4)
+    policy = PublishPolicy({
+        "BME280": {"heartbeat": 60, "relative": 0.0005,
+                   "fields": {"temperature": {"absolute": 0.1},
+                              "humidity"   : {"absolute": 0.5}},
+                   "ignore": ["altitude"]},
+        })
+    for second in range(3600):
+        sensorDictionary = OrderedDict([
+            ("dateTime"   , str(second)),
+            ("temperature", str(round(25 + 2*math.sin(second/3600.0) + random.gauss(0, 0.02), 2))),
+            ("pressure"   , str(round(1005 + 0.5*math.sin(second/900.0) + random.gauss(0, 0.05), 2))),
+            ("humidity"   , str(round(40 + random.gauss(0, 0.1), 2))),
+            ("altitude"   , str(round(random.gauss(70, 0.4), 2))),
+            ])
+        policy.allow("BME280", "BME280", sensorDictionary, now=second)
+    print("Records                    : {0}".format(policy.seen["BME280"]))
+    print("Published                  : {0}".format(policy.published["BME280"]))
+    print("Suppression Ratio          : {0}".format(policy.suppressionRatios()["BME280"]))
@@ -0,0 +1,289 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module declares the fields and types of the sensor records. A
+#   parser converts its values once, through the schema of its sensor, and
+#   passes a compact typed Record to sensorFinisher instead of an
+#   OrderedDict of strings.
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+from collections import OrderedDict
+from collections.abc import Mapping
+
+
+def toFloat(valueIn):
+    try:
+        return float(valueIn)
+    except (TypeError, ValueError):
+        # Empty NMEA fields and garbled values
+        return None
+
+
+def toInt(valueIn):
+    try:
+        return int(valueIn)
+    except (TypeError, ValueError):
+        number = toFloat(valueIn)
+        return None if number is None or number != number else int(number)
+
+
+def toString(valueIn):
+    return valueIn if isinstance(valueIn, str) else str(valueIn)
+
+
+converters = {float: toFloat, int: toInt, str: toString}
+
+
+class Schema:
+    """Field names and types of the records of one sensor."""
+
+    __slots__ = ("sensorName", "keys", "keyList", "types", "converters", "index")
+
+    def __init__(self, sensorName, fields):
+        self.sensorName = sensorName
+        self.keys       = tuple(keyIn for keyIn, typeIn in fields)
+        self.keyList    = list(self.keys)
+        self.types      = tuple(typeIn for keyIn, typeIn in fields)
+        self.converters = tuple(converters[typeIn] for typeIn in self.types)
+        self.index      = {keyIn: index for index, keyIn in enumerate(self.keys)}
+        if len(self.index) != len(self.keys):
+            raise ValueError("Repeated field in the schema of " + sensorName)
+
+    def record(self, *values):
+        """Converts the values, given in the order of the fields, to a Record."""
+        if len(values) != len(self.keys):
+            raise ValueError("%s takes %d values, got %d" %
+                             (self.sensorName, len(self.keys), len(values)))
+        return Record(self, tuple(converter(valueIn) for converter, valueIn
+                                  in zip(self.converters, values)))
+
+
+class Record(Mapping):
+    """A typed record: the shared schema of its sensor and a tuple of values.
+
+    Reads like a dictionary (keys, values, items, record["heading"]) so
+    the sinks take it where they take an OrderedDict. The values in field
+    order are in data. json needs jsonDefault.
+    """
+
+    __slots__ = ("schema", "data")
+
+    def __init__(self, schema, data):
+        self.schema = schema
+        self.data   = data
+
+    def __getitem__(self, keyIn):
+        return self.data[self.schema.index[keyIn]]
+
+    def __iter__(self):
+        return iter(self.schema.keys)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, keyIn):
+        return keyIn in self.schema.index
+
+    def items(self):
+        return zip(self.schema.keys, self.data)
+
+    def toDict(self):
+        return OrderedDict(zip(self.schema.keys, self.data))
+
+    def __repr__(self):
+        return "Record(%s, %r)" % (self.schema.sensorName, dict(self.items()))
+
+
+def jsonDefault(objectIn):
+    # Pass as default= to json.dump(s) so Records are written as objects
+    if isinstance(objectIn, Record):
+        return objectIn.toDict()
+    raise TypeError("Object of type %s is not JSON serializable" % type(objectIn).__name__)
+
+
+schemas = {}
+
+
+def registerSchema(sensorName, fields):
+    schema = Schema(sensorName, fields)
+    schemas[sensorName] = schema
+    return schema
+
+
+def getSchema(sensorName):
+    return schemas.get(sensorName)
+
+
+# AirMar
+HCHDT = registerSchema("HCHDT", [
+    ("dateTime"                   , str),
+    ("heading"                    , float),
+    ("HID"                        , str),
+    ("checkSum"                   , str),
+    ])
+
+WIMWV = registerSchema("WIMWV", [
+    ("dateTime"                   , str),
+    ("windAngle"                  , float),
+    ("WAReference"                , str),
+    ("windSpeed"                  , float),
+    ("WSUnits"                    , str),
+    ("status"                     , str),
+    ("checkSum"                   , str),
+    ])
+
+GPVTG = registerSchema("GPVTG", [
+    ("dateTime"                   , str),
+    ("courseOGTrue"               , float),
+    ("relativeToTN"               , str),
+    ("courseOGMagnetic"           , float),
+    ("relativeToMN"               , str),
+    ("speedOverGroundKnots"       , float),
+    ("SOGKUnits"                  , str),
+    ("speedOverGroundKMPH"        , float),
+    ("SOGKMPHUnits"               , str),
+    ("mode"                       , str),
+    ("checkSum"                   , str),
+    ])
+
+GPZDA = registerSchema("GPZDA", [
+    ("dateTime"                   , str),
+    ("UTCTimeStamp"               , str),
+    ("UTCDay"                     , int),
+    ("UTCMonth"                   , int),
+    ("UTCYear"                    , int),
+    ("checkSum"                   , str),
+    ])
+
+WIMDA = registerSchema("WIMDA", [
+    ("dateTime"                   , str),
+    ("barrometricPressureMercury" , float),
+    ("BPMUnits"                   , str),
+    ("barrometricPressureBars"    , float),
+    ("BPBUnits"                   , str),
+    ("airTemperature"             , float),
+    ("ATUnits"                    , str),
+    ("waterTemperature"           , float),
+    ("WTUnits"                    , str),
+    ("relativeHumidity"           , float),
+    ("absoluteHumidity"           , float),
+    ("dewPoint"                   , float),
+    ("DPUnits"                    , str),
+    ("windDirectionTrue"          , float),
+    ("WDTUnits"                   , str),
+    ("windDirectionMagnetic"      , float),
+    ("WDMUnits"                   , str),
+    ("windSpeedKnots"             , float),
+    ("WSKUnits"                   , str),
+    ("windSpeedMetersPerSecond"   , float),
+    ("WSMPSUnits"                 , str),
+    ("checkSum"                   , str),
+    ])
+
+# Particulate matter
+IPS7100 = registerSchema("IPS7100", [("dateTime", str)] +
+    [(keyIn, int)   for keyIn in ("pc0_1", "pc0_3", "pc0_5", "pc1_0",
+                                  "pc2_5", "pc5_0", "pc10_0")] +
+    [(keyIn, float) for keyIn in ("pm0_1", "pm0_3", "pm0_5", "pm1_0",
+                                  "pm2_5", "pm5_0", "pm10_0")])
+
+OPCN3 = registerSchema("OPCN3", [("dateTime", str), ("valid", int)] +
+    [("binCount" + str(index), int) for index in range(24)] + [
+    ("bin1TimeToCross"            , int),
+    ("bin3TimeToCross"            , int),
+    ("bin5TimeToCross"            , int),
+    ("bin7TimeToCross"            , int),
+    ("samplingPeriod"             , float),
+    ("sampleFlowRate"             , float),
+    ("temperature"                , float),
+    ("humidity"                   , float),
+    ("pm1"                        , float),
+    ("pm2_5"                      , float),
+    ("pm10"                       , float),
+    ("rejectCountGlitch"          , int),
+    ("rejectCountLongTOF"         , int),
+    ("rejectCountRatio"           , int),
+    ("rejectCountOutOfRange"      , int),
+    ("fanRevCount"                , int),
+    ("laserStatus"                , int),
+    ("checkSum"                   , int),
+    ])
+
+# Methane, written as OrderedDicts by sjh5Reader and inir2me5Reader
+SJH5 = registerSchema("SJH5", [("dateTime", str), ("methane", float)] +
+    [(keyIn, int) for keyIn in ("warmUpStatus", "malFunctionStatus", "rangeStatus",
+                                "calibrationStatus", "highHumidityStatus",
+                                "RCDOverLimitStatus", "MCDOverLimitStatus",
+                                "timeElapsed")])
+
+INIR2ME5 = registerSchema("INIR2ME5", [
+    ("dateTime"                   , str),
+    ("methane"                    , int),
+    ("faultCode"                  , int),
+    ("temperature"                , float),
+    ("ref1SecAverage"             , int),
+    ("act1SecAverage"             , int),
+    ("crc"                        , int),
+    ("crc1sComp"                  , int),
+    ("timeElapsed"                , int),
+    ])
+
+
+if __name__ == "__main__":
+    # Memory and CPU per OPCN3 record, OrderedDict of strings against Record
+    # run python3 -m mintsXU4.mintsSchema
+    import datetime
+    import json
+    import time
+    import tracemalloc
+
+    records  = 10000
+    dateTime = datetime.datetime(2025, 1, 4, 13, 1, 59, 123456)
+    dataOut  = ["1"] + [str(index*3) for index in range(24)] + \
+               ["41", "38", "22", "19", "2.51", "4.82", "25612", "21500",
+                "3.21", "8.44", "11.92", "0", "1", "0", "0", "0", "213", "16373"]
+
+    def asDictionary():
+        return OrderedDict([("dateTime", str(dateTime))] +
+                           list(zip(OPCN3.keys[1:30], dataOut[:29])) +
+                           [("temperature", str(float(dataOut[29])/1000)),
+                            ("humidity", str(float(dataOut[30])/500))] +
+                           list(zip(OPCN3.keys[32:], dataOut[31:])))
+
+    def asRecord():
+        return OPCN3.record(str(dateTime), *(dataOut[:29] +
+                            [float(dataOut[29])/1000, float(dataOut[30])/500] +
+                            dataOut[31:]))
+
+    # A Record must read like the dictionary it replaces
+    record = asRecord()
+    assert dict(record) == dict(record.items()) == dict(zip(OPCN3.keys, record.values()))
+    assert list(record.values()) == list(record.data) and record["valid"] == 1
+
+    for label, build in (("OrderedDict", asDictionary), ("Record", asRecord)):
+        startTime = time.perf_counter()
+        kept      = [build() for _ in range(records)]
+        buildTime = time.perf_counter() - startTime
+
+        del kept
+        tracemalloc.start()
+        kept      = [build() for _ in range(records)]
+        memory    = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        # What a consumer pays to get numbers out of it
+        startTime = time.perf_counter()
+        for sensorDictionary in kept:
+            total = sum(float(valueIn) for keyIn, valueIn in sensorDictionary.items()
+                        if keyIn.startswith("binCount"))
+        useTime = time.perf_counter() - startTime
+
+        print(label)
+        print("  Bytes per record         : {0:.0f}".format(memory/records))
+        print("  Build (us per record)    : {0:.2f}".format(1e6*buildTime/records))
+        print("  Consume (us per record)  : {0:.2f}".format(1e6*useTime/records))
+        print("  JSON                     : {0}".format(
+            json.dumps(kept[0], default=jsonDefault)[:60]))
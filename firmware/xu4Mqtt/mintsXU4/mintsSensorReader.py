@@ -20,24 +20,91 @@ import csv
 #import deepdish as dd
 from mintsXU4 import mintsLatest as mL
 from mintsXU4 import mintsDefinitions as mD
+from mintsXU4 import mintsWriter as mW
+from mintsXU4 import mintsPaths as mP
+from mintsXU4 import mintsColumnar as mC
+from mintsXU4 import mintsLogger as mLog
+from mintsXU4 import mintsSinks as mSinks
+from mintsXU4 import mintsBoard as mB
+from mintsXU4 import mintsBatch as mBatch
+from mintsXU4 import mintsPolicy as mPolicy
+from mintsXU4 import mintsWindow as mWindow
+from mintsXU4 import mintsSchema as mSchema
+from mintsXU4 import mintsCodec as mCodec
 from getmac import get_mac_address
 import time
 import serial
 import pynmea2
 from collections import OrderedDict
-from pprint import pprint
 import netifaces as ni
 import math
 import json
+import atexit
 
 
 
 macAddress      = mD.macAddress
 dataFolder      = mD.dataFolder
+dataFolderReference = mD.dataFolderReference
 dataFolderMQTT  = mD.dataFolderMQTT
 latestOn        = mD.latestOn
 mqttOn          = mD.mqttOn
 
+logger          = mLog.getLogger(__name__)
+
+pathResolver    = mP.WritePathResolver()
+
+# Destinations of every finished record, see mintsSinks for adding more
+csvWriters      = mW.CSVWriterCache(mD.csvCacheSize,mD.csvFlushInterval,mD.csvFsync,
+                                    lambda writePath,dateIn: mW.compressDailyCSV(writePath,dateIn,mD.csvCompression))
+mSinks.registerSink(mSinks.CSVSink(csvWriters),("raw","wearable","reference","ip"))
+
+if mD.columnarOn:
+    try:
+        mSinks.registerSink(mSinks.ColumnarSink(mC.ColumnarWriter(mD.columnarFlushInterval,mD.columnarCompression)),("raw",))
+    except ImportError as e:
+        logger.error("Columnar files turned off: %s",e)
+
+if latestOn:
+    mSinks.registerSink(mSinks.JSONLatestSink(),("raw","wearable"))
+
+if mD.latestBoardOn:
+    try:
+        mSinks.registerSink(mSinks.BoardSink(mB.LatestBoard(mD.latestBoardFile,mD.latestBoardSlots,mD.latestBoardSlotSize)),("raw",))
+    except (OSError, ValueError) as e:
+        logger.error("Latest board turned off: %s",e)
+
+if mqttOn:
+    batchEncoder = None
+    # With the gateway on, records are batched in the gateway
+    if mD.mqttBatchOn and not mD.mqttGatewayOn:
+        try:
+            batchEncoder = mBatch.BatchEncoder(mD.mqttBatchWindow,mD.mqttBatchSize)
+        except ImportError as e:
+            logger.error("Batched MQTT payloads turned off: %s",e)
+    payloadEncoder = None
+    # Batches are compact already
+    if mD.mqttCodecOn and batchEncoder is None:
+        try:
+            payloadEncoder = mCodec.PayloadEncoder(mD.mqttCodecFolder,mD.mqttCodecLevel)
+        except (ImportError, OSError, ValueError) as e:
+            logger.error("Compressed MQTT payloads turned off: %s",e)
+    policy = mPolicy.PublishPolicy(mD.mqttPolicy) if mD.mqttPolicyOn else None
+    aggregator = mWindow.WindowAggregator(mD.mqttWindow,exclude=mD.mqttWindowExclude,
+                                          lastValue=mD.mqttWindowLastValue) if mD.mqttWindowOn else None
+    mSinks.registerSink(mSinks.MQTTSink(batchEncoder,policy,aggregator,payloadEncoder),("raw","wearable","ip"))
+
+# Queued rows are written on a normal exit. Reader scripts turn the kill sent
+# by killAll.sh into one with a SIGTERM handler in their __main__ block
+atexit.register(mSinks.stopSinks)
+
+recordCounter   = mLog.RecordCounter(logger,mD.logSummaryInterval,mSinks.logSinkStats)
+
+def finishRecord(kind,dateTime,nodeID,sensorName,sensorDictionary,writePath):
+    mSinks.dispatch(mSinks.SensorRecord(kind,dateTime,nodeID,sensorName,sensorDictionary,writePath))
+    recordCounter.count(sensorName)
+    logger.debug("%s %s",writePath,sensorDictionary)
+
 def delayMints(timeSpent,loopIntervalIn):
     loopIntervalReal = loopIntervalIn ;
     if(loopIntervalReal>timeSpent):
@@ -48,69 +115,29 @@ def delayMints(timeSpent,loopIntervalIn):
 
 
 def sensorFinisherWearable(dateTime,hostID,sensorName,sensorDictionary):
-    print()
     writePath = getWritePathWearable(hostID,sensorName,dateTime)
-    exists = directoryCheck(writePath)
-    writeCSV2(writePath,sensorDictionary,exists)
-    # print(writePath)
-    if(mqttOn):
-       mL.writeMQTTLatestWearable(hostID,sensorName,sensorDictionary)
-    if(latestOn):
-       mL.writeJSONLatestWearable(hostID,sensorName,sensorDictionary)
-    print(sensorName)
-    pprint(sensorDictionary)
-    print()
+    finishRecord("wearable",dateTime,hostID,sensorName,sensorDictionary,writePath)
 
 def getWritePathWearable(nodeID,labelIn,dateTime):
     #Example  : MINTS_0061_OOPCN3_2019_01_04.csv
-    print(nodeID)
-    writePath = dataFolder+"/"+nodeID+"/"+str(dateTime.year).zfill(4)  + "/" + str(dateTime.month).zfill(2)+ "/"+str(dateTime.day).zfill(2)+"/"+ "MINTS_"+ nodeID+ "_" +labelIn + "_" + str(dateTime.year).zfill(4) + "_" +str(dateTime.month).zfill(2) + "_" +str(dateTime.day).zfill(2) +".csv"
-    return writePath;
+    return pathResolver.getDailyPath(dataFolder,nodeID,labelIn,dateTime)
 
 
 
 def sensorFinisher(dateTime,sensorName,sensorDictionary):
     writePath = getWritePath(sensorName,dateTime)
-    exists = directoryCheck(writePath)
-    writeCSV2(writePath,sensorDictionary,exists)
-    print(writePath)
-    if(latestOn):
-       mL.writeJSONLatest(sensorDictionary,sensorName)
-    if(mqttOn):
-       mL.writeMQTTLatest(sensorDictionary,sensorName)   
-    print(sensorName)
-    pprint(sensorDictionary)
-    print("-----------------------------------")
-    print()
+    finishRecord("raw",dateTime,macAddress,sensorName,sensorDictionary,writePath)
 
 def sensorFinisherReference(dateTime,sensorName,sensorDictionary):
     # Getting Write Path
-    print("-----------------------------------")
     writePath = getWritePathReference(sensorName,dateTime)
-    exists    = directoryCheck(writePath)
-    writeCSV2(writePath,sensorDictionary,exists)
-    print(writePath)
-    # if(latestDisplayOn):
-    #    mL.writeJSONLatestReference(sensorDictionary,sensorName)
-    print(sensorName)
-    print(sensorDictionary)
-    print("-----------------------------------")
+    finishRecord("reference",dateTime,macAddress,sensorName,sensorDictionary,writePath)
 
 
 def sensorFinisherIP(dateTime,sensorName,sensorDictionary):
     #Getting Write Path
     writePath = getWritePathIP(sensorName,dateTime)
-    exists = directoryCheck(writePath)
-    writeCSV2(writePath,sensorDictionary,exists)
-    print(writePath)
-    # if(latestDisplayOn):
-    #    mL.writeJSONLatest(sensorDictionary,sensorName)
-    if(mqttOn):
-       mL.writeMQTTLatest(sensorDictionary,sensorName)   
-        
-    print("-----------------------------------")
-    print(sensorName)
-    print(sensorDictionary)
+    finishRecord("ip",dateTime,macAddress,sensorName,sensorDictionary,writePath)
 
 def dataSplit(dataString,dateTime):
     dataOut   = dataString.split('!')
@@ -188,9 +215,9 @@ def gpsStatus(fileIn):
 
         return data['gps'] == "on" 
     except Exception as e:
-        print(e)
+        logger.error("GPS status not read: %s",e)
 
-    print("GPS Turned Off")
+    logger.info("GPS Turned Off")
     return False
 
 
@@ -211,19 +238,24 @@ def QLMRAD001Write(dataString,dateTime):
 def getDeltaTimeAM(beginTime,deltaWanted):
     return (time.time() - beginTime)> deltaWanted
 
+def NMEAWriteAM(schema,sensorData,dateTime):
+    # For sentence types declared with "fields" in mD.airmarSentences, see mintsNMEA
+    dataOut    = sensorData.replace('*',',').split(',')
+    sensorName = schema.sensorName
+    logger.debug("%s-%d-%d",sensorName,len(schema.keys),len(dataOut))
+    if(len(dataOut) == len(schema.keys) and bool(dataOut[1])):
+        sensorDictionary = schema.record(str(dateTime),*dataOut[1:])
+
+        sensorFinisher(dateTime,sensorName,sensorDictionary)
+
 def HCHDTWriteAM(sensorData,dateTime):
 
     dataOut    = sensorData.replace('*',',').split(',')
     sensorName = "HCHDT"
     dataLength = 3
-    print(sensorName+"-"+str(dataLength)+"-"+str(len(dataOut)))
+    logger.debug("%s-%d-%d",sensorName,dataLength,len(dataOut))
     if(len(dataOut) ==(dataLength +1) and bool(dataOut[1])):
-        sensorDictionary = OrderedDict([
-                ("dateTime"    ,str(dateTime)),
-        	    ("heading"      ,dataOut[1]),
-            	("HID"          ,dataOut[2]),
-                ("checkSum"     ,dataOut[3]),
-        	     ])
+        sensorDictionary = mSchema.HCHDT.record(str(dateTime),*dataOut[1:4])
 
         sensorFinisher(dateTime,sensorName,sensorDictionary)
 
@@ -231,17 +263,9 @@ def WIMWVWriteAM(sensorData,dateTime):
     dataOut    = sensorData.replace('*',',').split(',')
     sensorName = "WIMWV"
     dataLength = 6
-    print(sensorName+"-"+str(dataLength)+"-"+str(len(dataOut)))
+    logger.debug("%s-%d-%d",sensorName,dataLength,len(dataOut))
     if(len(dataOut) ==(dataLength +1) and bool(dataOut[1])):
-        sensorDictionary = OrderedDict([
-                ("dateTime"       ,str(dateTime)),
-        	    ("windAngle"      ,dataOut[1]),
-            	("WAReference"    ,dataOut[2]),
-                ("windSpeed"      ,dataOut[3]),
-            	("WSUnits" ,       dataOut[4]),
-            	("status"         ,dataOut[5]),
-                ("checkSum"       ,dataOut[6]),
-        	     ])
+        sensorDictionary = mSchema.WIMWV.record(str(dateTime),*dataOut[1:7])
 
         sensorFinisher(dateTime,sensorName,sensorDictionary)
 
@@ -250,10 +274,10 @@ def GPGGAWriteAM(sensorData,dateTime):
     dataOut    = sensorData.replace('*',',').split(',')
     sensorName = "GPGGA"
     dataLength = 15
-    gpsQuality = int(dataOut[6])
     #print(dataOut)
     #print(sensorName+"-"+str(dataLength)+"-"+str(len(dataOut)))
-    if((len(dataOut) == (dataLength +1)) and (gpsQuality>0)):
+    # No fix yet leaves the quality empty or 0
+    if((len(dataOut) == (dataLength +1)) and dataOut[6].isdigit() and (int(dataOut[6])>0)):
         sensorDictionary = OrderedDict([
                 ("dateTime"              ,str(dateTime)),
         	    ("UTCTimeStamp"          ,dataOut[1]),
@@ -282,19 +306,7 @@ def GPVTGWriteAM(sensorData,dateTime):
     #print(dataOut)
     #print(sensorName+"-"+str(dataLength)+"-"+str(len(dataOut)))
     if(len(dataOut) ==(dataLength +1) and bool(dataOut[1])):
-        sensorDictionary = OrderedDict([
-                ("dateTime"               ,str(dateTime)),
-        	("courseOGTrue"           ,dataOut[1]),
-            	("relativeToTN"           ,dataOut[2]),
-	        ("courseOGMagnetic"       ,dataOut[3]),
-                ("relativeToMN"           ,dataOut[4]),
-                ("speedOverGroundKnots"   ,dataOut[5]),
-            	("SOGKUnits"              ,dataOut[6]),
-                ("speedOverGroundKMPH"    ,dataOut[7]),
-            	("SOGKMPHUnits"           ,dataOut[8]),
-                ("mode"                   ,dataOut[9]),
-                ("checkSum"               ,dataOut[10]),
-             ])
+        sensorDictionary = mSchema.GPVTG.record(str(dateTime),*dataOut[1:11])
         sensorFinisher(dateTime,sensorName,sensorDictionary)
 
 def GPZDAWriteAM(sensorData,dateTime):
@@ -304,14 +316,7 @@ def GPZDAWriteAM(sensorData,dateTime):
     #print(dataOut)
     #print(sensorName+"-"+str(dataLength)+"-"+str(len(dataOut)))
     if(len(dataOut) ==(dataLength +1) and bool(dataOut[1])):
-        sensorDictionary = OrderedDict([
-                ("dateTime"              ,str(dateTime)),
-        	    ("UTCTimeStamp"          ,dataOut[1]),
-            	("UTCDay"                ,dataOut[2]),
-	            ("UTCMonth"              ,dataOut[3]),
-        	    ("UTCYear"               ,dataOut[4]),
-                ("checkSum"              ,dataOut[5])
-        	     ])
+        sensorDictionary = mSchema.GPZDA.record(str(dateTime),*dataOut[1:6])
 
         sensorFinisher(dateTime,sensorName,sensorDictionary)
 
@@ -322,30 +327,7 @@ def WIMDAWriteAM(sensorData,dateTime):
     dataLength = 21
     #print(sensorName+"-"+str(dataLength)+"-"+str(len(dataOut)))
     if(len(dataOut) ==(dataLength +1) and bool(dataOut[1])):
-        sensorDictionary = OrderedDict([
-                ("dateTime"                        ,str(dateTime)),
-        	    ("barrometricPressureMercury"      ,dataOut[1]),
-            	("BPMUnits"                        ,dataOut[2]),
-                ("barrometricPressureBars"         ,dataOut[3]),
-                ("BPBUnits"                        ,dataOut[4]),
-                ("airTemperature"                  ,dataOut[5]),
-                ("ATUnits"                         ,dataOut[6]),
-                ("waterTemperature"                ,dataOut[7]),
-                ("WTUnits"                         ,dataOut[8]),
-            	("relativeHumidity"                ,dataOut[9]),
-                ("absoluteHumidity"                ,dataOut[10]),
-                ("dewPoint"                        ,dataOut[11]),
-                ("DPUnits"                         ,dataOut[12]),
-                ("windDirectionTrue"               ,dataOut[13]),
-                ("WDTUnits"                        ,dataOut[14]),
-                ("windDirectionMagnetic"           ,dataOut[15]),
-                ("WDMUnits"                        ,dataOut[16]),
-                ("windSpeedKnots"                  ,dataOut[17]),
-                ("WSKUnits"                        ,dataOut[18]),
-                ("windSpeedMetersPerSecond"        ,dataOut[19]),
-                ("WSMPSUnits"                      ,dataOut[20]),
-                ("checkSum"                        ,dataOut[21])
-        	     ])
+        sensorDictionary = mSchema.WIMDA.record(str(dateTime),*dataOut[1:22])
 
         sensorFinisher(dateTime,sensorName,sensorDictionary)
 
@@ -407,23 +389,8 @@ def IPS7100Write(sensorData,dateTime):
     dataLength1 = 29
     dataLength2 = 30
     if(len(dataOut) == (dataLength1) or len(dataOut) == (dataLength2)):
-        sensorDictionary =  OrderedDict([
-                ("dateTime" , str(dateTime)), # always the same
-        		("pc0_1"  ,dataOut[1]), 
-            	("pc0_3"  ,dataOut[3]),
-                ("pc0_5"  ,dataOut[5]),
-                ("pc1_0"  ,dataOut[7]),
-            	("pc2_5"  ,dataOut[9]),
-        		("pc5_0"  ,dataOut[11]), 
-            	("pc10_0" ,dataOut[13]),
-                ("pm0_1"  ,dataOut[15]),
-            	("pm0_3"  ,dataOut[17]),
-        		("pm0_5"  ,dataOut[19]), 
-            	("pm1_0"  ,dataOut[21]),
-                ("pm2_5"  ,dataOut[23]),
-            	("pm5_0"  ,dataOut[25]),         
-                ("pm10_0"  ,dataOut[27])
-                ])
+        # Counts and mass concentrations, i.e. every other field
+        sensorDictionary = mSchema.IPS7100.record(str(dateTime),*dataOut[1:28:2])
         sensorFinisher(dateTime,sensorName,sensorDictionary)
         
 def BME680Write(sensorData,dateTime):
@@ -501,7 +468,7 @@ def SCD30WriteI2c(sensorData):
                     ])
             sensorFinisher(sensorData[0],sensorName,sensorDictionary)
     else:
-        print("No Sensor Data Retun")          
+        logger.warning("No Sensor Data Retun")          
 
 def SCD30Write(sensorData,dateTime):
     dataOut    = sensorData.split(':')
@@ -720,52 +687,9 @@ def OPCN3Write(sensorData,dateTime):
     sensorName = "OPCN3"
     dataLength=43
     if(len(dataOut) == (dataLength +1)):
-        sensorDictionary = OrderedDict([
-                ("dateTime"    ,str(dateTime)),
-        		("valid"       ,dataOut[0]),
-            	("binCount0"   ,dataOut[1]),
-            	("binCount1"   ,dataOut[2]),
-            	("binCount2"   ,dataOut[3]),
-            	("binCount3"   ,dataOut[4]),
-            	("binCount4"   ,dataOut[5]),
-            	("binCount5"   ,dataOut[6]),
-            	("binCount6"   ,dataOut[7]),
-            	("binCount7"   ,dataOut[8]),
-            	("binCount8"   ,dataOut[9]),
-            	("binCount9"   ,dataOut[10]),
-            	("binCount10"  ,dataOut[11]),
-            	("binCount11"  ,dataOut[12]),
-            	("binCount12"  ,dataOut[13]),
-            	("binCount13"  ,dataOut[14]),
-            	("binCount14"  ,dataOut[15]),
-            	("binCount15"  ,dataOut[16]),
-            	("binCount16"  ,dataOut[17]),
-            	("binCount17"  ,dataOut[18]),
-            	("binCount18"  ,dataOut[19]),
-            	("binCount19"  ,dataOut[20]),
-            	("binCount20"  ,dataOut[21]),
-            	("binCount21"  ,dataOut[22]),
-            	("binCount22"  ,dataOut[23]),
-            	("binCount23"  ,dataOut[24]),
-                ("bin1TimeToCross"      ,dataOut[25]),
-                ("bin3TimeToCross"      ,dataOut[26]),
-                ("bin5TimeToCross"      ,dataOut[27]),
-                ("bin7TimeToCross"      ,dataOut[28]),
-                ("samplingPeriod"       ,dataOut[29]),
-                ("sampleFlowRate"       ,dataOut[30]),
-                ("temperature"          ,str(float(dataOut[31])/1000)),
-                ("humidity"             ,str(float(dataOut[32])/500)),
-                ("pm1"                ,dataOut[33]),
-                ("pm2_5"              ,dataOut[34]),
-                ("pm10"               ,dataOut[35]),
-                ("rejectCountGlitch"    ,dataOut[36]),
-                ("rejectCountLongTOF"   ,dataOut[37]),
-                ("rejectCountRatio"     ,dataOut[38]),
-                ("rejectCountOutOfRange",dataOut[39]),
-                ("fanRevCount"          ,dataOut[40]),
-                ("laserStatus"          ,dataOut[41]),
-                ("checkSum"             ,dataOut[42])
-                ])
+        sensorDictionary = mSchema.OPCN3.record(str(dateTime),*(dataOut[0:31]
+                                                +[float(dataOut[31])/1000,float(dataOut[32])/500]
+                                                +dataOut[33:43]))
 
         #Getting Write Path
         sensorFinisher(dateTime,sensorName,sensorDictionary)
@@ -825,7 +749,6 @@ def TMG3993Write(sensorData, dateTime):
         sensorFinisher(dateTime,sensorName,sensorDictionary)
 
 def GL001Write(sensorData, dateTime):
-    print("GL001Write: {0}".format(dateTime))
     dataOut    = sensorData.split(':')
     sensorName = "GL001"
     dataLength = 1
@@ -945,7 +868,7 @@ def GPSGPGGAWrite(dataString,dateTime):
 def GPSGPGGA2Write(dataString,dateTime):
     dataStringPost = dataString.replace('\n', '')
     sensorData = pynmea2.parse(dataStringPost)
-    print(dataStringPost)    
+    logger.debug(dataStringPost)    
     if(sensorData.gps_qual>0):
         latitudeCordinate = getLatitudeCords(sensorData.lat,sensorData.lat_dir)
         sensorName = "GPSGPGGA2"
@@ -1000,7 +923,7 @@ def GPSGPRMC2Write(dataString,dateTime):
 
     dataStringPost = dataString.replace('\n', '')
     sensorData = pynmea2.parse(dataStringPost)
-    print(dataStringPost)
+    logger.debug(dataStringPost)
     if(sensorData.status=='A'):
         sensorName = "GPSGPRMC2"
         sensorDictionary = OrderedDict([
@@ -1052,25 +975,21 @@ def getWritePathIP(labelIn,dateTime):
 
 
 def getWritePathSnaps(labelIn,dateTime):
-    #Example  : MINTS_0061_OOPCN3_2019_01_04.csv
-    writePath = dataFolder+"/"+macAddress+"/"+str(dateTime.year).zfill(4)  + "/" + str(dateTime.month).zfill(2)+ "/"+str(dateTime.day).zfill(2)+"/snaps/MINTS_"+ macAddress+ "_" +labelIn + "_" + str(dateTime.year).zfill(4) + "_" +str(dateTime.month).zfill(2) + "_" +str(dateTime.day).zfill(2) + "_" +str(dateTime.hour).zfill(2) + "_" +str(dateTime.minute).zfill(2)+ "_" +str(dateTime.second).zfill(2) +".png"
-    return writePath;
+    #Example  : MINTS_0061_OOPCN3_2019_01_04_13_01_59.png
+    return pathResolver.getSnapsPath(dataFolder,macAddress,labelIn,dateTime)
 
 def getWritePathReference(labelIn,dateTime):
     #Example  : MINTS_0061_OOPCN3_2019_01_04.csv
-    writePath = dataFolderReference+"/"+macAddress+"/"+str(dateTime.year).zfill(4)  + "/" + str(dateTime.month).zfill(2)+ "/"+str(dateTime.day).zfill(2)+"/"+ "MINTS_"+ macAddress+ "_" +labelIn + "_" + str(dateTime.year).zfill(4) + "_" +str(dateTime.month).zfill(2) + "_" +str(dateTime.day).zfill(2) +".csv"
-
-    return writePath;
+    return pathResolver.getDailyPath(dataFolderReference,macAddress,labelIn,dateTime)
 
 
 def getWritePath(labelIn,dateTime):
     #Example  : MINTS_0061_OOPCN3_2019_01_04.csv
-    writePath = dataFolder+"/"+macAddress+"/"+str(dateTime.year).zfill(4)  + "/" + str(dateTime.month).zfill(2)+ "/"+str(dateTime.day).zfill(2)+"/"+ "MINTS_"+ macAddress+ "_" +labelIn + "_" + str(dateTime.year).zfill(4) + "_" +str(dateTime.month).zfill(2) + "_" +str(dateTime.day).zfill(2) +".csv"
-    return writePath;
+    return pathResolver.getDailyPath(dataFolder,macAddress,labelIn,dateTime)
 
 def getListDictionaryFromPath(dirPath):
-    print("Reading : "+ dirPath)
-    reader = csv.DictReader(open(dirPath))
+    logger.info("Reading : %s",dirPath)
+    reader = csv.DictReader(mW.openCSV(dirPath))
     reader = list(reader)
 
 def fixCSV(keyIn,valueIn,currentDictionary):
@@ -1087,9 +1006,7 @@ def getDateDataOrganized(currentCSV,nodeID):
     currentCSVName = os.path.basename(currentCSV)
     nameOnly = currentCSVName.split('-Organized.')
     dateOnly = nameOnly[0].split(nodeID+'-')
-    print(dateOnly)
     dateInfo = dateOnly[1].split('-')
-    print(dateInfo)
     return dateInfo
 
 
@@ -1111,9 +1028,9 @@ def getLocationList(directory, suffix=".csv"):
 
 
 def getListDictionaryCSV(inputPath):
-    # the path will depend on the node ID
-    reader = csv.DictReader(open(inputPath))
-    reader = list(reader)
+    # the path will depend on the node ID, .csv.gz and .csv.zst files are read as well
+    with mW.openCSV(inputPath) as csvFile:
+        reader = list(csv.DictReader(csvFile))
     return reader
 
 def writeCSV(reader,keys,outputPath):
@@ -1122,10 +1039,7 @@ def writeCSV(reader,keys,outputPath):
 
 def directoryCheck(outputPath):
     exists = os.path.isfile(outputPath)
-    directoryIn = os.path.dirname(outputPath)
-    if not os.path.exists(directoryIn):
-        print("Creating Folder @:" + directoryIn)
-        os.makedirs(directoryIn)
+    pathResolver.checkWritePath(outputPath)
     return exists
 
 def directoryCheck2(outputPath):
@@ -1138,7 +1052,7 @@ def directoryCheck2(outputPath):
         directoryIn = os.path.dirname(outputPath+"/")
 
     if not os.path.exists(directoryIn):
-        print("Creating Folder @:" + directoryIn)
+        logger.info("Creating Folder @:%s",directoryIn)
         os.makedirs(directoryIn)
         return False
     return True;
@@ -1151,7 +1065,14 @@ def directoryCheck2(outputPath):
 
 
 def csvWriter(writePath,organizedData,keys):
-    with open(writePath,'w') as output_file:
+    try:
+        output_file = open(writePath,'w')
+    except FileNotFoundError:
+        # The folder was removed since it was checked, e.g. by deleter.py
+        pathResolver.invalidate(os.path.dirname(writePath))
+        pathResolver.checkWritePath(writePath)
+        output_file = open(writePath,'w')
+    with output_file:
         writer = csv.DictWriter(output_file, fieldnames=keys)
         writer.writeheader()
         writer.writerows(organizedData)
@@ -0,0 +1,520 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module holds the framing of the serial sensors: it turns the byte
+#   stream of a port into whole lines (or frames) without spinning on the
+#   port, and asks polled sensors for their answers without fixed sleeps.
+#   Reads block in the driver until data is there and take everything
+#   that is waiting (or exactly what an answer still needs) at once.
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+import collections
+import time
+
+from mintsXU4 import mintsLogger as mLog
+
+logger = mLog.getLogger(__name__)
+
+
+class LineReader:
+    """Splits the bytes of a serial port into lines, e.g. NMEA sentences.
+
+    The port must be opened with a timeout > 0: readLines() then sleeps in
+    the driver until a byte arrives (or timeout seconds pass) and reads
+    every waiting byte in one call. Lines come back without the line end,
+    decoded as latin-1, which never fails. A line longer than maxLineLength
+    (noise, a wrong baud rate) is dropped and counted in overflows.
+    """
+
+    def __init__(self, ser=None, maxLineLength=512, terminator=b"\n"):
+        self.ser           = ser
+        self.maxLineLength = maxLineLength
+        self.terminator    = terminator
+        self.buffer        = bytearray()
+        self.discarding    = False
+        self.lines         = 0
+        self.overflows     = 0
+
+    def readLines(self):
+        return self.feed(self.ser.read(self.ser.in_waiting or 1))
+
+    def feed(self, data):
+        # For bytes read elsewhere, e.g. by mintsSerialHub
+        if data:
+            self.buffer += data
+        return self.splitLines()
+
+    def splitLines(self):
+        lines  = []
+        buffer = self.buffer
+        start  = 0
+        while True:
+            end = buffer.find(self.terminator, start)
+            if end < 0:
+                break
+            if self.discarding:
+                # The rest of a line that was already too long
+                self.discarding = False
+            elif end - start > self.maxLineLength:
+                self.overflows += 1
+            else:
+                lines.append(buffer[start:end].rstrip(b"\r").decode("latin-1"))
+            start = end + len(self.terminator)
+        del buffer[:start]
+        if len(buffer) > self.maxLineLength:
+            if not self.discarding:
+                self.overflows += 1
+                logger.warning("Serial line longer than %d bytes dropped", self.maxLineLength)
+            self.discarding = True
+            del buffer[:]
+        self.lines += len(lines)
+        return lines
+
+
+hexDigits  = frozenset(b"0123456789abcdefABCDEF")
+separators = frozenset(b"\r\n ")
+
+
+class InirFrameReader:
+    """Finds the engineering mode frames of the INIR2ME5 in its byte stream.
+
+    A frame is 0000005b, seven hex words (methane, fault code, temperature,
+    reference and active 1 s averages, crc, 1's complement of the crc) and
+    0000005d, one 8 digit word per line. Every byte is looked at once and
+    only the word in progress and the values of the frame are kept, so a
+    missed end marker or line noise cannot grow the buffer. A word of the
+    frame that reads like a marker (e.g. 93 ppm) is taken as a value; when
+    the frame then does not end where it should, its words are looked
+    through again for a 0000005b to get back in step. feed() returns the
+    frames whose crc and its complement agree, as lists of the values.
+
+    The crc is not computed over the values: its algorithm is not known
+    here, so the complement only catches a garbled crc word, not a garbled
+    value next to an intact crc. Frames taken on the complement alone are
+    counted in crcUnchecked, see stats().
+    """
+
+    frameWords = 7
+    wordLength = 8
+    startValue = 0x5b
+    endValue   = 0x5d
+
+    def __init__(self):
+        self.word         = bytearray()
+        self.values       = None
+        self.frames       = 0
+        self.badFrames    = 0
+        self.resyncs      = 0
+        self.crcUnchecked = 0
+
+    def feed(self, data):
+        frames = []
+        word   = self.word
+        for byte in data:
+            if byte in hexDigits:
+                word.append(byte)
+                if len(word) == self.wordLength:
+                    # The end marker is not followed by a line end until
+                    # the next frame, so words end on their length
+                    self.takeValue(int(word, 16), frames)
+                    del word[:]
+            elif byte in separators:
+                if word:
+                    self.resync()
+            else:
+                self.resync()
+        return frames
+
+    def takeValue(self, value, frames):
+        values = self.values
+        if values is None:
+            if value == self.startValue:
+                self.values = []
+        elif len(values) < self.frameWords:
+            values.append(value)
+        elif value == self.endValue and values[5] ^ values[6] == 0xFFFFFFFF:
+            self.frames       += 1
+            self.crcUnchecked += 1
+            self.values        = None
+            frames.append(values)
+        else:
+            if value == self.endValue:
+                self.badFrames += 1
+                logger.debug("INIR2ME5 frame with a bad crc dropped: %s", values)
+            else:
+                self.resyncs += 1
+            # Fewer words than a frame, so this cannot come back here
+            self.values = None
+            for value in values + [value]:
+                self.takeValue(value, frames)
+
+    def resync(self):
+        # Drops the word and frame in progress until the next 0000005b
+        if self.values is not None:
+            self.resyncs += 1
+        del self.word[:]
+        self.values = None
+
+    def stats(self):
+        return {
+            "frames"       : self.frames,
+            "badFrames"    : self.badFrames,
+            "resyncs"      : self.resyncs,
+            "crcUnchecked" : self.crcUnchecked,
+            }
+
+
+class SJH5Transport:
+    """Command and response client of the SJH5 and the sensors that share
+    its frames: requests are IP, LEN, CMD, CS and answers ACK, LEN, CMD,
+    LEN - 1 data bytes and CS, where CS makes the bytes sum to 0 mod 256.
+
+    query() sends a command and reads exactly the length the answer
+    declares, with a deadline instead of fixed sleeps, and always returns
+    (ok, response): (False, None) on a timeout or a bad checksum, (False,
+    response) when the sensor answers with an error. queries() writes
+    several commands back to back and collects their answers in order.
+    Answers to other commands, e.g. late ones after a timeout, are skipped.
+    For a port read elsewhere (mintsSerialHub) feed() returns the checked
+    answers in the bytes given.
+    """
+
+    ackSuccess = 0x16
+    ackError   = 0x06
+    maxLength  = 32
+
+    def __init__(self, ser=None, address=0x11, timeout=0.5):
+        self.ser          = ser
+        self.address      = address
+        self.timeout      = timeout
+        self.buffer       = bytearray()
+        self.ready        = collections.deque()
+        self.responses    = 0
+        self.badChecksums = 0
+        self.timeouts     = 0
+        self.stale        = 0
+        self.resyncs      = 0
+
+    def buildCommand(self, command):
+        commandData = [self.address, 0x01, command]
+        return bytes(commandData + [(-sum(commandData)) & 0xFF])
+
+    def send(self, command):
+        self.ser.write(self.buildCommand(command))
+
+    def query(self, command):
+        self.send(command)
+        return self.receive(command, time.monotonic() + self.timeout)
+
+    def queries(self, commands):
+        self.ser.write(b"".join(self.buildCommand(command) for command in commands))
+        deadline = time.monotonic() + self.timeout*len(commands)
+        return [self.receive(command, deadline) for command in commands]
+
+    def receive(self, command, deadline):
+        while True:
+            while not self.ready:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    logger.warning("SJH5 command %s not answered", hex(command))
+                    return False, None
+                badChecksums     = self.badChecksums
+                self.ser.timeout = remaining
+                self.ready.extend(self.feed(self.ser.read(self.missingBytes())))
+                if self.badChecksums != badChecksums and not self.ready:
+                    return False, None
+            response = self.ready.popleft()
+            if response[2] == command:
+                break
+            self.stale += 1
+        if response[0] == self.ackError:
+            logger.error("Command not implemented correctly. Error code: %s", hex(response[3]))
+            return False, response
+        return True, response
+
+    def missingBytes(self):
+        # Exactly what completes the answer in progress
+        if len(self.buffer) < 2:
+            return 2 - len(self.buffer)
+        return max(1, self.buffer[1] + 3 - len(self.buffer))
+
+    def feed(self, data):
+        responses = []
+        buffer    = self.buffer
+        buffer   += data
+        while buffer:
+            if buffer[0] not in (self.ackSuccess, self.ackError) or \
+                    (len(buffer) > 1 and not 0 < buffer[1] <= self.maxLength):
+                # Not the start of an answer, e.g. the rest of a lost one
+                del buffer[:1]
+                self.resyncs += 1
+                continue
+            if len(buffer) < 2 or len(buffer) < buffer[1] + 3:
+                break
+            length   = buffer[1] + 3
+            response = bytes(buffer[:length])
+            del buffer[:length]
+            if sum(response) & 0xFF:
+                self.badChecksums += 1
+                logger.warning("SJH5 answer with a bad checksum dropped: %s", response)
+                continue
+            self.responses += 1
+            responses.append(response)
+        return responses
+
+    def stats(self):
+        return {
+            "responses"    : self.responses,
+            "badChecksums" : self.badChecksums,
+            "timeouts"     : self.timeouts,
+            "stale"        : self.stale,
+            "resyncs"      : self.resyncs,
+            }
+
+
+if __name__ == "__main__":
+    # nmea: CPU of the old byte at a time loop against LineReader, AirMar
+    # NMEA at 4800 baud through a pseudo terminal
+    # inir: replay of INIR2ME5 engineering mode frames through the old
+    # rejoin loop, the text splitter and InirFrameReader
+    # sjh5: measurement requests to an SJH5 emulated on a pseudo terminal,
+    # the old fixed sleeps against SJH5Transport
+    # run python3 -m mintsXU4.mintsSerial [nmea|inir|sjh5]
+    import os
+    import random
+    import sys
+    import threading
+    import time
+    import tty
+
+    import serial
+
+    from mintsXU4 import mintsNMEA
+
+    def benchmarkNMEA():
+        sentences = [(sentence + "\r\n").encode("latin-1")
+                     for sentence in mintsNMEA.sampleSentences]
+        seconds   = 10
+        byteTime  = 10/4800            # 8N1 at 4800 baud
+
+        def feed(fd, count):
+            # Paced like the wire, one sentence after the other
+            startTime = time.time()
+            sent      = 0
+            for index in range(count):
+                sentence = sentences[index % len(sentences)]
+                os.write(fd, sentence)
+                sent += len(sentence)
+                time.sleep(max(0, startTime + sent*byteTime - time.time()))
+
+        def byteLoop(ser, count):
+            line, lines = [], 0
+            while lines < count:
+                for c in ser.read():
+                    line.append(chr(c))
+                    if chr(c) == '\n':
+                        lines += 1
+                        line   = []
+            return lines
+
+        def lineLoop(ser, count):
+            reader, lines = LineReader(ser), 0
+            while lines < count:
+                lines += len(reader.readLines())
+            return lines
+
+        count = int(seconds/(byteTime*sum(map(len, sentences))/len(sentences)))
+        for label, loop, timeout in (("Byte loop, timeout=0", byteLoop, 0),
+                                     ("LineReader, timeout=1", lineLoop, 1)):
+            master, slave = os.openpty()
+            tty.setraw(slave)
+            ser    = serial.Serial(os.ttyname(slave), 4800, timeout=timeout)
+            feeder = threading.Thread(target=feed, args=(master, count), daemon=True)
+            cpuStart  = time.thread_time()
+            startTime = time.time()
+            feeder.start()
+            lines     = loop(ser, count)
+            cpuTime   = time.thread_time() - cpuStart
+            wallTime  = time.time() - startTime
+            ser.close()
+            os.close(master)
+            print(label)
+            print("  Sentences                : {0} of {1}".format(lines, count))
+            print("  CPU of the reader        : {0:.1f} %".format(100*cpuTime/wallTime))
+
+    def benchmarkInir():
+        random.seed(5)
+        frameCount = 2000
+        expected   = []
+        stream     = bytearray()
+        for index in range(frameCount):
+            crc    = random.getrandbits(32)
+            values = [random.randrange(0, 5000), 0, random.randrange(2880, 3130),
+                      random.getrandbits(24), random.getrandbits(24), crc, crc ^ 0xFFFFFFFF]
+            words  = [b"0000005b"] + [b"%08x" % value for value in values] + [b"0000005d"]
+            text   = b"\n\r" + b"\n\r".join(words)
+            fault  = random.random()
+            if fault < 0.02:
+                # Line noise inside the frame
+                position = random.randrange(10, len(text))   # after 0000005b
+                text = text[:position] + bytes(random.getrandbits(8) for _ in range(6)) + text[position:]
+            elif fault < 0.04:
+                text = text[:-8]                  # end marker lost
+            elif fault < 0.05:
+                text = text.replace(b"%08x" % (crc ^ 0xFFFFFFFF), b"%08x" % (crc ^ 0xFFFF0000))
+            else:
+                expected.append(values)
+            stream += text
+        chunks = [bytes(stream[index:index + 32]) for index in range(0, len(stream), 32)]
+
+        def rejoinLoop(chunks):
+            # inir2me5Reader.main before the frame reader. Once a frame
+            # does not start with 0000005b its buffer is never cleared,
+            # the replay stops when it passes 4 kB
+            lineASCII, frames = [], []
+            for count, chunk in enumerate(chunks):
+                if len(lineASCII) > 4096:
+                    return frames, count
+                for byte in chunk:
+                    lineASCII.append(chr(byte))
+                    data  = ''.join(lineASCII)
+                    lines = data.split("\n\r")
+                    lines = [line for line in lines if line.strip()]
+                    if lines and lines[-1] == "0000005d":
+                        if lines[0] == "0000005b":
+                            try:
+                                frames.append([int(line, 16) for line in lines[1:8]])
+                            except ValueError:
+                                pass
+                            lineASCII = []
+            return frames, len(chunks)
+
+        def textLoop(chunks):
+            # Inir2me5Handler.onData before the frame reader
+            text, frame, frames = "", None, []
+            for chunk in chunks:
+                text += chunk.decode("latin-1")
+                lines = text.split("\n\r")
+                text  = lines.pop()
+                if text.strip() == "0000005d":
+                    lines.append(text)
+                    text = ""
+                elif len(text) > 64:
+                    text = ""
+                for line in lines:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    if line == "0000005b":
+                        frame = [line]
+                    elif frame is not None:
+                        frame.append(line)
+                        if line == "0000005d":
+                            if len(frame) == 9:
+                                try:
+                                    frames.append([int(word, 16) for word in frame[1:8]])
+                                except ValueError:
+                                    pass
+                            frame = None
+                        elif len(frame) > 16:
+                            frame = None
+            return frames, len(chunks)
+
+        def readerLoop(chunks):
+            reader, frames = InirFrameReader(), []
+            for chunk in chunks:
+                frames += reader.feed(chunk)
+            return frames, len(chunks)
+
+        print("Frames sent                : {0}, {1} intact".format(frameCount, len(expected)))
+        good = set(map(tuple, expected))
+        for label, loop in (("Rejoin loop", rejoinLoop), ("Text splitter", textLoop),
+                            ("InirFrameReader", readerLoop)):
+            cpuStart = time.process_time()
+            frames, read = loop(chunks)
+            cpuTime  = time.process_time() - cpuStart
+            replayed = frameCount*read/len(chunks)
+            right    = sum(tuple(frame) in good for frame in frames)
+            print(label)
+            print("  Replayed                 : {0:.0f} frames".format(replayed))
+            print("  Frames                   : {0} right, {1} wrong".format(right, len(frames) - right))
+            print("  Frames per second        : {0:.0f}".format(replayed/cpuTime))
+            print("  CPU per frame (us)       : {0:.1f}".format(1e6*cpuTime/replayed))
+
+    def benchmarkSJH5():
+        samples   = 200
+        byteTime  = 10/9600            # 8N1 at 9600 baud
+        answerLag = 0.01               # Seconds the sensor takes to answer
+        random.seed(6)
+
+        def sensor(fd, stop):
+            # Answers measurement requests, one in fifty with a bad checksum
+            request = b""
+            while not stop.is_set():
+                try:
+                    request += os.read(fd, 64)
+                except OSError:
+                    return
+                while len(request) >= 4:
+                    command, request = request[:4], request[4:]
+                    time.sleep(answerLag)
+                    answer = bytearray([0x16, 0x05, command[2], 0x01, random.randrange(256), 0x00, 0x00])
+                    answer.append((-sum(answer)) & 0xFF)
+                    if random.random() < 0.02:
+                        answer[-1] ^= 0x01
+                    time.sleep(len(answer)*byteTime)
+                    os.write(fd, bytes(answer))
+
+        def oldCycle(ser, transport):
+            # sjh5Reader.send_command before the transport
+            ser.write(transport.buildCommand(0x01))
+            time.sleep(.1)
+            response = ser.read(20)
+            time.sleep(.1)
+            return bool(response) and response[0] == 0x16, response
+
+        def transportCycle(ser, transport):
+            return [transport.query(0x01)]
+
+        def pipelinedCycle(ser, transport):
+            return transport.queries([0x01]*10)
+
+        for label, cycle in (("Sleep, read 20, sleep", oldCycle), ("SJH5Transport.query", transportCycle),
+                             ("SJH5Transport.queries, 10 back to back", pipelinedCycle)):
+            master, slave = os.openpty()
+            tty.setraw(slave)
+            tty.setraw(master)
+            ser       = serial.Serial(os.ttyname(slave), 9600, timeout=0)
+            transport = SJH5Transport(ser)
+            stop      = threading.Event()
+            threading.Thread(target=sensor, args=(master, stop), daemon=True).start()
+            answers, accepted, badAccepted, latencies = 0, 0, 0, []
+            startTime = time.time()
+            while answers < samples:
+                cycleStart = time.time()
+                results    = cycle(ser, transport)
+                if cycle is oldCycle:
+                    results = [results]
+                for ok, response in results:
+                    answers += 1
+                    if ok:
+                        accepted    += 1
+                        badAccepted += sum(response[:8]) & 0xFF != 0
+                latencies += [(time.time() - cycleStart)/len(results)]*len(results)
+            wallTime = time.time() - startTime
+            stop.set()
+            ser.close()
+            os.close(master)
+            latencies.sort()
+            print(label)
+            print("  Samples per second       : {0:.1f}".format(answers/wallTime))
+            print("  Latency p50/p99 (ms)     : {0:.1f} / {1:.1f}".format(
+                1000*latencies[len(latencies)//2], 1000*latencies[int(len(latencies)*.99)]))
+            print("  Accepted                 : {0} of {1}, {2} with a bad checksum".format(
+                accepted, answers, badAccepted))
+
+    {"nmea": benchmarkNMEA, "inir": benchmarkInir, "sjh5": benchmarkSJH5}[sys.argv[1] if len(sys.argv) > 1 else "nmea"]()
@@ -0,0 +1,290 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module runs several serial instruments in one process. A selector
+#   waits on every port and on the next timer at once: streamed bytes go to
+#   the handler of their port as soon as they arrive and polled instruments
+#   are asked for data from timers, so nothing sleeps or spins.
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+import heapq
+import itertools
+import queue
+import selectors
+import socket
+import threading
+import time
+
+from mintsXU4 import mintsLogger as mLog
+
+logger = mLog.getLogger(__name__)
+
+
+class PortStats:
+    """Counters of one port or timer of the hub."""
+
+    __slots__ = ("reads", "bytes", "messages", "errors", "restarts", "busyTime",
+                 "busyMax", "latencyCount", "latencySum", "latencyMax")
+
+    def __init__(self):
+        self.reads        = 0
+        self.bytes        = 0
+        self.messages     = 0
+        self.errors       = 0
+        self.restarts     = 0
+        self.busyTime     = 0.0
+        self.busyMax      = 0.0
+        self.latencyCount = 0
+        self.latencySum   = 0.0
+        self.latencyMax   = 0.0
+
+    def addBusy(self, seconds):
+        self.busyTime += seconds
+        self.busyMax   = max(self.busyMax, seconds)
+
+    def addLatency(self, seconds):
+        self.latencyCount += 1
+        self.latencySum   += seconds
+        self.latencyMax    = max(self.latencyMax, seconds)
+
+    def summary(self):
+        return {
+            "reads"         : self.reads,
+            "bytes"         : self.bytes,
+            "messages"      : self.messages,
+            "errors"        : self.errors,
+            "restarts"      : self.restarts,
+            "meanBusyMs"    : round(1000*self.busyTime/max(self.reads, 1), 3),
+            "maxBusyMs"     : round(1000*self.busyMax, 3),
+            "meanLatencyMs" : round(1000*self.latencySum/max(self.latencyCount, 1), 2),
+            "maxLatencyMs"  : round(1000*self.latencyMax, 2),
+            }
+
+
+class PendingDevice:
+    """Stands in for the hub while start(hub) of a device runs on its own
+    thread: the ports and timers it adds are kept until start returns and
+    are then added by the loop."""
+
+    def __init__(self, hub):
+        self.hub   = hub
+        self.calls = []
+
+    def addPort(self, *args, **kwargs):
+        self.calls.append(("addPort", args, kwargs))
+
+    def addTimer(self, *args, **kwargs):
+        self.calls.append(("addTimer", args, kwargs))
+
+    def recordLatency(self, name, seconds):
+        self.hub.recordLatency(name, seconds)
+
+    def close(self):
+        # The ports of a start that failed half way
+        for method, args, kwargs in self.calls:
+            if method == "addPort":
+                try:
+                    args[1].close()
+                except Exception:
+                    pass
+
+
+class SerialHub:
+    """One selector loop for the serial ports of the node.
+
+    addPort() takes an open pyserial port and onData(data, readTime), called
+    with every chunk read from it; it returns the number of messages it
+    dispatched. addTimer() calls callback(now) every interval seconds, e.g.
+    to poll an instrument. Ports are read without blocking, only select()
+    waits. Per port the hub counts reads, bytes, messages and the time
+    spent in onData (busy); handlers add the latency of their messages
+    with recordLatency() (from request or first byte to dispatch). Timer
+    latency is how late the timer ran. Stats are logged every
+    statsInterval seconds.
+
+    addDevice() takes start(hub), which opens the port of an instrument
+    and adds it and its timers (owner=name). start runs on a thread of its
+    own, as it may wait on the instrument (e.g. the INIR2ME5 takes seconds
+    to enter engineering mode), and the loop adds the port and timers once
+    it returns, so the other ports keep being read meanwhile. When start,
+    a read or a timer of the device fails, e.g. the USB adapter was pulled,
+    its port is closed, its timers are dropped and start is called again
+    after retryMin seconds, doubled up to retryMax while it keeps failing.
+    """
+
+    def __init__(self, statsInterval=60, retryMin=1, retryMax=60):
+        self.selector      = selectors.DefaultSelector()
+        self.timers        = []
+        self.order         = itertools.count()
+        self.stats         = {}
+        self.statsInterval = statsInterval
+        self.retryMin      = retryMin
+        self.retryMax      = retryMax
+        self.devices       = {}
+        self.retryDelays   = {}
+        self.started       = queue.Queue()
+        self.running       = False
+        # Wakes select() up when a start thread is done
+        self.wakeReader, self.wakeWriter = socket.socketpair()
+        self.wakeReader.setblocking(False)
+        self.selector.register(self.wakeReader, selectors.EVENT_READ, None)
+
+    def addPort(self, name, ser, onData):
+        ser.timeout = 0
+        self.selector.register(ser.fileno(), selectors.EVENT_READ, (name, ser, onData))
+        self.stats.setdefault(name, PortStats())
+
+    def removePort(self, name):
+        for key in list(self.selector.get_map().values()):
+            if key.data is not None and key.data[0] == name:
+                self.selector.unregister(key.fileobj)
+                try:
+                    key.data[1].close()
+                except Exception:
+                    pass
+
+    def addTimer(self, name, interval, callback, delay=0, owner=None):
+        # interval None runs the callback once
+        heapq.heappush(self.timers, (time.time() + delay, next(self.order),
+                                     name, interval, callback, owner))
+        self.stats.setdefault(name, PortStats())
+
+    def removeTimers(self, owner):
+        self.timers = [timer for timer in self.timers if timer[5] != owner]
+        heapq.heapify(self.timers)
+
+    def addDevice(self, name, start):
+        self.devices[name] = start
+        self.stats.setdefault(name, PortStats())
+        self.startDevice(name)
+
+    def startDevice(self, name):
+        pending = PendingDevice(self)
+        threading.Thread(target=self.runStart, args=(name, pending),
+                         name=name + "Start", daemon=True).start()
+
+    def runStart(self, name, pending):
+        # On the start thread, the loop picks the result up in finishStarts
+        try:
+            self.devices[name](pending)
+            error = None
+        except Exception as e:
+            error = e
+        self.started.put((name, pending, error))
+        try:
+            self.wakeWriter.send(b"\0")
+        except OSError:
+            pass
+
+    def finishStarts(self):
+        while True:
+            try:
+                name, pending, error = self.started.get_nowait()
+            except queue.Empty:
+                return
+            if error is None:
+                try:
+                    for method, args, kwargs in pending.calls:
+                        getattr(self, method)(*args, **kwargs)
+                except Exception as e:
+                    error = e
+            if error is not None:
+                pending.close()
+                logger.error("%s not started. Error: %s", name, error)
+                self.restartDevice(name)
+                continue
+            self.retryDelays.pop(name, None)
+            logger.info("%s started", name)
+
+    def restartDevice(self, name):
+        self.removePort(name)
+        self.removeTimers(name)
+        if name not in self.devices:
+            return
+        delay = self.retryDelays.get(name)
+        delay = self.retryMin if delay is None else min(2*delay, self.retryMax)
+        self.retryDelays[name]   = delay
+        self.stats[name].restarts += 1
+        logger.warning("Restarting %s in %s s", name, delay)
+        # Owned by the device, so a second failure does not start it twice
+        self.addTimer("restart", None, lambda now: self.startDevice(name), delay, name)
+
+    def recordLatency(self, name, seconds):
+        self.stats[name].addLatency(seconds)
+
+    def readPort(self, name, ser, onData):
+        stats = self.stats[name]
+        try:
+            data = ser.read(ser.in_waiting or 1)
+        except Exception as e:
+            # A port that went away, e.g. the USB adapter was pulled
+            stats.errors += 1
+            logger.error("Port %s not read, closing it. Error: %s", name, e)
+            self.restartDevice(name)
+            return
+        if not data:
+            return
+        readTime        = time.time()
+        stats.reads    += 1
+        stats.bytes    += len(data)
+        try:
+            stats.messages += onData(data, readTime) or 0
+        except Exception as e:
+            stats.errors += 1
+            logger.error("Data of %s not handled. Error: %s", name, e)
+        stats.addBusy(time.time() - readTime)
+
+    def runTimers(self, now):
+        while self.timers and self.timers[0][0] <= now:
+            timer      = heapq.heappop(self.timers)
+            due, order, name, interval, callback, owner = timer
+            stats      = self.stats[name]
+            startTime  = time.time()
+            stats.addLatency(startTime - due)
+            stats.reads += 1
+            try:
+                callback(startTime)
+            except Exception as e:
+                stats.errors += 1
+                logger.error("Timer %s failed. Error: %s", name, e)
+                if owner is not None:
+                    # e.g. a poll written to a port that went away
+                    self.restartDevice(owner)
+                    continue
+            finally:
+                stats.addBusy(time.time() - startTime)
+            if interval is None:
+                continue
+            # Keeps the timer on its grid, skipping the periods it missed
+            nextDue = due + interval
+            while nextDue <= now:
+                nextDue += interval
+            heapq.heappush(self.timers, (nextDue, order, name, interval, callback, owner))
+
+    def logStats(self):
+        for name, stats in self.stats.items():
+            logger.info("Serial hub %s %s", name, stats.summary())
+
+    def run(self):
+        self.running = True
+        lastStats    = time.time()
+        while self.running:
+            now     = time.time()
+            timeout = max(0, self.timers[0][0] - now) if self.timers else 1
+            for key, events in self.selector.select(min(timeout, 1)):
+                if key.data is None:
+                    self.wakeReader.recv(4096)
+                else:
+                    self.readPort(*key.data)
+            self.finishStarts()
+            now = time.time()
+            self.runTimers(now)
+            if now - lastStats >= self.statsInterval:
+                self.logStats()
+                lastStats = now
+
+    def stop(self):
+        self.running = False
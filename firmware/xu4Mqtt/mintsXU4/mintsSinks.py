@@ -0,0 +1,385 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module holds the destinations (sinks) of the records that go
+#   through sensorFinisher. Every sink runs on its own worker thread with its
+#   own queue, so a slow or failing sink never holds up the others or the
+#   sensor loop.
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+import json
+import time
+from collections import OrderedDict
+
+from mintsXU4 import mintsCodec as mCodec
+from mintsXU4 import mintsDefinitions as mD
+from mintsXU4 import mintsLatest as mL
+from mintsXU4 import mintsLogger as mLog
+from mintsXU4 import mintsMQTT as mMQTT
+from mintsXU4 import mintsSchema as mSchema
+from mintsXU4 import mintsWindow as mWindow
+from mintsXU4 import mintsWriter as mW
+
+logger = mLog.getLogger(__name__)
+
+
+class SensorRecord:
+    """One finished record on its way to the sinks.
+
+    kind tells which finisher produced it: "raw" (sensorFinisher),
+    "wearable", "reference" or "ip". nodeID is the MAC address of this node
+    or the host ID of a wearable.
+    """
+
+    __slots__ = ("kind", "dateTime", "nodeID", "sensorName",
+                 "sensorDictionary", "writePath", "queuedTime")
+
+    def __init__(self, kind, dateTime, nodeID, sensorName, sensorDictionary, writePath):
+        self.kind             = kind
+        self.dateTime         = dateTime
+        self.nodeID           = nodeID
+        self.sensorName       = sensorName
+        self.sensorDictionary = sensorDictionary
+        self.writePath        = writePath
+        self.queuedTime       = None
+
+
+class Sink:
+    """Base class of all sinks.
+
+    Subclasses implement write(batch) and may implement idle() and close().
+    Records are handed over with put() and written on the worker thread of
+    the sink, or inline when the worker is not running (writerThreadOn set
+    to False). Exceptions raised by write() are counted and logged by the
+    worker and never reach the sensor loop.
+    """
+
+    name = "sink"
+
+    def __init__(self, maxSize=None, batchSize=None, overflow=None, blockTimeout=None):
+        self.worker = mW.QueueWorker(
+            self.name, self.handleBatch,
+            maxSize      = maxSize      or mD.writerQueueSize,
+            batchSize    = batchSize    or mD.writerBatchSize,
+            overflow     = overflow     or mD.writerOverflow,
+            blockTimeout = blockTimeout or mD.writerBlockTimeout,
+            onIdle       = self.idle)
+        self.records      = 0
+        self.batches      = 0
+        self.latencySum   = 0.0
+        self.latencyMax   = 0.0
+        self.writeTime    = 0.0
+        self.lastStats    = time.time()
+        self.lastRecords  = 0
+
+    def start(self):
+        if mD.writerThreadOn:
+            self.worker.start()
+
+    def put(self, record):
+        if self.worker.is_alive():
+            self.worker.put(record)
+            return
+        try:
+            self.handleBatch([record])
+        except Exception as e:
+            self.worker.failed += 1
+            logger.error("%s sink failed, error: %s", self.name, e)
+
+    def handleBatch(self, batch):
+        startTime = time.time()
+        self.write(batch)
+        endTime   = time.time()
+        self.records   += len(batch)
+        self.batches   += 1
+        self.writeTime += endTime - startTime
+        for record in batch:
+            latency = endTime - record.queuedTime
+            self.latencySum += latency
+            self.latencyMax  = max(self.latencyMax, latency)
+
+    def write(self, batch):
+        raise NotImplementedError
+
+    def idle(self):
+        pass
+
+    def close(self):
+        pass
+
+    def stop(self):
+        self.worker.stop()
+        try:
+            self.close()
+        except Exception as e:
+            logger.error("%s sink not closed, error: %s", self.name, e)
+
+    def stats(self):
+        now     = time.time()
+        stats   = self.worker.stats()
+        records = max(self.records, 1)
+        stats["recordsPerSecond"] = round((self.records - self.lastRecords) /
+                                          max(now - self.lastStats, 1e-6), 2)
+        stats["meanLatencyMs"]    = round(1000*self.latencySum/records, 2)
+        stats["maxLatencyMs"]     = round(1000*self.latencyMax, 2)
+        stats["meanWriteMs"]      = round(1000*self.writeTime/records, 3)
+        self.lastStats   = now
+        self.lastRecords = self.records
+        return stats
+
+
+class CSVSink(Sink):
+    """Daily CSV files through a CSVWriterCache."""
+
+    name = "csv"
+
+    def __init__(self, csvWriters, **kwargs):
+        Sink.__init__(self, **kwargs)
+        self.csvWriters = csvWriters
+
+    def write(self, batch):
+        # Rows are grouped per destination file so each file is touched once per batch
+        rowsByPath = OrderedDict()
+        for record in batch:
+            rowsByPath.setdefault(record.writePath, []).append(record)
+        for writePath, records in rowsByPath.items():
+            for record in records:
+                self.csvWriters.write(writePath, record.dateTime, record.sensorDictionary)
+
+    def idle(self):
+        self.csvWriters.flushAll()
+
+    def close(self):
+        self.csvWriters.closeAll()
+
+
+class ColumnarSink(Sink):
+    """Typed daily Parquet files through a ColumnarWriter."""
+
+    name = "columnar"
+
+    def __init__(self, columnarWriter, **kwargs):
+        Sink.__init__(self, **kwargs)
+        self.columnarWriter = columnarWriter
+
+    def write(self, batch):
+        for record in batch:
+            self.columnarWriter.append(record.writePath, record.dateTime,
+                                       record.sensorName, record.sensorDictionary)
+
+    def idle(self):
+        self.columnarWriter.flushIfDue()
+
+    def close(self):
+        self.columnarWriter.closeAll()
+
+
+class JSONLatestSink(Sink):
+    """The <sensor>.json files holding the newest record of each sensor.
+
+    Records are coalesced so each file is rewritten at most once every
+    interval seconds, and every sensor that is due is written in the same
+    cycle. Records held back are written on the next cycle or when idle.
+    """
+
+    name = "jsonLatest"
+
+    def __init__(self, interval=None, **kwargs):
+        Sink.__init__(self, **kwargs)
+        self.interval    = mD.latestInterval if interval is None else interval
+        self.pending     = OrderedDict()
+        self.lastWritten = {}
+        self.coalesced   = 0
+
+    def write(self, batch):
+        for record in batch:
+            key = (record.nodeID, record.sensorName)
+            if key in self.pending:
+                self.coalesced += 1
+            self.pending[key] = record
+        self.flush()
+
+    def flush(self, force=False):
+        now = time.time()
+        for key in list(self.pending):
+            if force or (now - self.lastWritten.get(key, 0)) >= self.interval:
+                record = self.pending.pop(key)
+                self.lastWritten[key] = now
+                if record.kind == "wearable":
+                    mL.writeJSONLatestWearable(record.nodeID, record.sensorName,
+                                               record.sensorDictionary)
+                else:
+                    mL.writeJSONLatest(record.sensorDictionary, record.sensorName)
+
+    def idle(self):
+        self.flush()
+
+    def close(self):
+        self.flush(force=True)
+
+    def stats(self):
+        stats = Sink.stats(self)
+        stats["coalesced"] = self.coalesced
+        return stats
+
+
+class BoardSink(Sink):
+    """The shared memory latest board (see mintsBoard), one slot per sensor.
+
+    Only the newest record of each sensor in a batch is written.
+    """
+
+    name = "latestBoard"
+
+    def __init__(self, board, **kwargs):
+        Sink.__init__(self, **kwargs)
+        self.board = board
+
+    def write(self, batch):
+        latest = OrderedDict()
+        for record in batch:
+            latest[record.sensorName] = record
+        for sensorName, record in latest.items():
+            self.board.update(sensorName, record.sensorDictionary)
+
+    def close(self):
+        self.board.close()
+
+
+class MQTTSink(Sink):
+    """Publishes every record to the MQTT broker through the MQTT session.
+
+    With an aggregator (see mintsWindow) one summary per sensor and window
+    is published instead of the records. With a policy (see mintsPolicy)
+    only the records it allows are published. With a batchEncoder (see
+    mintsBatch) records are packed into batches published on <topic>/batch
+    instead of one JSON message per record. With a payloadEncoder (see
+    mintsCodec) the records of sensors with a dictionary are compressed
+    one by one and published on <topic>/zstd.
+    """
+
+    name = "mqtt"
+
+    def __init__(self, batchEncoder=None, policy=None, aggregator=None,
+                 payloadEncoder=None, **kwargs):
+        Sink.__init__(self, **kwargs)
+        self.batchEncoder   = batchEncoder
+        self.payloadEncoder = payloadEncoder
+        self.policy       = policy
+        self.aggregator   = aggregator
+
+    def write(self, batch):
+        if self.aggregator is not None:
+            # With the windows of sensors that went quiet, idle() only runs
+            # once the queue has been empty for a while
+            batch = self.aggregate(batch) + self.toRecords(self.aggregator.flushDue())
+        self.publish(batch)
+
+    def aggregate(self, batch):
+        records = []
+        for record in batch:
+            if record.kind == "ip" or record.sensorName in self.aggregator.exclude:
+                records.append(record)
+                continue
+            records.extend(self.toRecords(self.aggregator.add(
+                (record.kind, record.nodeID, record.sensorName),
+                record.dateTime, record.sensorDictionary, record.sensorName)))
+        return records
+
+    def toRecords(self, summaries):
+        return [SensorRecord(kind, None, nodeID, sensorName, summary, None)
+                for (kind, nodeID, sensorName), summary in summaries]
+
+    def publish(self, batch):
+        if self.policy is not None:
+            batch = [record for record in batch if self.policy.allow(
+                (record.nodeID, record.sensorName), record.sensorName,
+                mWindow.baseFields(record.sensorDictionary)
+                if self.aggregator is not None else record.sensorDictionary)]
+        if self.batchEncoder is not None:
+            for record in batch:
+                nodeID = record.nodeID if record.kind == "wearable" else mD.macAddress
+                self.publishBatches(self.batchEncoder.add(
+                    nodeID + "/" + record.sensorName, record.sensorDictionary))
+            # Batches of sensors that went quiet, idle() only runs once the
+            # queue has been empty for a while
+            self.publishBatches(self.batchEncoder.flushDue())
+            return
+        for record in batch:
+            if self.payloadEncoder is not None and self.publishEncoded(record):
+                continue
+            if record.kind == "wearable":
+                mL.writeMQTTLatestWearable(record.nodeID, record.sensorName,
+                                           record.sensorDictionary)
+            else:
+                mL.writeMQTTLatest(record.sensorDictionary, record.sensorName)
+
+    def publishEncoded(self, record):
+        payload = self.payloadEncoder.encode(record.sensorName, json.dumps(
+            record.sensorDictionary, default=mSchema.jsonDefault))
+        if payload is None:
+            return False
+        nodeID = record.nodeID if record.kind == "wearable" else mD.macAddress
+        mMQTT.getSession().publish(nodeID + "/" + record.sensorName + mCodec.codecSuffix, payload)
+        return True
+
+    def publishBatches(self, messages):
+        for topic, payload, retain in messages:
+            mMQTT.getSession().publish(topic, payload, retain=retain)
+
+    def idle(self):
+        if self.aggregator is not None:
+            self.publish(self.toRecords(self.aggregator.flushDue()))
+        if self.batchEncoder is not None:
+            self.publishBatches(self.batchEncoder.flushDue())
+
+    def close(self):
+        if self.aggregator is not None:
+            self.publish(self.toRecords(self.aggregator.flushAll()))
+        if self.batchEncoder is not None:
+            self.publishBatches(self.batchEncoder.flushAll())
+
+    def stats(self):
+        stats = Sink.stats(self)
+        if self.policy is not None:
+            stats["suppressed"] = dict(self.policy.suppressionRatios())
+        if self.payloadEncoder is not None:
+            stats["codec"] = self.payloadEncoder.stats()
+        for publisher in (mMQTT.client, mMQTT.session):
+            if publisher is not None:
+                stats.update(("session" + keyIn[0].upper() + keyIn[1:], valueIn)
+                             for keyIn, valueIn in publisher.stats().items())
+        return stats
+
+
+sinks = OrderedDict()
+
+
+def registerSink(sink, kinds=("raw", "wearable", "reference", "ip")):
+    """Adds a sink for the given record kinds and starts its worker."""
+    if sink.name in sinks:
+        raise ValueError("A sink named " + sink.name + " is already registered")
+    sinks[sink.name] = (sink, frozenset(kinds))
+    sink.start()
+    return sink
+
+
+def dispatch(record):
+    record.queuedTime = time.time()
+    for sink, kinds in sinks.values():
+        if record.kind in kinds:
+            sink.put(record)
+
+
+def stopSinks():
+    # Sinks are stopped in the order they were registered
+    for sink, kinds in list(sinks.values()):
+        sink.stop()
+
+
+def logSinkStats():
+    for sink, kinds in sinks.values():
+        logger.info("Sink %s %s", sink.name, dict(sink.stats()))
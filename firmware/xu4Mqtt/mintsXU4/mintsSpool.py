@@ -0,0 +1,127 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module keeps MQTT messages that could not be published in a local
+#   SQLite file (WAL mode), so they can be replayed in order once the broker
+#   is reachable again.
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+import os
+import sqlite3
+import threading
+import time
+
+from mintsXU4 import mintsLogger as mLog
+
+logger = mLog.getLogger(__name__)
+
+
+class MQTTSpool:
+    """Append only store of MQTT messages waiting for the broker.
+
+    Rows are numbered in the order they were appended. A row is deleted once
+    the broker acknowledged it, and in the same transaction the high-water
+    mark of its topic (the newest row delivered and the time it was
+    spooled) is moved forward. When the spool holds more than maxRows the
+    oldest rows are dropped.
+    """
+
+    def __init__(self, spoolPath, maxRows=500000):
+        directoryIn = os.path.dirname(spoolPath)
+        if directoryIn and not os.path.isdir(directoryIn):
+            os.makedirs(directoryIn, exist_ok=True)
+        self.spoolPath  = spoolPath
+        self.maxRows    = maxRows
+        self.lock       = threading.Lock()
+        self.appended   = 0
+        self.delivered  = 0
+        self.dropped    = 0
+
+        self.connection = sqlite3.connect(spoolPath, check_same_thread=False,
+                                          isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, topic TEXT, payload BLOB, "
+            "qos INTEGER, retain INTEGER, spooledTime REAL)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS marks ("
+            "topic TEXT PRIMARY KEY, lastId INTEGER, lastTime REAL)")
+        self.rows = self.connection.execute(
+            "SELECT COUNT(*) FROM messages").fetchone()[0]
+        if self.rows:
+            logger.info("%d spooled messages waiting in %s", self.rows, spoolPath)
+
+    def __len__(self):
+        return self.rows
+
+    def append(self, topic, payload, qos=0, retain=False):
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO messages (topic, payload, qos, retain, spooledTime) "
+                "VALUES (?, ?, ?, ?, ?)", (topic, payload, qos, int(retain), time.time()))
+            self.rows     += 1
+            self.appended += 1
+            if self.rows > self.maxRows:
+                self.trim(max(self.rows - self.maxRows, self.maxRows//100))
+
+    def trim(self, count):
+        # Called with the lock held, drops the oldest rows
+        deleted = self.connection.execute(
+            "DELETE FROM messages WHERE id IN "
+            "(SELECT id FROM messages ORDER BY id LIMIT ?)", (count,)).rowcount
+        self.rows    -= deleted
+        self.dropped += deleted
+        logger.warning("MQTT spool full, dropped the %d oldest messages", deleted)
+
+    def fetch(self, afterId=0, limit=100):
+        """Returns up to limit rows (id, topic, payload, qos, retain) after afterId."""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT id, topic, payload, qos, retain FROM messages "
+                "WHERE id > ? ORDER BY id LIMIT ?", (afterId, limit)).fetchall()
+
+    def acknowledge(self, delivered):
+        """Deletes the delivered [(rowId, topic)] rows and moves the marks."""
+        if not delivered:
+            return
+        now = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN")
+            try:
+                for rowId, topic in delivered:
+                    deleted = self.connection.execute(
+                        "DELETE FROM messages WHERE id = ?", (rowId,)).rowcount
+                    self.rows -= deleted
+                    self.connection.execute(
+                        "INSERT INTO marks (topic, lastId, lastTime) VALUES (?, ?, ?) "
+                        "ON CONFLICT(topic) DO UPDATE SET "
+                        "lastId = MAX(lastId, excluded.lastId), lastTime = excluded.lastTime",
+                        (topic, rowId, now))
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.delivered += len(delivered)
+
+    def marks(self):
+        """Per topic high-water marks {topic: (lastId, lastTime)}."""
+        with self.lock:
+            return {topic: (lastId, lastTime) for topic, lastId, lastTime in
+                    self.connection.execute("SELECT topic, lastId, lastTime FROM marks")}
+
+    def stats(self):
+        return {
+            "rows"      : self.rows,
+            "appended"  : self.appended,
+            "delivered" : self.delivered,
+            "dropped"   : self.dropped,
+            }
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,226 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module turns the live stream of a sensor into one summary record
+#   per tumbling window (e.g. every 10 s, aligned to the clock) with the
+#   mean, min, max, standard deviation and count of every numeric field.
+#   IDs, checksums, time fields, coordinates and status bits keep their
+#   last value (mqttWindowLastValue in mintsDefinitions).
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+import datetime
+import math
+import time
+from collections import OrderedDict
+
+from mintsXU4 import mintsSchema as mSchema
+
+
+class FieldStats:
+    """Running mean and variance of one field (Welford), plus min and max."""
+
+    __slots__ = ("count", "mean", "m2", "minimum", "maximum")
+
+    def __init__(self):
+        self.count   = 0
+        self.mean    = 0.0
+        self.m2      = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, valueIn):
+        self.count += 1
+        delta       = valueIn - self.mean
+        self.mean  += delta/self.count
+        self.m2    += delta*(valueIn - self.mean)
+        if self.minimum is None or valueIn < self.minimum:
+            self.minimum = valueIn
+        if self.maximum is None or valueIn > self.maximum:
+            self.maximum = valueIn
+
+    def std(self):
+        return math.sqrt(self.m2/self.count) if self.count > 1 else 0.0
+
+    def toFields(self, keyIn, summary):
+        # Every column is written, even with no numbers in the window, so the
+        # fields of a sensor do not change from one window to the next
+        if self.count == 0:
+            summary[keyIn] = summary[keyIn + "Min"] = summary[keyIn + "Max"] = None
+            summary[keyIn + "Std"] = None
+        else:
+            summary[keyIn]         = toSignificant(self.mean)
+            summary[keyIn + "Min"] = self.minimum
+            summary[keyIn + "Max"] = self.maximum
+            summary[keyIn + "Std"] = toSignificant(self.std())
+        summary[keyIn + "Count"] = self.count
+
+
+class Window:
+    """The open window of one sensor."""
+
+    __slots__ = ("start", "fields")
+
+    def __init__(self, start):
+        self.start  = start
+        self.fields = OrderedDict()
+
+
+def toSignificant(valueIn, digits=6):
+    # Enough for the sensors and keeps the published JSON short
+    return float("%.*g" % (digits, valueIn))
+
+
+def toFloat(valueIn):
+    if isinstance(valueIn, bool):
+        return None
+    if isinstance(valueIn, (int, float)):
+        return float(valueIn)
+    try:
+        return float(valueIn)
+    except (TypeError, ValueError):
+        return None
+
+
+statSuffixes = ("Min", "Max", "Std", "Count")
+
+
+def baseFields(summary):
+    # The summary without the statistics columns, i.e. the fields of the raw record
+    return OrderedDict((keyIn, valueIn) for keyIn, valueIn in summary.items()
+                       if not any(keyIn.endswith(suffix) and keyIn[:-len(suffix)] in summary
+                                  for suffix in statSuffixes))
+
+
+class WindowAggregator:
+    """Tumbling windows of length seconds, aligned to the wall clock.
+
+    add() returns the summary of the previous window of the sensor once a
+    record of a later window arrives; flushDue() returns the windows that
+    ended more than grace seconds ago. A numeric field f becomes f (mean),
+    fMin, fMax, fStd and fCount, so consumers of the raw stream keep
+    reading f. The other fields keep their last value: those listed in
+    lastValue (sensor name, or "*" for all, to field names), then those the
+    mintsSchema of the sensor does not type int or float, then, without a
+    schema, those whose first value is not a number. The choice is made
+    once per field, so the columns of a sensor stay the same. dateTime is
+    the start of the window. Memory is fixed per field, whatever the number
+    of records in a window. Sensors in exclude (e.g. one-off records) are
+    meant to bypass the aggregator.
+    """
+
+    def __init__(self, length=10, grace=2, exclude=(), lastValue=None):
+        self.length    = length
+        self.grace     = grace
+        self.exclude   = frozenset(exclude)
+        self.lastValue = {sensorName: frozenset(fields)
+                          for sensorName, fields in (lastValue or {}).items()}
+        self.numeric   = {}
+        self.windows   = OrderedDict()
+
+    def getStart(self, dateTime):
+        seconds = dateTime.timestamp()
+        return seconds - seconds % self.length
+
+    def isNumeric(self, sensorName, sensorDictionary, keyIn, valueIn):
+        numeric = self.numeric.get((sensorName, keyIn))
+        if numeric is not None:
+            return numeric
+        if keyIn in self.lastValue.get("*", ()) or \
+                keyIn in self.lastValue.get(sensorName, ()):
+            numeric = False
+        else:
+            schema = getattr(sensorDictionary, "schema", None) or mSchema.getSchema(sensorName)
+            if schema is not None and keyIn in schema.index:
+                numeric = schema.types[schema.index[keyIn]] in (int, float)
+            elif valueIn is None or valueIn == "":
+                # Empty NMEA fields, decided by the first value that is set
+                return False
+            else:
+                numeric = toFloat(valueIn) is not None
+        self.numeric[(sensorName, keyIn)] = numeric
+        return numeric
+
+    def add(self, key, dateTime, sensorDictionary, sensorName=None):
+        sensorName = key if sensorName is None else sensorName
+        start      = self.getStart(dateTime)
+        emitted    = []
+        window     = self.windows.get(key)
+        if window is not None and window.start != start:
+            emitted.append((key, self.summarize(self.windows.pop(key))))
+            window = None
+        if window is None:
+            window = self.windows[key] = Window(start)
+
+        fields = window.fields
+        for keyIn, valueIn in sensorDictionary.items():
+            if keyIn == "dateTime":
+                continue
+            if not self.isNumeric(sensorName, sensorDictionary, keyIn, valueIn):
+                fields[keyIn] = valueIn
+                continue
+            stats = fields.get(keyIn)
+            if not isinstance(stats, FieldStats):
+                stats = fields[keyIn] = FieldStats()
+            number = toFloat(valueIn)
+            if number is not None and not math.isnan(number):
+                stats.add(number)
+        return emitted
+
+    def summarize(self, window):
+        summary = OrderedDict()
+        summary["dateTime"] = str(datetime.datetime.fromtimestamp(window.start))
+        for keyIn, stats in window.fields.items():
+            if isinstance(stats, FieldStats):
+                stats.toFields(keyIn, summary)
+            else:
+                summary[keyIn] = stats
+        return summary
+
+    def flushDue(self, now=None):
+        now = time.time() if now is None else now
+        due = [key for key, window in self.windows.items()
+               if now >= window.start + self.length + self.grace]
+        return [(key, self.summarize(self.windows.pop(key))) for key in due]
+
+    def flushAll(self):
+        return [(key, self.summarize(self.windows.pop(key)))
+                for key in list(self.windows)]
+
+
+if __name__ == "__main__":
+    # One hour of INIR2ME5 at 1 Hz through 10 s and 60 s windows
+    # run python3 -m mintsXU4.mintsWindow
+    import json
+    import random
+
+    random.seed(4)
+    startTime = datetime.datetime(2025, 1, 4, 13, 0, 0)
+    records   = []
+    for second in range(3600):
+        dateTime = startTime + datetime.timedelta(seconds=second)
+        records.append((dateTime, OrderedDict([
+            ("dateTime"   , str(dateTime)),
+            ("methane"    , str(2000 + random.randint(-20, 20))),
+            ("faultCode"  , "0"),
+            ("temperature", str(round(26.3 + random.gauss(0, 0.05), 2))),
+            ("status"     , "OK"),
+            ])))
+    rawBytes = sum(len(json.dumps(sensorDictionary)) for _, sensorDictionary in records)
+
+    for length in (10, 60):
+        aggregator = WindowAggregator(length, lastValue={"INIR2ME5": ["faultCode"]})
+        summaries  = []
+        cpuStart   = time.process_time()
+        for dateTime, sensorDictionary in records:
+            summaries.extend(aggregator.add("INIR2ME5", dateTime, sensorDictionary))
+        summaries.extend(aggregator.flushAll())
+        cpuTime = time.process_time() - cpuStart
+        summaryBytes = sum(len(json.dumps(summary)) for key, summary in summaries)
+
+        print("{0} s windows".format(length))
+        print("  Messages                 : {0} -> {1}".format(len(records), len(summaries)))
+        print("  Published bytes          : {0} -> {1}".format(rawBytes, summaryBytes))
+        print("  CPU per record (us)      : {0:.2f}".format(1e6*cpuTime/len(records)))
@@ -0,0 +1,338 @@
+# ***************************************************************************
+#  mintsXU4
+#   ---------------------------------
+#   This module keeps the daily CSV files of a reader process open between
+#   records so that sensorFinisher does not reopen the same file for every
+#   row it writes, moves the writing off the sensor loop onto a background
+#   thread and compresses daily files once their day is over.
+#   --------------------------------------------------------------------------
+#   https://github.com/mi3nts
+#   http://utdmints.info/
+#  ***************************************************************************
+
+import csv
+import glob
+import gzip
+import io
+import os
+import queue
+import shutil
+import threading
+import time
+import datetime
+from collections import OrderedDict
+
+from mintsXU4 import mintsLogger as mLog
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = mLog.getLogger(__name__)
+
+compressionSuffixes = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def openCompressed(filePath, mode, compression=None):
+    # mode is one of "rb", "wb" or "ab", compression follows the suffix if not given
+    if compression is None:
+        compression = {".gz": "gzip", ".zst": "zstd"}.get(os.path.splitext(filePath)[1])
+    if compression == "gzip":
+        return gzip.open(filePath, mode)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("zstandard is needed for .zst files")
+        if mode == "rb":
+            # Late rows are appended as extra frames
+            return zstandard.ZstdDecompressor().stream_reader(
+                open(filePath, mode), read_across_frames=True, closefd=True)
+        return zstandard.ZstdCompressor().stream_writer(
+            open(filePath, mode), closefd=True)
+    return open(filePath, mode)
+
+
+def openCSV(filePath):
+    # Reads .csv, .csv.gz and .csv.zst files alike, newline="" as csv needs
+    # for quoted fields that hold line ends
+    if filePath.endswith(".csv"):
+        return open(filePath, 'r', newline="")
+    return io.TextIOWrapper(openCompressed(filePath, "rb"), newline="")
+
+
+def compressFile(filePath, compression="gzip"):
+    """Replaces filePath with a compressed copy.
+
+    The copy is written to a temporary file that is renamed into place
+    before the original is removed, so a crash never leaves a truncated
+    archive behind. If the archive already exists (rows that arrived after
+    the day was closed) the rows are added to it as a new compressed
+    member without repeating the header.
+    """
+    compressedPath = filePath + compressionSuffixes[compression]
+    if os.path.exists(compressedPath):
+        with open(filePath, 'rb') as fileIn:
+            fileIn.readline()
+            with openCompressed(compressedPath, "ab", compression) as fileOut:
+                shutil.copyfileobj(fileIn, fileOut)
+        os.remove(filePath)
+        return compressedPath
+
+    tempPath = compressedPath + ".tmp"
+    with open(filePath, 'rb') as fileIn:
+        with openCompressed(tempPath, "wb", compression) as fileOut:
+            shutil.copyfileobj(fileIn, fileOut)
+    with open(tempPath, 'rb') as fileOut:
+        os.fsync(fileOut.fileno())
+    os.replace(tempPath, compressedPath)
+    os.remove(filePath)
+    return compressedPath
+
+
+def compressDailyCSV(writePath, dateIn, compression="gzip"):
+    # Only files carrying the day in their name are closed for good
+    if compression and writePath.endswith(dateIn.strftime("_%Y_%m_%d.csv")) \
+            and os.path.isfile(writePath):
+        try:
+            compressFile(writePath, compression)
+        except Exception as e:
+            logger.error("Could not compress %s, error: %s", writePath, e)
+
+
+def compressClosedDays(nodeFolder, beforeDate, compression="gzip"):
+    # Catches up on daily files left behind by restarted readers
+    for writePath in sorted(glob.glob(nodeFolder + "/*/*/*/*.csv")):
+        try:
+            dateIn = datetime.datetime.strptime(
+                "_".join(writePath[:-len(".csv")].split("_")[-3:]), "%Y_%m_%d").date()
+        except ValueError:
+            continue
+        if dateIn < beforeDate:
+            compressDailyCSV(writePath, dateIn, compression)
+
+
+class CSVWriterCache:
+    """Least recently used cache of open daily CSV files.
+
+    Entries are keyed by write path, which already carries the sensor name
+    and the day. At most maxOpen files are kept open. Files of earlier days
+    are closed as soon as the first record of a newer day arrives.
+
+    flushInterval is the number of seconds between flushes (0 flushes after
+    every row) and fsync forces each flush down to the SD card. onDayClose,
+    if given, is called with the write path and date of every file closed
+    because its day is over.
+    """
+
+    def __init__(self, maxOpen=16, flushInterval=1, fsync=False, onDayClose=None):
+        self.maxOpen       = maxOpen
+        self.flushInterval = flushInterval
+        self.fsync         = fsync
+        self.onDayClose    = onDayClose
+        self.entries       = OrderedDict()
+        self.currentDate   = None
+        self.lastFlush     = time.time()
+
+    def write(self, writePath, dateTime, sensorDictionary):
+        dateIn = dateTime.date()
+        if self.currentDate is None or dateIn > self.currentDate:
+            self.rollOver(dateIn)
+
+        entry  = self.getEntry(writePath, dateIn)
+        schema = getattr(sensorDictionary, "schema", None)
+        keys   = schema.keyList if schema is not None else list(sensorDictionary.keys())
+        if keys != entry["keys"]:
+            entry["writer"] = csv.DictWriter(entry["file"], fieldnames=keys)
+            entry["keys"]   = keys
+            if entry["isNew"]:
+                entry["writer"].writeheader()
+                entry["isNew"] = False
+        if schema is not None:
+            # Typed records (see mintsSchema) hold their values in field order
+            entry["writer"].writer.writerow(sensorDictionary.data)
+        else:
+            entry["writer"].writerow(sensorDictionary)
+        entry["dirty"] = True
+
+        if dateIn < self.currentDate:
+            # Late record for a day that is already closed
+            self.closeDay(writePath)
+        elif self.flushInterval <= 0 or \
+                (time.time() - self.lastFlush) >= self.flushInterval:
+            self.flushAll()
+
+    def getEntry(self, writePath, dateIn):
+        entry = self.entries.get(writePath)
+        if entry is not None:
+            self.entries.move_to_end(writePath)
+            return entry
+
+        while len(self.entries) >= self.maxOpen:
+            self.close(next(iter(self.entries)))
+
+        try:
+            fileOut = open(writePath, 'a')
+        except FileNotFoundError:
+            directoryIn = os.path.dirname(writePath)
+            logger.info("Creating Folder @:%s", directoryIn)
+            os.makedirs(directoryIn, exist_ok=True)
+            fileOut = open(writePath, 'a')
+
+        entry = {
+            "file"   : fileOut,
+            "writer" : None,
+            "keys"   : None,
+            "date"   : dateIn,
+            "dirty"  : False,
+            # Append mode starts at the end of the file
+            "isNew"  : fileOut.tell() == 0,
+        }
+        self.entries[writePath] = entry
+        return entry
+
+    def rollOver(self, dateIn):
+        self.currentDate = dateIn
+        for writePath in [path for path, entry in self.entries.items()
+                          if entry["date"] < dateIn]:
+            self.closeDay(writePath)
+
+    def flushEntry(self, entry):
+        if entry["dirty"]:
+            entry["file"].flush()
+            if self.fsync:
+                os.fsync(entry["file"].fileno())
+            entry["dirty"] = False
+
+    def flushAll(self):
+        for entry in self.entries.values():
+            self.flushEntry(entry)
+        self.lastFlush = time.time()
+
+    def close(self, writePath):
+        entry = self.entries.pop(writePath, None)
+        if entry is not None:
+            self.flushEntry(entry)
+            entry["file"].close()
+
+    def closeDay(self, writePath):
+        entry = self.entries.get(writePath)
+        self.close(writePath)
+        if entry is not None and self.onDayClose is not None:
+            self.onDayClose(writePath, entry["date"])
+
+    def closeAll(self):
+        for writePath in list(self.entries):
+            self.close(writePath)
+
+
+class QueueWorker(threading.Thread):
+    """Background thread draining a bounded queue in batches.
+
+    handler is called with lists of up to batchSize queued items and onIdle
+    (if given) whenever the queue stays empty for idleInterval seconds.
+    When the queue is full, overflow decides what is lost: "dropNewest"
+    discards the incoming item, "dropOldest" discards the oldest queued item
+    and "block" makes the caller wait up to blockTimeout seconds before the
+    incoming item is discarded.
+    """
+
+    def __init__(self, name, handler, maxSize=1000, batchSize=100,
+                 overflow="dropOldest", blockTimeout=0.5,
+                 onIdle=None, idleInterval=1):
+        threading.Thread.__init__(self, name=name, daemon=True)
+        self.handler      = handler
+        self.queue        = queue.Queue(maxSize)
+        self.batchSize    = batchSize
+        self.overflow     = overflow
+        self.blockTimeout = blockTimeout
+        self.onIdle       = onIdle
+        self.idleInterval = idleInterval
+        self.enqueued     = 0
+        self.processed    = 0
+        self.dropped      = 0
+        self.failed       = 0
+        self.maxDepth     = 0
+
+    def put(self, item):
+        try:
+            if self.overflow == "block":
+                self.queue.put(item, timeout=self.blockTimeout)
+            else:
+                self.queue.put_nowait(item)
+        except queue.Full:
+            if self.overflow != "dropOldest":
+                self.drop()
+                return False
+            try:
+                self.queue.get_nowait()
+                self.drop()
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                self.drop()
+                return False
+
+        self.enqueued += 1
+        self.maxDepth  = max(self.maxDepth, self.queue.qsize())
+        return True
+
+    def drop(self):
+        self.dropped += 1
+        if self.dropped == 1 or self.dropped % 100 == 0:
+            logger.warning("%s queue full, %d items dropped",
+                           self.name, self.dropped)
+
+    def run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.idleInterval)
+            except queue.Empty:
+                self.runIdle()
+                continue
+
+            batch = []
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batchSize:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    self.handler(batch)
+                except Exception as e:
+                    self.failed += len(batch)
+                    logger.error("%s failed, error: %s", self.name, e)
+                self.processed += len(batch)
+
+            if item is None:
+                self.runIdle()
+                return
+
+    def runIdle(self):
+        if self.onIdle is not None:
+            try:
+                self.onIdle()
+            except Exception as e:
+                logger.error("%s failed, error: %s", self.name, e)
+
+    def stop(self, timeout=10):
+        # None marks the end of the queue, everything before it is handled
+        if self.is_alive():
+            self.queue.put(None)
+            self.join(timeout)
+
+    def stats(self):
+        return OrderedDict([
+            ("depth"     , self.queue.qsize()),
+            ("maxDepth"  , self.maxDepth),
+            ("enqueued"  , self.enqueued),
+            ("processed" , self.processed),
+            ("dropped"   , self.dropped),
+            ("failed"    , self.failed),
+            ])
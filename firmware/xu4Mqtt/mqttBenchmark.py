@@ -0,0 +1,217 @@
+# Publish path benchmark: pushes synthetic records through sensorFinisher to a
+# local broker stand-in (mintsBrokerStub, run in its own process) and reports
+# messages per second, publish latency and CPU per message of this process.
+# run python3 mqttBenchmark.py [--records N] [--rate N] [--tls] [--drops N]
+#     python3 mqttBenchmark.py --brokers 2 --outage --rate 50   (failover and failback)
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+
+
+def runBrokers(connection, ports, certFile, keyFile):
+    from mintsXU4 import mintsBrokerStub as mBS
+    brokers = [mBS.BrokerStub(port=port, certFile=certFile, keyFile=keyFile).start()
+               for port in ports]
+    connection.send([broker.port for broker in brokers])
+    while True:
+        command, argument = connection.recv()
+        if command == "drop":
+            index, refuseFor = argument
+            brokers[index].dropClients(refuseFor)
+            connection.send(True)
+        elif command == "down":
+            brokers[argument].stop()
+            connection.send(True)
+        elif command == "up":
+            brokers[argument].start()
+            connection.send(True)
+        elif command == "stop":
+            for broker in brokers:
+                broker.stop()
+            connection.send(True)
+            return
+        elif command == "take":
+            connection.send([(index,) + message for index, broker in enumerate(brokers)
+                             for message in broker.takeReceived()])
+        elif command == "stats":
+            connection.send([(broker.connects, broker.drops) for broker in brokers])
+
+
+class Brokers:
+    """Broker stand-ins in a child process, so their CPU is not counted."""
+
+    def __init__(self, count=1, certFile=None, keyFile=None):
+        self.connection, childConnection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=runBrokers, args=(childConnection, [0]*count, certFile, keyFile),
+            daemon=True)
+        self.process.start()
+        self.ports    = self.connection.recv()
+        self.received = []
+
+    def call(self, command, argument=None):
+        self.connection.send((command, argument))
+        return self.connection.recv()
+
+    def drop(self, index=0, refuseFor=0):
+        return self.call("drop", (index, refuseFor))
+
+    def down(self, index):
+        return self.call("down", index)
+
+    def up(self, index):
+        return self.call("up", index)
+
+    def take(self):
+        self.received.extend(self.call("take"))
+        return self.received
+
+    def stats(self):
+        return self.call("stats")
+
+    def stop(self):
+        self.call("stop")
+        self.process.join()
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(int(share*len(values)), len(values) - 1)] if values else float("nan")
+
+
+def configure(folder, ports, caFile):
+    # Must run before mintsSensorReader is imported, the sinks are set up on import
+    from mintsXU4 import mintsDefinitions as mD
+    credentialsFile = os.path.join(folder, "credentials.yml")
+    with open(credentialsFile, "w") as fp:
+        fp.write("mqtt:\n  username: benchmark\n  password: benchmark\n")
+    mD.dataFolder          = os.path.join(folder, "raw")
+    mD.mqttOn              = True
+    mD.latestOn            = False
+    mD.latestBoardOn       = False
+    mD.columnarOn          = False
+    mD.mqttGatewayOn       = False
+    mD.mqttBatchOn         = False
+    mD.mqttPolicyOn        = False
+    mD.mqttWindowOn        = False
+    mD.mqttCredentialsFile = credentialsFile
+    mD.mqttSpoolFolder     = os.path.join(folder, "spool")
+    mD.mqttReconnectMax    = 2
+    mD.mqttBrokers         = [("localhost" if caFile else "127.0.0.1", port) for port in ports]
+    mD.mqttFailoverAfter   = 1
+    mD.mqttProbeInterval   = 1
+    mD.mqttProbeTimeout    = 1
+    mD.mqttTLSCert         = caFile
+    return mD
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MQTT publish path benchmark")
+    parser.add_argument("--records", type=int,   default=2000)
+    parser.add_argument("--rate",    type=float, default=0, help="records per second, 0 for as fast as possible")
+    parser.add_argument("--tls",     action="store_true")
+    parser.add_argument("--drops",   type=int,   default=0, help="broker drops during the run")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--brokers", type=int,   default=1)
+    parser.add_argument("--outage",  action="store_true", help="first broker down for the middle third of the run")
+    parser.add_argument("--overflow", default=None, help="writer queue overflow, default as configured")
+    arguments = parser.parse_args()
+
+    folder   = tempfile.mkdtemp()
+    caFile   = certFile = keyFile = None
+    if arguments.tls:
+        from mintsXU4 import mintsBrokerStub as mBS
+        caFile, certFile, keyFile = mBS.generateCertificates(os.path.join(folder, "certs"))
+    brokers  = Brokers(arguments.brokers, certFile, keyFile)
+    mD       = configure(folder, brokers.ports, caFile)
+    if arguments.overflow:
+        mD.writerOverflow = arguments.overflow
+
+    from mintsXU4 import mintsSensorReader as mSR
+    from mintsXU4 import mintsMQTT as mMQTT
+    from mintsXU4 import mintsSinks as mSinks
+
+    # Connect before timing, as a reader would be at steady state
+    session = mMQTT.getSession()
+    while not session.connected:
+        time.sleep(0.05)
+
+    records   = arguments.records
+    dropAt    = set(records*(index + 1)//(arguments.drops + 1) for index in range(arguments.drops))
+    cpuStart  = time.process_time()
+    startTime = time.time()
+    for index in range(records):
+        if index in dropAt:
+            brokers.drop(0, refuseFor=1)
+        if arguments.outage and index == records//3:
+            brokers.down(0)
+        if arguments.outage and index == 2*records//3:
+            brokers.up(0)
+        dateTime = datetime.datetime.now()
+        mSR.sensorFinisher(dateTime, "BENCH", OrderedDict([
+            ("dateTime"   , str(dateTime)),
+            ("sequence"   , index),
+            ("sentTime"   , time.time()),
+            ("methane"    , 2.13),
+            ("temperature", 26.35),
+            ]))
+        if arguments.rate > 0:
+            time.sleep(max(0, startTime + (index + 1)/arguments.rate - time.time()))
+    loopTime = time.time() - startTime
+
+    # Wait for every record, or until nothing has arrived for idleFor seconds
+    deadline  = time.time() + arguments.timeout
+    idleFor   = 5
+    lastCount = lastChange = 0
+    while time.time() < deadline:
+        count = len(set(json.loads(payload)["sequence"] for _, _, _, payload in brokers.take()))
+        if count >= records:
+            break
+        if count != lastCount:
+            lastCount, lastChange = count, time.time()
+        elif lastChange and time.time() - lastChange > idleFor:
+            break
+        time.sleep(0.2)
+    cpuTime  = time.process_time() - cpuStart
+    received = sorted(brokers.take(), key=lambda message: message[1])
+    sequences = [json.loads(payload)["sequence"] for _, _, _, payload in received]
+    latencies = [receivedTime - json.loads(payload)["sentTime"]
+                 for _, receivedTime, _, payload in received]
+    endTime   = max(receivedTime for _, receivedTime, _, _ in received) if received else time.time()
+    stats     = session.stats()
+    sinkStats = mSinks.sinks["mqtt"][0].stats()
+    brokers.stop()
+    mSinks.stopSinks()
+    shutil.rmtree(folder, ignore_errors=True)
+
+    print("TLS                        : {0}".format(arguments.tls))
+    print("Records                    : {0}".format(records))
+    print("Received                   : {0}".format(len(received)))
+    print("Lost                       : {0}".format(records - len(set(sequences))))
+    print("Dropped by the MQTT sink   : {0}".format(sinkStats["dropped"]))
+    print("Duplicates                 : {0}".format(len(sequences) - len(set(sequences))))
+    print("In order                   : {0}".format(sequences == sorted(sequences)))
+    print("Sensor loop (us per record): {0:.1f}".format(1e6*loopTime/records))
+    print("Messages per second        : {0:.0f}".format(len(received)/max(endTime - startTime, 1e-6)))
+    print("Latency p50 (ms)           : {0:.2f}".format(1000*percentile(latencies, 0.50)))
+    print("Latency p99 (ms)           : {0:.2f}".format(1000*percentile(latencies, 0.99)))
+    print("CPU per message (us)       : {0:.1f}".format(1e6*cpuTime/max(len(received), 1)))
+    print("Broker drops               : {0}".format(arguments.drops))
+    for index in range(arguments.brokers):
+        print("Received by broker {0}       : {1}".format(
+            index, sum(1 for message in received if message[0] == index)))
+    if "tlsHandshakes" in stats:
+        print("TLS handshakes (resumed)   : {0} ({1})".format(stats["tlsHandshakes"], stats["tlsResumed"]))
+        print("TLS handshake mean (ms)    : {0}".format(stats["tlsMeanHandshakeMs"]))
+    print("Session                    : {0}".format(stats))
+
+
+if __name__ == "__main__":
+    main()
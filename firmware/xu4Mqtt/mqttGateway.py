@@ -0,0 +1,39 @@
+# MQTT gateway of the node: keeps the only broker session and publishes the
+# messages the readers send over mD.mqttGatewaySocket, see mintsGateway
+
+import signal
+import sys
+
+from mintsXU4 import mintsDefinitions as mD
+from mintsXU4 import mintsBatch as mBatch
+from mintsXU4 import mintsGateway as mGateway
+from mintsXU4 import mintsLogger as mLog
+from mintsXU4 import mintsMQTT as mMQTT
+
+logger = mLog.getLogger("mqttGateway")
+
+
+def main():
+    batchEncoder = None
+    if mD.mqttBatchOn:
+        try:
+            batchEncoder = mBatch.BatchEncoder(mD.mqttBatchWindow, mD.mqttBatchSize)
+        except ImportError as e:
+            logger.error("Batched MQTT payloads turned off: %s", e)
+
+    session = mMQTT.getDirectSession()
+    gateway = mGateway.Gateway(mD.mqttGatewaySocket, session, batchEncoder,
+                               mD.logSummaryInterval)
+    logger.info("MQTT gateway listening @:%s", mD.mqttGatewaySocket)
+    try:
+        gateway.run()
+    finally:
+        session.stop()
+
+
+if __name__ == "__main__":
+    print("=============")
+    print("    MINTS    ")
+    print("=============")
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    main()
@@ -3,7 +3,19 @@
 sleep 60
 
 
+# Shared MQTT session of all readers, started first so they find its socket
+kill $(pgrep -f 'mqttGateway.py')
+sleep 5
+python3 mqttGateway.py &
+sleep 5
 
+# serialHub.py reads the AirMar, INIR2ME5 and SJH5 in one process. To use it,
+# start it here and drop the airMarReader.py, inir2me5Reader.py and
+# sjh5Reader.py blocks below:
+# kill $(pgrep -f 'serialHub.py')
+# sleep 5
+# python3 serialHub.py &
+# sleep 5
 
 kill $(pgrep -f 'airMarReader.py')
 sleep 5
@@ -0,0 +1,76 @@
+# All serial instruments of the node in one process, see mintsSerialHub:
+# the AirMar and INIR2ME5 streams are read as they come in, the SJH5 is
+# polled from a timer. An instrument whose port fails is closed and opened
+# again with a backoff. Runs instead of airMarReader.py, inir2me5Reader.py
+# and sjh5Reader.py, which keep working on their own.
+# run python3 serialHub.py
+
+import signal
+import sys
+
+import serial
+
+from mintsXU4 import mintsDefinitions as mD
+from mintsXU4 import mintsLogger as mLog
+from mintsXU4 import mintsSerialHub as mSerialHub
+
+import airMarReader
+import inir2me5Reader
+import sjh5Reader
+
+logger = mLog.getLogger("serialHub")
+
+
+def addAirMar(hub):
+    ser     = airMarReader.openPort()
+    handler = airMarReader.AirMarHandler()
+    hub.addPort("airMar", ser, handler.onData)
+
+
+def addInir2me5(hub):
+    ser = inir2me5Reader.openPort()
+    if not inir2me5Reader.startEngineeringMode(ser):
+        ser.close()
+        raise serial.SerialException("INIR2ME5 did not enter engineering mode")
+    handler = inir2me5Reader.Inir2me5Handler()
+    hub.addPort("inir2me5", ser, handler.onData)
+
+
+def addSJH5(hub):
+    transport = sjh5Reader.openTransport()
+    sjh5Reader.read_instrument_info(transport)
+    handler   = sjh5Reader.SJH5Handler(transport, lambda seconds: hub.recordLatency("sjh5", seconds))
+    hub.addPort("sjh5", transport.ser, handler.onData)
+    hub.addTimer("sjh5Poll", sjh5Reader.loopInterval, handler.poll, owner="sjh5")
+
+
+devices = [
+    ("airMar"  , mD.airmarPort  , addAirMar),
+    ("inir2me5", mD.inir2me5Port, addInir2me5),
+    ("sjh5"    , mD.sjh5Port    , addSJH5),
+]
+
+
+def main():
+    hub = mSerialHub.SerialHub(mD.logSummaryInterval)
+    for name, port, addDevice in devices:
+        if port is None:
+            logger.warning("%s not found, skipped", name)
+            continue
+        # Restarted by the hub when its port fails
+        logger.info("%s on %s", name, port)
+        hub.addDevice(name, addDevice)
+    try:
+        hub.run()
+    except KeyboardInterrupt:
+        logger.info("User interrupted. Exiting...")
+    finally:
+        hub.logStats()
+
+
+if __name__ == "__main__":
+    print("=============")
+    print("    MINTS    ")
+    print("=============")
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    main()
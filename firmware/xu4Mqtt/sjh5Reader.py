@@ -1,22 +1,25 @@
+import signal
+import sys
 import serial
 import time
 import datetime
-from pprint import pprint
 from collections import OrderedDict
 from mintsXU4 import mintsSensorReader as mSR
 from mintsXU4 import mintsDefinitions as mD
+from mintsXU4 import mintsLogger as mLog
+from mintsXU4 import mintsSerial as mSerial
 
 # Serial port configuration
 methanePort =   mD.sjh5Port
 baudRate = 9600
-loopInterval = 5
+loopInterval = 1
+responseTimeout = 0.5
 
 
 # Command components
 IP                    = 0x11  # Fixed IP address
 ACK_SUCCESS           = 0x16
 ACK_ERROR             = 0x06
-BYTE_LENGTH           = 0x01  # Length byte excluding CS
 # Commands 
 CMD_CHECK_MEASUREMENT   = 0x01
 CMD_SW_VERSION          = 0x1E
@@ -24,11 +27,10 @@ CMD_INSTRUMENT_NUMBER   = 0x1F
 CMD_MEASURMENT_PROPERTY = 0x0D
   
 startTimePro     = time.time()
+logger           = mLog.getLogger("sjh5Reader")
 
-def main():
-    startTime = time.time() 
-
-    ser = serial.Serial(
+def openPort():
+    return serial.Serial(
     port= methanePort,\
     baudrate=baudRate,\
     parity  =serial.PARITY_NONE,\
@@ -36,100 +38,118 @@ def main():
     bytesize=serial.EIGHTBITS,\
     timeout=0)
 
+
+def openTransport():
+    # Frames, checksums and deadlines of the commands, see mintsSerial
+    return mSerial.SJH5Transport(openPort(),IP,responseTimeout)
+
+
+def read_instrument_info(transport):
     time.sleep(1)
 
-    print("connected to: " + ser.portstr)
+    logger.info("connected to: %s",transport.ser.portstr)
+
+    read_instrument_number(transport)
+    read_software_number(transport)
+    read_measurment_properties(transport)
+    # read_gas_concentration(transport)
+
 
-    read_instrument_number(ser)
-    read_software_number(ser)
-    read_measurment_properties(ser)
-    # read_gas_concentration(ser)
+def main():
+    startTime = time.time() 
+
+    transport = openTransport()
+    read_instrument_info(transport)
 
     startTime = time.time()
 
     while True:
         try:
-            read_gas_concentration(ser)
+            read_gas_concentration(transport)
             startTime = mSR.delayMints(time.time() - startTime,loopInterval)
 
         except KeyboardInterrupt:
-            print("\nUser interrupted. Exiting...")
+            logger.info("User interrupted. Exiting...")
             break  # Exit the loop graceful
 
         except Exception as e:
-            print(f"Incomplete read. Error: {e}")
+            logger.error("Incomplete read. Error: %s",e)
             time.sleep(1)
             # Exit the loop if an error occurs
 
                     
-    ser.close()
-
-def send_command(command,ser):
-    try:
-        command_data = [IP, BYTE_LENGTH, command]
-        checksum = calculate_checksum(command_data)
-        send_command = command_data + [checksum]
-        ser.write(bytearray(send_command))
-        time.sleep(.1) 
-        response = ser.read(20)
-        # print(response)
-        print(f"Response received:") 
-        ack = response[0]
-
-        time.sleep(.1)
-        if ack == ACK_SUCCESS :
-            print()
-            return True, response
-
-        elif ack == ACK_ERROR:
-            error_code = response[3]
-            print(f"Error: Command not implemented correctly. Error code: {hex(error_code)}")
-            return False, response
-        else:
-            print("Unexpected response.")
-            return False, response
-
-    except Exception as e:
-        print(f"Incomplete read. Error: {e}")
+    transport.ser.close()
 
 
+def read_gas_concentration(transport):
+    dateTime = datetime.datetime.now()
+    validity  , response = transport.query(CMD_CHECK_MEASUREMENT)
+    if validity:
+        write_gas_concentration(response,dateTime)
 
 
-def calculate_checksum(data: list) -> int:
+class SJH5Handler:
     """
-    Calculate the checksum (CS) as the two's complement of the sum of data bytes.
+    Polled reading for serialHub.py: poll() sends the measurement request
+    from a timer and onData() hands the bytes to the transport, which
+    returns the answers whose length and checksum are complete and right.
+    onLatency(seconds) gets the time from request to answer.
     """
-    return (-sum(data)) & 0xFF
 
-def read_gas_concentration(ser):
-    dateTime = datetime.datetime.now()
-    validity  , response = send_command(CMD_CHECK_MEASUREMENT,ser)
-    if validity:
-        df1, df2 = response[3], response[4]
-        gas_concentration = (df1 * 256 + df2) / 100.0
-        status1 =  response[5]
-        print("============================")
-        print("= Methan Sensor Data Found =")
-
-        sensorDictionary = OrderedDict([
-            ("dateTime", str(dateTime)),
-            ("methane",            gas_concentration),  
-            ("warmUpStatus",       status1 & 0x01),  
-            ("malFunctionStatus",  status1 & 0x02),  
-            ("rangeStatus",        status1 & 0x04), 
-            ("calibrationStatus",  status1 & 0x10), 
-            ("highHumidityStatus", status1 & 0x20), 
-            ("RCDOverLimitStatus", status1 & 0x40), 
-            ("MCDOverLimitStatus", status1 & 0x80), 
-            ("timeElapsed",        int(time.time() - startTimePro)),             
-                    ])
-        # pprint(sensorDictionary)
-        mSR.sensorFinisher(dateTime,"SJH5",sensorDictionary)
+    def __init__(self,transport,onLatency=None):
+        self.transport = transport
+        self.onLatency = onLatency
+        self.sentTime  = None
+        self.dateTime  = None
+
+    def poll(self,now):
+        if self.sentTime is not None:
+            logger.warning("No complete answer to the last request: %s",bytes(self.transport.buffer))
+        self.dateTime  = datetime.datetime.now()
+        self.sentTime  = now
+        self.transport.send(CMD_CHECK_MEASUREMENT)
+
+    def onData(self,data,readTime):
+        written = 0
+        for response in self.transport.feed(data):
+            if self.sentTime is None or response[2] != CMD_CHECK_MEASUREMENT:
+                # Nothing was asked for, or a late answer
+                continue
+            self.sentTime, sentTime = None, self.sentTime
+            if self.onLatency is not None:
+                self.onLatency(readTime - sentTime)
+            if response[0] != ACK_SUCCESS:
+                logger.error("Command not implemented correctly. Response: %s",response)
+                continue
+            write_gas_concentration(response,self.dateTime)
+            written += 1
+        return written
+
+
+def write_gas_concentration(response,dateTime):
+    df1, df2 = response[3], response[4]
+    gas_concentration = (df1 * 256 + df2) / 100.0
+    status1 =  response[5]
+
+    sensorDictionary = OrderedDict([
+        ("dateTime", str(dateTime)),
+        ("methane",            gas_concentration),  
+        ("warmUpStatus",       status1 & 0x01),  
+        ("malFunctionStatus",  status1 & 0x02),  
+        ("rangeStatus",        status1 & 0x04), 
+        ("calibrationStatus",  status1 & 0x10), 
+        ("highHumidityStatus", status1 & 0x20), 
+        ("RCDOverLimitStatus", status1 & 0x40), 
+        ("MCDOverLimitStatus", status1 & 0x80), 
+        ("timeElapsed",        int(time.time() - startTimePro)),             
+                ])
+    # pprint(sensorDictionary)
+    mSR.sensorFinisher(dateTime,"SJH5",sensorDictionary)
 
 
 
 def decode_status(status1):
-    print("Decoding Status")
+    logger.info("Decoding Status")
     status_info = [
         f"Sensor Warm-up Status: {'Warming up' if status1 & 0x01 else 'Completed'}",
         f"Sensor Malfunction Status: {'Malfunction' if status1 & 0x02 else 'Normal'}",
@@ -140,32 +160,31 @@ def decode_status(status1):
         f"Measurement Channel Display Over Limit: {'Over Limit' if status1 & 0x80 else 'Within Limit'}"
     ]
 
-    print(status_info)
-    print()
+    logger.info(status_info)
 
 
 
-def read_instrument_number(ser):
-    print("Requesting Instument Number")
-    validity  , response = send_command(CMD_INSTRUMENT_NUMBER,ser)
+def read_instrument_number(transport):
+    logger.info("Requesting Instument Number")
+    validity  , response = transport.query(CMD_INSTRUMENT_NUMBER)
     if validity:
         serial_number_parts = [response[i] for i in range(3, 8)]
         serial_number = "".join(f"{sn:04}" for sn in serial_number_parts)
-        print(f"Instrument Serial Number: {serial_number}")
+        logger.info("Instrument Serial Number: %s",serial_number)
 
-def read_software_number(ser):
-    print("Requesting Software Version")
-    validity  , response = send_command(CMD_SW_VERSION,ser)
+def read_software_number(transport):
+    logger.info("Requesting Software Version")
+    validity  , response = transport.query(CMD_SW_VERSION)
     if validity:
         version_length = response[1] - 1  # Excluding the CMD byte
         version_data = response[3:3 + version_length]
         version_string = ''.join(chr(byte) for byte in version_data)
-        print(f"Software Version: {version_string}")
+        logger.info("Software Version: %s",version_string)
 
 
-def read_measurment_properties(ser):
-    print("Requesting Measurment Property")
-    validity, response = send_command(CMD_MEASURMENT_PROPERTY,ser)
+def read_measurment_properties(transport):
+    logger.info("Requesting Measurment Property")
+    validity, response = transport.query(CMD_MEASURMENT_PROPERTY)
     if validity:
         df_values = response[3:10]
         measurement_range = (df_values[0] * 256 + df_values[1]) / (10 ** df_values[2])
@@ -190,11 +209,13 @@ def read_measurment_properties(ser):
         }
         unit = units.get(unit_code, "Unknown")
 
-        print(f"Measurement Range: {measurement_range} {unit}")
-        print(f"Gas Type: {gas_type}")
+        logger.info("Measurement Range: %s %s",measurement_range,unit)
+        logger.info("Gas Type: %s",gas_type)
 
 
 if __name__ == "__main__":
+    # Turns the kill sent by killAll.sh into a normal exit so queued rows are written
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     print("=============")
     print("    MINTS    ")
     print("=============")
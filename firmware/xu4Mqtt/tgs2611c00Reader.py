@@ -1,18 +1,20 @@
+import signal
 from ina219 import INA219
 from ina219 import DeviceRangeError
 import odroid_wiringpi as wpi
-from pprint import pprint
 from collections import OrderedDict
 import datetime
 wpi.wiringPiSetup()
 import time
 from mintsXU4 import mintsSensorReader as mSR
+from mintsXU4 import mintsLogger as mLog
 import sys
 
 SHUNT_OHMS = 0.1
 MAX_EXPECTED_AMPS = 0.2
 
 startTimePro = time.time()
+logger       = mLog.getLogger("tgs2611c00Reader")
 
 loopInterval = 1
 
@@ -24,9 +26,9 @@ try:
 
 except Exception as e:
     time.sleep(.5)
-    print ("Error and type: %s - %s." % (e,type(e)))
+    logger.error("Error and type: %s - %s.",e,type(e))
     time.sleep(.5)
-    print("Methane Sensor not found")
+    logger.error("Methane Sensor not found")
     
     time.sleep(.5)
     sys.exit()
@@ -41,29 +43,26 @@ def read():
                 ("methaneEQBusVoltage", ina.voltage()),  
                 ("timeElapsed",         int(time.time() - startTimePro)),             
                         ])
-            # pprint(sensorDictionary)  
-            # print()       
-                                      
             if time.time() - startTimePro> 60 :
-                print("Sensor Warmed Up")
                 mSR.sensorFinisher(dateTime,"TGS2611C00",sensorDictionary)
             else:
-                print("Sensor Not Warmed Up")
-                pprint(sensorDictionary)  
-                print()    
+                logger.info("Sensor Not Warmed Up")
+                logger.debug(sensorDictionary)
 
             startTime = mSR.delayMints(time.time() - startTime,loopInterval)
 
 
         except Exception as e:
             time.sleep(.5)
-            print ("Error and type: %s - %s." % (e,type(e)))
+            logger.error("Error and type: %s - %s.",e,type(e))
             time.sleep(.5)
-            print("Data Packet Not Sent for Methane")
+            logger.error("Data Packet Not Sent for Methane")
             time.sleep(.5)
 
 
 if __name__ == "__main__":
+    # Turns the kill sent by killAll.sh into a normal exit so queued rows are written
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     print("=============")
     print("    MINTS    ")
     print("=============")